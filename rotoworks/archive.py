@@ -0,0 +1,599 @@
+"""
+rotoworks.archive keeps the PolyWorks exports of every project in a local,
+columnar measurement archive.
+
+The archive is split into partitions, one per machine type and phase. Each
+partition is a single NPZ file holding the rows of every ingested export as
+NumPy columns; Name and Control are stored as integer codes into the
+partition's categories.
+
+"""
+import os
+import re
+import sys
+import logging
+import threading
+from collections import defaultdict, OrderedDict
+from timeit import default_timer
+import numpy as np
+import pandas as pd
+from core import Path
+from files import replace_file
+from project_index import ProjectIndex, refresh
+import measurements
+from data import get_data_source
+from machine import Rotor
+
+
+# Export filenames are '<inspection>.csv'
+# See inspection.Inspection.OUTPUT_FILENAME
+INSPECTIONS = ('Axial', 'Diameter', 'ThermalGap', 'RotorWeight')
+
+_ingest_lock = threading.Lock()
+_ingest_thread = None
+
+
+def read_export(filepath):
+	"""Returns the Name, Control, Meas and Dev columns of a PolyWorks export.
+
+	Non-numeric measurements are read as NaN.
+
+	Parameters
+	----------
+	filepath : str
+
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+	KeyError
+		If the CSV file is not a PolyWorks export.
+
+	"""
+	df = measurements.load(filepath)
+	if 'Dev' in df:
+		dev = df['Dev'].values
+	else:
+		dev = np.full(len(df), np.nan)
+	return pd.DataFrame({
+		'Name': df['Name'].astype(str).values,
+		'Control': df['Control'].fillna('').astype(str).values,
+		'Meas': df['Meas'].values,
+		'Dev': dev,
+	}, columns=['Name', 'Control', 'Meas', 'Dev'])
+
+
+def _feature_count(machine_type):
+	"""Returns the number of scope features of a machine type."""
+	try:
+		return len(Rotor.get_machine_type_as_object(machine_type).FEATURES)
+	except (KeyError, AttributeError):
+		# Unknown machine type
+		return 0
+
+
+def _resize(matrix, width):
+	"""Returns a 2-D `matrix` truncated or zero-padded to `width` columns."""
+	matrix = np.asarray(matrix, np.float32)
+	resized = np.zeros((len(matrix), width), np.float32)
+	width = min(width, matrix.shape[1])
+	resized[:, :width] = matrix[:, :width]
+	return resized
+
+
+def _project_scope(filepath, width):
+	"""Returns the stage count and scope fractions of a project file.
+
+	The stage count is -1 and the fractions are 0 if the file cannot be read.
+
+	"""
+	try:
+		scope = get_data_source(filepath, migrate=False).scope
+	except Exception as error:
+		logging.warning('%s: %s' % (filepath, error))
+		return -1, np.zeros(width, np.float32)
+	return len(scope), scope_fractions(scope, width)
+
+
+def scope_fractions(scope, width):
+	"""Returns the fraction of a project's stages scoped for each feature.
+
+	Parameters
+	----------
+	scope : ScopeModel
+	width : int
+		The fractions are truncated or zero-padded to this many features.
+
+	"""
+	if len(scope) == 0:
+		return np.zeros(width, np.float32)
+	return _resize(scope.matrix.mean(axis=0)[np.newaxis], width)[0]
+
+
+def start_ingest():
+	"""Ingest every indexed project in a background thread.
+
+	Only the first call of a session starts an ingest. The project index is
+	refreshed first, so every job on the share is archived. Until the ingest
+	finishes, queries see the partitions as they were last written.
+
+	Returns
+	-------
+	threading.Thread
+
+	"""
+	global _ingest_thread
+	with _ingest_lock:
+		if _ingest_thread is None:
+			_ingest_thread = threading.Thread(target=_ingest_all, name='Archive')
+			_ingest_thread.daemon = True
+			_ingest_thread.start()
+	return _ingest_thread
+
+
+def _ingest_all():
+	try:
+		refresh()
+		MeasurementArchive().ingest()
+	except Exception as error:
+		logging.exception(error)
+
+
+class MeasurementArchive(object):
+	"""
+	A local archive of PolyWorks exports, partitioned by machine type and
+	phase.
+
+	A partition contains a sources table (one entry per export file) and the
+	measurement rows of every source:
+
+	==================  ========================================================
+	sources             Absolute path of each export
+	source_mtimes       Export modification times, for incremental re-ingest
+	source_projects     Absolute path of each export's project file
+	source_jobs         Job number of each export
+	source_stages       Stage count of each export's project, -1 if unknown
+	source_scope        Fraction of the project's stages scoped for each
+	                    feature (one row per export)
+	source_inspections  Inspection of each export, one of `INSPECTIONS`
+	names, controls     Categories
+	source, name,       Integer codes of each row
+	control
+	meas, dev           Float measurements of each row
+	==================  ========================================================
+
+	Parameters
+	----------
+	directory : str or None
+		Defaults to `Path.ARCHIVE`.
+
+	"""
+	_SOURCE_COLUMNS = (
+		'sources', 'source_mtimes', 'source_projects', 'source_jobs',
+		'source_stages', 'source_scope', 'source_inspections'
+	)
+	_ROW_COLUMNS = (
+		'names', 'controls', 'source', 'name', 'control', 'meas', 'dev'
+	)
+	# Writes to a partition are serialized across instances
+	_write_locks = {}
+	_write_locks_guard = threading.Lock()
+
+	def __init__(self, directory=None):
+		self._directory = Path.ARCHIVE if directory is None else directory
+		self._partitions = {}
+		if not os.path.isdir(self._directory):
+			os.makedirs(self._directory)
+
+	@staticmethod
+	def partition_key(machine_type, phase):
+		"""Returns the partition name of a machine type and phase.
+
+		Parameters
+		----------
+		machine_type : str
+		phase : str or None
+
+		"""
+		return '_'.join(
+			re.sub('[^0-9A-Za-z]', '', str(i or 'Unknown'))
+			for i in (machine_type, phase)
+		)
+
+	def partitions(self, machine_type=None):
+		"""Returns a sorted ``list`` of partition names.
+
+		Parameters
+		----------
+		machine_type : str or None
+			Only return the partitions of this machine type.
+
+		"""
+		keys = [
+			i[:-len('.npz')] for i in os.listdir(self._directory)
+			if i.endswith('.npz')
+		]
+		if machine_type is not None:
+			prefix = self.partition_key(machine_type, None).rsplit('_', 1)[0]
+			keys = [i for i in keys if i.rsplit('_', 1)[0] == prefix]
+		return sorted(keys)
+
+	def _filepath(self, key):
+		return os.path.join(self._directory, key + '.npz')
+
+	def _empty(self):
+		part = dict((i, np.array([], 'U')) for i in self._SOURCE_COLUMNS)
+		part['source_mtimes'] = np.array([], np.float64)
+		part['source_stages'] = np.array([], np.int32)
+		part['source_scope'] = np.zeros((0, 0), np.float32)
+		part['names'] = np.array([], 'U')
+		part['controls'] = np.array([], 'U')
+		for column in ('source', 'name', 'control'):
+			part[column] = np.array([], np.int32)
+		part['meas'] = np.array([], np.float64)
+		part['dev'] = np.array([], np.float64)
+		return part
+
+	def _load(self, key):
+		"""Returns a partition as a ``dict`` of arrays."""
+		filepath = self._filepath(key)
+		try:
+			mtime = os.path.getmtime(filepath)
+		except OSError:
+			return self._empty()
+		cached = self._partitions.get(key)
+		if cached is not None and cached[0] == mtime:
+			return cached[1]
+		try:
+			with np.load(filepath) as npz:
+				part = dict((i, npz[i]) for i in npz.files)
+		except (IOError, ValueError) as error:
+			# Corrupt partitions are rebuilt on the next ingest
+			logging.warning(error)
+			return self._empty()
+		if set(self._SOURCE_COLUMNS + self._ROW_COLUMNS) - set(part):
+			# Partitions written by an older version are rebuilt as well
+			logging.warning('Outdated archive partition: %s' % key)
+			return self._empty()
+		self._partitions[key] = (mtime, part)
+		return part
+
+	def _save(self, key, part):
+		filepath = self._filepath(key)
+		staged = filepath + '.tmp'
+		with open(staged, 'wb') as f:
+			np.savez(f, **part)
+		replace_file(staged, filepath)
+		self._partitions.pop(key, None)
+
+	def _write_lock(self, key):
+		with self._write_locks_guard:
+			return self._write_locks.setdefault(key, threading.Lock())
+
+	def generation(self, machine_type=None):
+		"""Returns a token that changes whenever partitions are written.
+
+		Parameters
+		----------
+		machine_type : str or None
+			Only consider the partitions of this machine type.
+
+		"""
+		token = []
+		for key in self.partitions(machine_type):
+			try:
+				token.append((key, os.path.getmtime(self._filepath(key))))
+			except OSError:
+				continue
+		return tuple(token)
+
+	def clear(self):
+		"""Discard every partition."""
+		for key in self.partitions():
+			os.remove(self._filepath(key))
+		self._partitions.clear()
+
+	def ingest(self, projects=None):
+		"""Archive the exports of new or modified projects.
+
+		Exports are only read if their modification time changed since the
+		last ingest, and archived exports that no longer exist are dropped.
+
+		Parameters
+		----------
+		projects : list or None
+			Project index rows, as returned by ``ProjectIndex.search``.
+			Defaults to every indexed project.
+
+		Returns
+		-------
+		int
+			The number of exports read or dropped.
+
+		"""
+		start = default_timer()
+		if projects is None:
+			projects = ProjectIndex().search()
+		groups = defaultdict(list)
+		for project in projects:
+			key = self.partition_key(project['machine_type'], project['phase'])
+			groups[key].append(project)
+		changes = sum(
+			self._ingest_partition(key, group) for key, group in groups.items()
+		)
+		logging.info('Archived %s projects in %.3fs (%s changes)' % (
+			len(projects), default_timer() - start, changes))
+		return changes
+
+	def _ingest_partition(self, key, projects):
+		# Exports are found and read before the partition is locked, so an
+		# ingest only holds up other writers while it merges and saves
+		part = self._load(key)
+		known = dict(zip(part['sources'], part['source_mtimes']))
+		found = OrderedDict()
+		for project in projects:
+			folder = os.path.dirname(project['filepath'])
+			for inspection in INSPECTIONS:
+				source = os.path.join(folder, '%s.csv' % inspection)
+				if source in found:
+					# Projects sharing a folder share its exports
+					continue
+				try:
+					mtime = os.path.getmtime(source)
+				except OSError:
+					continue
+				found[source] = (mtime, project, inspection)
+
+		width = _feature_count(projects[0]['machine_type'])
+		exports = OrderedDict()
+		scopes = {}
+		for source, (mtime, project, inspection) in found.items():
+			if known.get(source) == mtime:
+				continue
+			try:
+				exports[source] = read_export(source)
+			except (IOError, KeyError, ValueError) as error:
+				# The stale copy is still dropped
+				logging.warning('%s: %s' % (source, error))
+				exports[source] = None
+				continue
+			if project['filepath'] not in scopes:
+				scopes[project['filepath']] = _project_scope(
+					project['filepath'], width
+				)
+
+		with self._write_lock(key):
+			return self._merge_partition(key, projects, found, exports, scopes)
+
+	def _merge_partition(self, key, projects, found, exports, scopes):
+		# Another ingest may have written the partition since it was read
+		part = self._load(key)
+		known = dict(zip(part['sources'], part['source_mtimes']))
+		changed = [
+			(source,) + found[source] for source in exports
+			if known.get(source) != found[source][0]
+		]
+
+		# Drop changed exports and deleted exports of the given projects
+		paths = set(i['filepath'] for i in projects)
+		stale = set(i[0] for i in changed)
+		deleted = np.array([
+			project in paths and source not in found
+			for source, project in zip(part['sources'], part['source_projects'])
+		], bool)
+		drop = deleted | np.isin(part['sources'], list(stale))
+		if not changed and not drop.any():
+			return 0
+
+		keep = ~drop
+		rows = keep[part['source']]
+		remap = np.cumsum(keep) - 1
+		sources = dict((i, part[i][keep]) for i in self._SOURCE_COLUMNS)
+		width = _feature_count(projects[0]['machine_type'])
+		sources['source_scope'] = _resize(sources['source_scope'], width)
+		columns = {
+			'source': remap[part['source'][rows]],
+			'name': part['names'][part['name'][rows]],
+			'control': part['controls'][part['control'][rows]],
+			'meas': part['meas'][rows],
+			'dev': part['dev'][rows],
+		}
+
+		new_sources = defaultdict(list)
+		new_rows = defaultdict(list)
+		for source, mtime, project, inspection in changed:
+			df = exports[source]
+			if df is None:
+				continue
+			code = len(sources['sources']) + len(new_sources['sources'])
+			new_sources['sources'].append(source)
+			new_sources['source_mtimes'].append(mtime)
+			new_sources['source_projects'].append(project['filepath'])
+			new_sources['source_jobs'].append(project['job_num'])
+			stages, scope = scopes[project['filepath']]
+			new_sources['source_stages'].append(stages)
+			new_sources['source_scope'].append(scope)
+			new_sources['source_inspections'].append(inspection)
+			new_rows['source'].append(np.full(len(df), code, np.int32))
+			new_rows['name'].append(df['Name'].values.astype('U'))
+			new_rows['control'].append(df['Control'].values.astype('U'))
+			new_rows['meas'].append(df['Meas'].values.astype(np.float64))
+			new_rows['dev'].append(df['Dev'].values.astype(np.float64))
+
+		part = {}
+		for column in self._SOURCE_COLUMNS:
+			part[column] = np.concatenate(
+				[sources[column], np.array(new_sources[column])]
+			) if new_sources[column] else sources[column]
+		for column in columns:
+			columns[column] = np.concatenate(
+				[columns[column]] + new_rows[column]
+			)
+		part['source_mtimes'] = part['source_mtimes'].astype(np.float64)
+		part['source_stages'] = part['source_stages'].astype(np.int32)
+		part['source_scope'] = part['source_scope'].astype(np.float32)
+		part['source'] = columns['source'].astype(np.int32)
+		for category, column in (('names', 'name'), ('controls', 'control')):
+			part[category], codes = np.unique(
+				columns[column].astype('U'), return_inverse=True
+			)
+			part[column] = codes.astype(np.int32).ravel()
+		part['meas'] = columns['meas']
+		part['dev'] = columns['dev']
+		self._save(key, part)
+		return len(changed) + int(deleted.sum())
+
+	def query(self, machine_type, phase=None, inspection=None, names=None,
+			controls=None, job_nums=None, stage_count=None):
+		"""Returns archived measurement rows as a ``dict`` of arrays.
+
+		Parameters
+		----------
+		machine_type : str
+		phase : str or None
+			Defaults to every phase.
+		inspection : str or None
+			One of `INSPECTIONS`. Defaults to every inspection.
+		names, controls, job_nums : list or None
+			Only return rows with these values.
+		stage_count : int or None
+			Only return rows of projects with this many stages.
+
+		Returns
+		-------
+		dict
+			'project', 'job_num', 'stages', 'inspection', 'name', 'control', 
+			'meas' and 'dev' arrays of equal length.
+
+		"""
+		if phase is None:
+			keys = self.partitions(machine_type)
+		else:
+			keys = [self.partition_key(machine_type, phase)]
+		result = defaultdict(list)
+		for key in keys:
+			part = self._load(key)
+			if not len(part['source']):
+				continue
+			source_mask = np.ones(len(part['sources']), bool)
+			if inspection is not None:
+				source_mask &= part['source_inspections'] == inspection
+			if job_nums is not None:
+				source_mask &= np.isin(part['source_jobs'], job_nums)
+			if stage_count is not None:
+				source_mask &= part['source_stages'] == stage_count
+			mask = source_mask[part['source']]
+			if names is not None:
+				mask &= np.isin(part['names'], names)[part['name']]
+			if controls is not None:
+				mask &= np.isin(part['controls'], controls)[part['control']]
+			source = part['source'][mask]
+			result['project'].append(part['source_projects'][source])
+			result['job_num'].append(part['source_jobs'][source])
+			result['stages'].append(part['source_stages'][source])
+			result['inspection'].append(part['source_inspections'][source])
+			result['name'].append(part['names'][part['name'][mask]])
+			result['control'].append(part['controls'][part['control'][mask]])
+			result['meas'].append(part['meas'][mask])
+			result['dev'].append(part['dev'][mask])
+		empty = {
+			'stages': np.array([], np.int32),
+			'meas': np.array([], np.float64),
+			'dev': np.array([], np.float64),
+		}
+		columns = (
+			'project', 'job_num', 'stages', 'inspection', 'name', 'control', 
+			'meas', 'dev'
+		)
+		return dict(
+			(i, np.concatenate(result[i]) if result[i] else
+				empty.get(i, np.array([], 'U')))
+			for i in columns
+		)
+
+	def projects(self, machine_type):
+		"""Returns the archived projects of a machine type.
+
+		Parameters
+		----------
+		machine_type : str
+
+		Returns
+		-------
+		dict
+			'project', 'job_num' and 'stages' arrays, and the 'scope' matrix 
+			with one row per project.
+
+		"""
+		result = defaultdict(list)
+		for key in self.partitions(machine_type):
+			part = self._load(key)
+			projects, first = np.unique(
+				part['source_projects'], return_index=True
+			)
+			result['project'].append(projects)
+			result['job_num'].append(part['source_jobs'][first])
+			result['stages'].append(part['source_stages'][first])
+			result['scope'].append(part['source_scope'][first])
+		width = _feature_count(machine_type)
+		return {
+			'project': np.concatenate(result['project'] or [np.array([], 'U')]),
+			'job_num': np.concatenate(result['job_num'] or [np.array([], 'U')]),
+			'stages': np.concatenate(
+				result['stages'] or [np.array([], np.int32)]
+			),
+			'scope': np.concatenate(
+				[_resize(i, width) for i in result['scope']] or 
+				[np.zeros((0, width), np.float32)]
+			),
+		}
+
+	def project_frame(self, filepath, inspection):
+		"""Returns the archived export of a project as a ``DataFrame``.
+
+		The project is ingested first, so a modified export is re-read.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a project file.
+		inspection : str
+			One of `INSPECTIONS`.
+
+		Returns
+		-------
+		DataFrame
+			Contains 'Name', 'Control', 'Meas' and 'Dev' columns.
+
+		Raises
+		------
+		IOError
+			If the project has no `inspection` export.
+
+		"""
+		project = ProjectIndex().row(filepath)
+		self.ingest([project])
+		rows = self.query(
+			project['machine_type'],
+			project['phase'],
+			inspection
+		)
+		mask = rows['project'] == filepath
+		if not mask.any():
+			raise IOError('No %s export found for %s' % (
+				inspection, os.path.basename(filepath)))
+		return pd.DataFrame({
+			'Name': rows['name'][mask],
+			'Control': rows['control'][mask],
+			'Meas': rows['meas'][mask],
+			'Dev': rows['dev'][mask],
+		}, columns=['Name', 'Control', 'Meas', 'Dev'])
+
+
+if __name__ == '__main__':
+	# Ingest every indexed project: python archive.py
+	# Pass --rebuild to discard the archive first.
+	archive = MeasurementArchive()
+	if '--rebuild' in sys.argv:
+		archive.clear()
+	print('%s exports archived' % archive.ingest())
@@ -1,7 +1,8 @@
 import os
 import sys
+import logging
 from PyQt4 import QtGui, QtCore
-from pyqtauto.widgets import DialogButtonBox, Dialog
+from pyqtauto.widgets import DialogButtonBox, Dialog, ExceptionMessageBox
 from machine import Rotor
 from core import Path, Image
 from data import Data
@@ -22,16 +23,19 @@ class AxialSessionView(Dialog):
 	subtract_callback : callable
 	start_callback : callable
 	finish_callback : callable
+	cancel_callback : callable
 	
 	"""
 	def __init__(self, options, add_callback, import_callback, 
-			subtract_callback, start_callback, finish_callback):
+			subtract_callback, start_callback, finish_callback,
+			cancel_callback):
 		self._options = options
 		self._add_callback = add_callback
 		self._import_callback = import_callback
 		self._subtract_callback = subtract_callback
 		self._start_callback = start_callback
 		self._finish_callback = finish_callback
+		self._cancel_callback = cancel_callback
 		super(AxialSessionView, self).__init__('Axial Session')
 		self.setFixedWidth(450)
 		self.setMinimumHeight(300)
@@ -44,6 +48,7 @@ class AxialSessionView(Dialog):
 		self._cmd = InspectionCommandView(self.layout)
 		self._cmd.start_btn.clicked.connect(self._start_callback)
 		self._cmd.finish_btn.clicked.connect(self._finish_callback)
+		self._cmd.cancel_btn.clicked.connect(self._cancel_callback)
 
 	@property
 	def selected_options(self):
@@ -55,6 +60,17 @@ class AxialSessionView(Dialog):
 		"""list: Selected items in the 'Session' ``ListBox``."""
 		return self._input.destination.selected_items
 
+	def set_macro_progress(self, job, status):
+		"""Display the status of a PolyWorks macro.
+
+		Parameters
+		----------
+		job : MacroJob
+		status : str
+
+		"""
+		self._cmd.set_job(job, status)
+
 	def update_destination(self, targets):
 		"""Display the items sent to the destination ``ListBoxHeaderView``.
 		
@@ -83,7 +99,6 @@ class AxialSessionController(object):
 	def __init__(self, data):
 		self._data = data
 		self._axial = Axial(self._data.path)
-		self._axial.polyworks.connect_to_inspector()
 		try:
 			self._session_options = Rotor.stage_names(
 				len(self._data.scope.data),
@@ -105,8 +120,11 @@ class AxialSessionController(object):
 			self._on_click_import,
 			self._on_click_subtract,
 			self._on_click_start,
-			self._on_click_finish
+			self._on_click_finish,
+			self._on_click_cancel
 		)
+		self._finish_job = None
+		self._axial.progress.changed.connect(self._on_macro_progress)
 	
 	def _update_view(self):
 		"""Refresh widgets."""
@@ -160,29 +178,47 @@ class AxialSessionController(object):
 		self._session_targets = []
 		self._session_labels = []
 		self._update_view()
-		self._axial.macro_exec(
-			self._axial.MACRO_IN,
-			self._axial.SCOPE_FILE,
-			Path.MACROS
-		)
+		self._axial.macro_exec(self._axial.MACRO_IN, Path.MACROS)
 
 	def _on_click_finish(self):
 		"""Produce inspection output and close the view window."""
-		self._axial.macro_exec(
-			self._axial.MACRO_OUT,
-			self._axial.OUTPUT_FILE,
-			Path.MACROS
-		)
-		self.view.accept()
+		if self._finish_job is not None and not self._finish_job.finished:
+			return
+		self._finish_job = self._axial.export()
+
+	def _on_click_cancel(self):
+		"""Cancel running and queued macros."""
+		self._axial.macro_cancel()
+
+	def _on_macro_progress(self, job, status):
+		"""Display macro status; close the view once the output is exported.
+
+		Parameters
+		----------
+		job : MacroJob
+		status : str
+			The status emitted by the worker thread.
+
+		"""
+		self.view.set_macro_progress(job, status)
+		if status == job.FAILED:
+			logging.warning(job.error)
+			ExceptionMessageBox(job.error).exec_()
+		elif status == job.DONE and job is self._finish_job:
+			try:
+				self._axial.merge_export()
+			except (IOError, KeyError) as error:
+				logging.warning(error)
+				ExceptionMessageBox(error).exec_()
+			else:
+				self.view.accept()
 
 	def _on_click_import(self):
 		"""Send an existing workscope template to PolyWorks for inspection."""
-		if Template.copied(self._data.path, 'Axial'):
-			self._axial.macro_exec(
-				self._axial.MACRO_IN,
-				self._axial.SCOPE_FILE,
-				Path.MACROS
-			)
+		suggestions, fleet = Template.similar_projects(self._data)
+		if Template.copied(self._data.path, 'Axial', suggestions, fleet):
+			self._axial.compile(self._data.machine_obj)
+			self._axial.macro_exec(self._axial.MACRO_IN, Path.MACROS)
 
 
 class PromptDimLabels(Dialog):
@@ -0,0 +1,126 @@
+"""
+rotoworks.cache provides a small, thread-safe TTL/LRU cache.
+
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from files import replace_file
+
+
+class TTLCache(object):
+	"""
+	A size-bounded mapping whose entries expire.
+
+	The least recently used entry is evicted when `maxsize` is exceeded.
+
+	Parameters
+	----------
+	maxsize : int
+	ttl : float
+		Entry lifetime in seconds.
+	filepath : str or None
+		If not ``None``, entries are persisted to this JSON file and reloaded
+		on construction. Keys and values must be JSON serializable.
+
+	Attributes
+	----------
+	hits : int
+	misses : int
+
+	"""
+	def __init__(self, maxsize=256, ttl=8 * 3600, filepath=None):
+		self._maxsize = maxsize
+		self._ttl = ttl
+		self._filepath = filepath
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		self._write_lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		if self._filepath is not None:
+			self._load()
+
+	def __len__(self):
+		return len(self._data)
+
+	def get(self, key):
+		"""Returns the cached value of `key`.
+
+		Raises
+		------
+		KeyError
+			If `key` is not cached or has expired.
+
+		"""
+		with self._lock:
+			try:
+				value, stamp = self._data.pop(key)
+			except KeyError:
+				self.misses += 1
+				raise
+			if time.time() - stamp > self._ttl:
+				self.misses += 1
+				raise KeyError(key)
+			# Move to most recently used
+			self._data[key] = (value, stamp)
+			self.hits += 1
+			return value
+
+	def set(self, key, value):
+		"""Cache `value` under `key`."""
+		with self._lock:
+			self._data.pop(key, None)
+			self._data[key] = (value, time.time())
+			while len(self._data) > self._maxsize:
+				self._data.popitem(last=False)
+		if self._filepath is not None:
+			self._save()
+
+	def clear(self):
+		"""Remove every entry."""
+		with self._lock:
+			self._data.clear()
+		if self._filepath is not None:
+			self._save()
+
+	@property
+	def stats(self):
+		"""str: Hit, miss and size counters."""
+		return '%s hits, %s misses, %s entries' % (
+			self.hits, self.misses, len(self))
+
+	def _load(self):
+		try:
+			with open(self._filepath) as f:
+				items = json.load(f)
+		except (IOError, ValueError):
+			return
+		now = time.time()
+		for key, value, stamp in items[-self._maxsize:]:
+			if now - stamp <= self._ttl:
+				self._data[key] = (value, stamp)
+
+	def _save(self):
+		# Writes are serialized, and each writes the latest snapshot, so a
+		# slow writer cannot overwrite a newer file with older entries
+		with self._write_lock:
+			with self._lock:
+				items = [[k, v, s] for k, (v, s) in self._data.items()]
+			staged = self._filepath + '.tmp'
+			try:
+				folder = os.path.dirname(self._filepath)
+				if not os.path.isdir(folder):
+					os.makedirs(folder)
+				with open(staged, 'w') as f:
+					json.dump(items, f)
+				replace_file(staged, self._filepath)
+			except (IOError, OSError) as error:
+				logging.warning(error)
+
+
+if __name__ == '__main__':
+	pass
@@ -0,0 +1,372 @@
+"""
+rotoworks.connection shares one PolyWorks Inspector connection across the
+application.
+
+COM objects belong to the thread that created them, so the connection lives
+on a dedicated worker thread and every Inspector command is queued to it as a
+``MacroJob``. The worker connects as soon as it is started, normally at
+application startup, so opening a measurement session never waits on COM
+attach, and macros run without freezing the GUI.
+
+"""
+import logging
+import threading
+from Queue import Queue
+from collections import deque
+from timeit import default_timer
+from profiler import profiler
+try:
+	from comtypes import COMError, CoInitialize, CoUninitialize
+except ImportError:
+	# Not on Windows; only fake inspectors can be driven, e.g. by the
+	# harness below
+	class COMError(Exception):
+		pass
+
+	def CoInitialize():
+		pass
+
+	CoUninitialize = CoInitialize
+
+try:
+	# pywinscript drives Inspector through pywin32
+	from pywintypes import com_error
+except ImportError:
+	class com_error(Exception):
+		pass
+
+
+class MacroJob(object):
+	"""
+	An Inspector command queued on an ``InspectorConnection``.
+
+	Parameters
+	----------
+	command : str
+	name : str
+		Label used in progress messages and the execution log.
+	callback : callable or None
+		Called with the job and its new status each time the status changes.
+		Calls are made from the worker thread, except the 'Queued' call,
+		which is made by ``InspectorConnection.submit``.
+
+	Attributes
+	----------
+	TIMEOUT : float
+		Default `wait` timeout in seconds. Session macros wait on the user to
+		probe every target, so this is generous.
+	status : {'Queued', 'Running', 'Done', 'Failed', 'Cancelled'}
+	error : Exception or None
+	elapsed : float or None
+		Wall time (seconds) of the command.
+
+	"""
+	QUEUED = 'Queued'
+	RUNNING = 'Running'
+	DONE = 'Done'
+	FAILED = 'Failed'
+	CANCELLED = 'Cancelled'
+	TIMEOUT = 3600
+
+	def __init__(self, command, name, callback=None):
+		self.command = command
+		self.name = name
+		self.status = self.QUEUED
+		self.error = None
+		self.elapsed = None
+		self._callback = callback
+		self._finished = threading.Event()
+
+	def __str__(self):
+		if self.elapsed is None:
+			return '%s: %s' % (self.name, self.status)
+		return '%s: %s in %.1fs' % (self.name, self.status, self.elapsed)
+
+	@property
+	def finished(self):
+		"""bool: True once the job is done, failed or cancelled."""
+		return self._finished.is_set()
+
+	def cancel(self):
+		"""Skip the job if it has not started.
+
+		Inspector cannot interrupt a running macro, so a running job is
+		marked cancelled and its outcome is ignored.
+
+		"""
+		if not self.finished:
+			self._set_status(self.CANCELLED)
+
+	def wait(self, timeout=None):
+		"""Block until the job is finished.
+
+		Parameters
+		----------
+		timeout : float or None
+			Seconds; defaults to `TIMEOUT`.
+
+		Raises
+		------
+		Exception
+			The error of a failed job, e.g. COMError or OSError.
+		OSError
+			If the job is not finished within `timeout`.
+
+		"""
+		if timeout is None:
+			timeout = self.TIMEOUT
+		if not self._finished.wait(timeout):
+			raise OSError('%s timed out after %ss' % (self, timeout))
+		if self.error is not None:
+			raise self.error
+
+	def _set_status(self, status, error=None):
+		if self.finished:
+			return
+		self.status = status
+		self.error = error
+		if status not in (self.QUEUED, self.RUNNING):
+			self._finished.set()
+		if self._callback is not None:
+			# Pass the status; it may change before a queued slot reads it
+			self._callback(self, status)
+
+
+class InspectorConnection(object):
+	"""
+	A process-wide PolyWorks Inspector connection.
+
+	Use `get_connection` rather than creating instances.
+
+	Parameters
+	----------
+	factory : callable or None
+		Returns an object with a ``connect_to_inspector`` method and an
+		``inspector`` attribute, ``pywinscript.polyworks.Polyworks`` by
+		default.
+
+	Attributes
+	----------
+	latency : float or None
+		Duration (seconds) of the last successful connect.
+	error : Exception or None
+		The error of the last failed connect.
+	log : deque
+		The most recently finished ``MacroJob`` objects, oldest first.
+
+	"""
+	LOG_SIZE = 100
+
+	def __init__(self, factory=None):
+		self._factory = factory
+		self._polyworks = None
+		self._queue = Queue()
+		self._lock = threading.Lock()
+		self._thread = None
+		self._jobs = deque()
+		self.latency = None
+		self.error = None
+		self.log = deque(maxlen=self.LOG_SIZE)
+
+	@property
+	def is_connected(self):
+		"""bool: True if Inspector is attached."""
+		return self._polyworks is not None
+
+	def start(self):
+		"""Connect in the background. Calling again has no effect."""
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._thread = threading.Thread(target=self._run, name='PolyWorks')
+			self._thread.daemon = True
+			self._thread.start()
+
+	@property
+	def pending(self):
+		"""int: The number of queued and running jobs."""
+		return len(self._jobs)
+
+	def submit(self, command, name=None, callback=None):
+		"""Queue an Inspector command and return immediately.
+
+		Starts the connection if needed. A command that fails on a dropped
+		connection is retried once on a new connection.
+
+		Parameters
+		----------
+		command : str
+			A PolyWorks macro command, e.g. 'MACRO EXEC ( "file", "arg" )'.
+		name : str or None
+			Defaults to `command`.
+		callback : callable or None
+			See ``MacroJob``.
+
+		Returns
+		-------
+		MacroJob
+
+		"""
+		job = MacroJob(command, command if name is None else name, callback)
+		job._set_status(job.QUEUED)
+		self._jobs.append(job)
+		self.start()
+		self._queue.put(job)
+		return job
+
+	def cancel(self):
+		"""Cancel every queued and running job."""
+		for job in list(self._jobs):
+			job.cancel()
+
+	def execute(self, command):
+		"""Run an Inspector command and wait for it to finish.
+
+		Parameters
+		----------
+		command : str
+			A PolyWorks macro command, e.g. 'MACRO EXEC ( "file", "arg" )'.
+
+		Raises
+		------
+		COMError
+			If Inspector rejects the command.
+		OSError
+			If PolyWorks cannot be launched or the command times out.
+
+		"""
+		self.submit(command).wait()
+
+	def _run(self):
+		CoInitialize()
+		try:
+			self._connect()
+			while True:
+				try:
+					self._serve()
+				except Exception as error:
+					# The worker must outlive any job, or every later job
+					# would stay queued
+					logging.exception(error)
+		finally:
+			CoUninitialize()
+
+	def _serve(self):
+		"""Run queued jobs until one raises."""
+		while True:
+			job = self._queue.get()
+			try:
+				self._run_job(job)
+			except Exception as error:
+				job._set_status(job.FAILED, error)
+				raise
+			finally:
+				self._jobs.remove(job)
+
+	def _run_job(self, job):
+		if job.finished:
+			# Cancelled while queued
+			logging.info(job)
+			return
+		job._set_status(job.RUNNING)
+		start = default_timer()
+		try:
+			error = self._execute(job.command)
+		except Exception as exc:
+			error = exc
+		job.elapsed = default_timer() - start
+		if error is None:
+			job._set_status(job.DONE)
+		else:
+			job._set_status(job.FAILED, error)
+		self.log.append(job)
+		logging.info(job)
+
+	def _connect(self):
+		"""Attach to Inspector, launching it if needed."""
+		if self._factory is None:
+			from pywinscript.polyworks import Polyworks
+			self._factory = Polyworks
+		start = default_timer()
+		self._polyworks = None
+		try:
+			polyworks = self._factory()
+			polyworks.connect_to_inspector()
+		except Exception as error:
+			# COMError, OSError, or a pywin32 com_error
+			logging.warning('PolyWorks connect failed: %s' % error)
+			self.error = error
+			return False
+		self._polyworks = polyworks
+		self.latency = default_timer() - start
+		self.error = None
+		logging.info('Connected to PolyWorks in %.3fs' % self.latency)
+		return True
+
+	def _execute(self, command):
+		"""Returns None, or the error raised by `command`."""
+		for attempt in range(2):
+			if self._polyworks is None and not self._connect():
+				return self.error
+			inspector = profiler.wrap(self._polyworks.inspector, 'inspector')
+			try:
+				inspector.CommandExecute(command)
+			except (COMError, com_error) as error:
+				# Inspector was closed or restarted; reconnect and retry
+				logging.warning(error)
+				self._polyworks = None
+				if attempt:
+					return error
+			else:
+				return
+
+
+def macro_command(*args):
+	"""Returns a 'MACRO EXEC' command.
+
+	Parameters
+	----------
+	args : tuple
+		The path to a PWMACRO file followed by the arguments passed to it.
+
+	"""
+	return 'MACRO EXEC ( %s )' % ', '.join('"%s"' % i for i in args)
+
+
+_connection = InspectorConnection()
+
+
+def get_connection():
+	"""Returns the process-wide ``InspectorConnection``."""
+	return _connection
+
+
+if __name__ == '__main__':
+	# Queue macros on a fake inspector, cancel the last one and print the log.
+	import time
+
+	class FakeInspector(object):
+
+		def CommandExecute(self, command):
+			time.sleep(0.2)
+
+	class FakePolyworks(object):
+
+		def connect_to_inspector(self):
+			time.sleep(0.5)
+			self.inspector = FakeInspector()
+
+	logging.basicConfig(level=logging.INFO)
+	connection = InspectorConnection(FakePolyworks)
+	connection.start()
+	jobs = [
+		connection.submit(
+			macro_command('axialsIn.pwmacro', str(i)), 'Macro %s' % i
+		)
+		for i in range(3)
+	]
+	jobs[-1].cancel()
+	jobs[1].wait()
+	print('Connected in %.3fs' % connection.latency)
+	for job in connection.log:
+		print(job)
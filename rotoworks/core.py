@@ -2,15 +2,19 @@
 rotoworks.core contains absolute paths to default directories and images.
 
 """
+import os
 import sys
 import json
+import atexit
 import logging
-from os.path import dirname
+from os.path import dirname, expanduser
 from os.path import join as osjoin
 from os.path import split as ossplit
 from collections import OrderedDict
 from sulzer.extract import Extract, ProjectsFolderRootError
 from pywinscript.win import create_folder
+from cache import TTLCache
+from mirror import Mirror
 
 
 class Path(object):
@@ -34,6 +38,13 @@ class Path(object):
 	JOBS = osjoin(DATA, 'jobs')
 	LOG = osjoin(ROOT, 'logging', 'app.log')
 
+	# Per-user storage on the local machine
+	LOCAL = osjoin(os.environ.get('LOCALAPPDATA', expanduser('~')), 'RotoWorks')
+	INDEX = osjoin(LOCAL, 'projects.db')
+	CACHE = osjoin(LOCAL, 'cache')
+	ARCHIVE = osjoin(LOCAL, 'archive')
+	MIRROR = osjoin(LOCAL, 'mirror')
+
 
 class Image(object):
 	"""Default image paths."""
@@ -53,11 +64,101 @@ class Image(object):
 	IMPORT_LEFT = osjoin(ROOT, 'import-left.png')
 	IMPORT_RIGHT = osjoin(ROOT, 'import-right.png')
 
+
+def set_asset_root(root):
+	"""Point the image, macro and doc paths at `root`.
+
+	Only call from the GUI thread, which reads these paths.
+
+	Parameters
+	----------
+	root : str
+		Absolute path to the share root or to a mirrored version of it, see
+		``mirror.Mirror``.
+
+	"""
+	image = osjoin(root, 'data', 'images')
+	previous = Image.ROOT
+	for name, value in list(vars(Image).items()):
+		if isinstance(value, str) and value.startswith(previous):
+			setattr(Image, name, image + value[len(previous):])
+	Path.IMAGE = image
+	Path.MACROS = osjoin(root, 'macros')
+	Path.DOCS = osjoin(root, 'docs')
+
+
+# Assets are read from the last synced local mirror, so startup does not wait
+# on the share.
+_mirror = Mirror(Path.ROOT, Path.MIRROR)
+set_asset_root(_mirror.root)
+
+
+def sync_assets(callback):
+	"""Sync the local asset mirror in the background.
+
+	Parameters
+	----------
+	callback : callable
+		Called from the sync thread with the new asset root each time it
+		changes. It must pass the root to `set_asset_root` on the GUI thread,
+		e.g. through a queued signal, so a window is never built from a mix
+		of share and mirror paths.
+
+	"""
+	_mirror.start(callback)
+
 	
 def setup_logger():
 	logging.basicConfig(filename=Path.LOG, 
 		format='%(name)s - %(levelname)s - %(message)s')
 
 
+# Cache statistics are reported at exit, regardless of the root logger level.
+cache_logger = logging.getLogger('cache')
+cache_logger.setLevel(logging.INFO)
+
+_projects_folder_roots = TTLCache(
+	maxsize=512, 
+	ttl=12 * 3600, 
+	filepath=osjoin(Path.CACHE, 'projects_folder_root.json')
+)
+
+
+def projects_folder_root(job_num):
+	"""Cached ``Extract.projects_folder_root``.
+
+	Lookups are kept for a shift (12 hours) and shared across sessions. 
+	Failed lookups are not cached.
+
+	Parameters
+	----------
+	job_num : str
+
+	Returns
+	-------
+	str
+		Absolute path to the PROJECTS FOLDER root of `job_num`.
+
+	Raises
+	------
+	ProjectsFolderRootError
+		If the PROJECTS FOLDER root cannot be found.
+
+	"""
+	try:
+		return _projects_folder_roots.get(job_num)
+	except KeyError:
+		root = Extract.projects_folder_root(job_num)
+		_projects_folder_roots.set(job_num, root)
+		return root
+
+
+@atexit.register
+def _log_cache_stats():
+	cache_logger.info(
+		'projects_folder_root: %s' % _projects_folder_roots.stats
+	)
+
+
 if __name__ == "__main__":
 	pass
@@ -1,15 +1,32 @@
+import os
 import os.path
+import json
+import shutil
+import tempfile
 import cPickle as pickle
+import numpy as np
+from timeit import default_timer
 from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
-from pyqtauto.widgets import TableCheckBox
 from core import Path, setup_logger
+from files import replace_file
+from project_index import ProjectIndex
 from machine import Rotor
 import logging
 
 
 setup_logger()
 
+# Save timings are logged regardless of the root logger level.
+logger = logging.getLogger('data')
+logger.setLevel(logging.INFO)
+
+
+# Project files start with a signature line followed by a JSON header line and
+# a JSON body line. The header can be read without decoding the body.
+SIGNATURE = 'ROTOWORKS'
+FORMAT_VERSION = 1
+
 
 class Data(object):
 	"""
@@ -26,9 +43,11 @@ class Data(object):
 	machine_obj : Rotor subclass
 	features : list
 	scope : ScopeModel
+	dirty : bool
 	
 	"""
 	def __init__(self, job_num, phase, machine_type, is_curtis, filepath):
+		self._dirty = True
 		self.job_num = job_num
 		self.phase = phase
 		self.machine_type = machine_type
@@ -39,8 +58,27 @@ class Data(object):
 		self.filepath = filepath
 		self.scope = ScopeModel(is_curtis, len(self.features))
 
-	def save(self):
-		"""Save this instance to file.
+	@property
+	def dirty(self):
+		"""bool: True if this instance differs from its project file."""
+		return self._dirty or self.scope.dirty
+
+	def mark_clean(self):
+		"""Flag this instance as identical to its project file."""
+		self._dirty = False
+		self.scope.dirty = False
+
+	def save(self, force=False):
+		"""Save this instance to file, if it changed.
+
+		The project is written to a local temporary file, copied next to the
+		project file, then moved over the project file in a single step so that
+		a dropped connection never leaves a partial project behind.
+
+		Parameters
+		----------
+		force : bool
+			Save even if this instance is unchanged.
 
 		Raises
 		------
@@ -48,12 +86,54 @@ class Data(object):
 			If the system cannot find the path specified.
 
 		"""
+		if not (force or self.dirty):
+			return
+		start = default_timer()
+		staged = self.filepath + '.tmp'
+		fd, local = tempfile.mkstemp(suffix='.rw')
 		try:
-			with open(self.filepath, "wb") as project:
-				pickle.dump(self, project)
-		except IOError as error:
+			with os.fdopen(fd, 'wb') as project:
+				project.write(self.dumps())
+			shutil.copyfile(local, staged)
+			replace_file(staged, self.filepath)
+		except (IOError, OSError) as error:
 			logging.warning(error)
-			raise error
+			raise IOError(error)
+		finally:
+			os.remove(local)
+		self.mark_clean()
+		# Keeps the indexed modification time current for the archive
+		ProjectIndex().add(self.filepath)
+		logger.info('Saved %s in %.3fs' % (
+			self.filename, default_timer() - start))
+
+	@property
+	def header(self):
+		"""OrderedDict: Project metadata stored ahead of the body."""
+		return OrderedDict([
+			('job_num', self.job_num),
+			('phase', self.phase),
+			('machine_type', self.machine_type),
+			('is_curtis', bool(self.is_curtis)),
+			('scope_shape', [len(self.scope.data), self.scope.feature_count]),
+		])
+
+	def dumps(self):
+		"""Returns this instance encoded in the versioned project format.
+
+		The scope is stored as its stage labels and a single string of 
+		row-major binary digits.
+
+		"""
+		body = OrderedDict([
+			('stages', list(self.scope.data.keys())),
+			('scope', (self.scope.matrix + ord('0')).tobytes().decode('ascii')),
+		])
+		return '\n'.join([
+			'%s %s' % (SIGNATURE, FORMAT_VERSION),
+			json.dumps(self.header),
+			json.dumps(body),
+		]).encode('utf-8') + b'\n'
 
 
 class DataModel(object):
@@ -108,7 +188,7 @@ class DataModel(object):
 		Parameters
 		----------
 		stage_count : int
-		value : int or TableCheckBox
+		value : int or callable
 
 		"""
 		self.clear()
@@ -128,10 +208,14 @@ class DataModel(object):
 
 class ScopeModel(DataModel):
 	"""
-	A ``DataModel`` whose list values are binary integers.
+	A ``DataModel`` whose values are binary integers.
 
 	This subclass is to contain responses to yes or no questions (as indicated 
-	by binary integers) and may be serialized.
+	by binary integers) and may be serialized. Responses are stored in a 
+	stages x features ``uint8`` matrix; each row is labeled by a stage.
+
+	Dict-style access is kept for existing callers; ``scope[stage]`` and 
+	``scope.data[stage]`` return the row of `stage` as a ``list``.
 
 	Parameters
 	----------
@@ -142,12 +226,133 @@ class ScopeModel(DataModel):
 
 	Attributes
 	----------
-	data : OrderedDict
+	data : ScopeModel
+		This instance, for compatibility with ``OrderedDict`` based callers.
+	matrix : ndarray
 		Underlying data source
+	stages : list
+		Stage labels, in row order.
+	dirty : bool
 
 	"""
 	def __init__(self, is_curtis, feature_count):
+		self.feature_count = feature_count
+		self._stages = []
+		self._index = {}
+		self._matrix = np.zeros((0, feature_count), np.uint8)
 		super(ScopeModel, self).__init__(is_curtis, feature_count)
+		self.dirty = False
+
+	def __setstate__(self, state):
+		# Legacy pickles hold the scope in an OrderedDict
+		legacy = state.pop('data', None)
+		self.__dict__.update(state)
+		if legacy is not None:
+			self._stages = []
+			self._index = {}
+			self._matrix = np.zeros((0, self.feature_count), np.uint8)
+			self.assign(list(legacy.keys()), list(legacy.values()))
+
+	@property
+	def data(self):
+		return self
+
+	@data.setter
+	def data(self, value):
+		# DataModel.__init__ assigns an empty OrderedDict
+		self.assign(list(value.keys()), [list(i) for i in value.values()])
+
+	@property
+	def matrix(self):
+		return self._matrix
+
+	@property
+	def stages(self):
+		return list(self._stages)
+
+	def __len__(self):
+		return len(self._stages)
+
+	def __iter__(self):
+		return iter(self.stages)
+
+	def __contains__(self, stage):
+		return stage in self._index
+
+	def __getitem__(self, stage):
+		return self._matrix[self._index[stage]].tolist()
+
+	def __setitem__(self, stage, row):
+		row = np.asarray(row, np.uint8)
+		if stage in self._index:
+			i = self._index[stage]
+			if not np.array_equal(self._matrix[i], row):
+				self._matrix[i] = row
+				self.dirty = True
+		else:
+			self._index[stage] = len(self._stages)
+			self._stages.append(stage)
+			self._matrix = np.vstack([self._matrix, row[np.newaxis]])
+			self.dirty = True
+
+	def keys(self):
+		return self.stages
+
+	def values(self):
+		return self._matrix.tolist()
+
+	def items(self):
+		return list(zip(self._stages, self.values()))
+
+	def index(self, stage):
+		"""Returns the row index of a stage label.
+
+		Parameters
+		----------
+		stage : str
+
+		Raises
+		------
+		KeyError
+			If `stage` is not in the scope.
+
+		"""
+		return self._index[stage]
+
+	def assign(self, stages, matrix):
+		"""Replace the entire scope.
+
+		Rows shorter than `feature_count` are padded with zeros and longer 
+		rows are truncated.
+
+		Parameters
+		----------
+		stages : list
+			Stage labels.
+		matrix : array_like
+			One row per stage label.
+
+		"""
+		stages = [str(i) for i in stages]
+		values = np.zeros((len(stages), self.feature_count), np.uint8)
+		if isinstance(matrix, np.ndarray):
+			width = min(matrix.shape[1] if matrix.ndim == 2 else 0, 
+				self.feature_count)
+			values[:, :width] = matrix[:, :width]
+		else:
+			for i, row in enumerate(matrix):
+				row = [int(j) for j in row][:self.feature_count]
+				values[i, :len(row)] = row
+		if stages == self._stages and np.array_equal(values, self._matrix):
+			return
+		self._stages = stages
+		self._index = dict((stage, i) for i, stage in enumerate(stages))
+		self._matrix = values
+		self.dirty = True
+
+	def clear(self):
+		"""Empty ``ScopeModel``."""
+		self.assign([], [])
 
 	def init(self, stage_count):
 		"""Initialize with zeros (unselected options).
@@ -157,103 +362,193 @@ class ScopeModel(DataModel):
 		stage_count : int
 
 		"""
-		super(ScopeModel, self).init(stage_count, 0)
+		stage_labels = Rotor.stage_names(stage_count, self.is_curtis)
+		self._stages = [i.replace('Stage ', '') for i in stage_labels]
+		self._index = dict((stage, i) for i, stage in enumerate(self._stages))
+		self._matrix = np.zeros((stage_count, self.feature_count), np.uint8)
+		self.dirty = True
 
-	def update(self, table_map):
-		"""Map object content from a ``TableMap`` instance.
+	def update(self, table_model):
+		"""Map object content from a ``ScopeTableModel`` instance.
 
 		Parameters
 		----------
-		table_map : TableMap
+		table_model : ScopeTableModel
 
 		"""
-		for key in table_map.data:
-			self.data[key] = []
-			for i in range(len(table_map.data.keys()[0])):
-				if table_map.data[key][i].isChecked():
-					self.data[key].append(1)
-				else:
-					self.data[key].append(0)
+		self.assign(table_model.stages, table_model.matrix)
 
 
-class TableMap(DataModel):
-	"""
-	A ``DataModel`` whose list values are ``TableCheckBox`` objects.
+def read_header(path):
+	"""Read project metadata without decoding the project body.
 
-	This subclass is to contain responses to yes or no questions (as indicated 
-	by the ``TableCheckBox`` checked states) and cannot be serialized; it exists 
-	only to hold temporary graphical state. 
-	
 	Parameters
 	----------
-	is_curtis : bool
-		An assertion that a machine contains a curtis stage.
-	feature_count : int
-		The number of possible measurement features in an axial inspection.
+	path : str
+		Absolute path to data file.
 
-	Attributes
-	----------
-	data : OrderedDict
-		Underlying data source
+	Returns
+	-------
+	dict or None
+		``None`` if the file is not in the versioned project format.
 
-	Notes
-	-----
-	To save the state of a ``TableMap`` object, map the instance to a 
-	``ScopeModel`` instace.
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
 
 	"""
-	def __init__(self, is_curtis, feature_count):
-		super(TableMap, self).__init__(is_curtis, feature_count)
-		
-	def init(self, stage_count):
-		"""Initialize with unchecked ``TableCheckBox`` objects.
-				
-		Parameters
-		----------
-		stage_count : int
-		
-		"""
-		super(TableMap, self).init(stage_count, TableCheckBox)
+	with open(path, 'rb') as project:
+		if not _is_versioned(project.readline()):
+			return
+		return json.loads(project.readline().decode('utf-8'))
 
-	def update(self, scope_model):
-		"""Map object content from a ``ScopeModel`` instance.
 
-		Parameters
-		----------
-		scope_model : ScopeModel
+def _is_versioned(line):
+	"""Returns True if `line` is a project file signature line."""
+	return line.decode('utf-8').startswith(SIGNATURE)
+
+
+def _from_parts(path, header, stages, rows):
+	"""Build a ``Data`` instance from decoded project contents.
+
+	Parameters
+	----------
+	path : str
+	header : dict
+	stages : list
+	rows : list or ndarray
+		Scope values of each stage.
+
+	"""
+	data = Data(
+		str(header['job_num']),
+		str(header['phase']),
+		str(header['machine_type']),
+		header['is_curtis'],
+		path
+	)
+	data.scope.assign(stages, rows)
+	data.mark_clean()
+	return data
 
-		"""
-		self.clear()
-		for stage in scope_model.data:
-			self.data[stage] = []
-			for item in scope_model.data[stage]:
-				self.data[stage].append(TableCheckBox(checked=(item == 1)))
 
+def _load_legacy(path, contents):
+	"""Decode a legacy (pickled or JSON) project file.
 
-def get_data_source(path):
+	Parameters
+	----------
+	path : str
+	contents : str
+
+	Returns
+	-------
+	data : Data
+
+	"""
+	if contents.lstrip().startswith(b'['):
+		# JSON projects that predate the pickled format
+		header, scope = json.loads(
+			contents.decode('utf-8'), object_pairs_hook=OrderedDict
+		)
+		header = {
+			'job_num': header['Job Number'],
+			'phase': header['Phase'],
+			'machine_type': header['Machine Type'],
+			'is_curtis': header['Curtis Stage'],
+		}
+		return _from_parts(path, header, scope.keys(), scope.values())
+	legacy = pickle.loads(contents)
+	header = {
+		'job_num': legacy.job_num,
+		'phase': legacy.phase,
+		'machine_type': legacy.machine_type,
+		'is_curtis': legacy.is_curtis,
+	}
+	return _from_parts(
+		path, header, list(legacy.scope.data.keys()), 
+		list(legacy.scope.data.values())
+	)
+
+
+def get_data_source(path, migrate=True):
 	"""Retrieve data source object from file.
 
+	Legacy project files are migrated to the versioned project format on first
+	open. The original file is kept with a '.legacy' extension.
+
 	Parameters
 	----------
 	path : str
 		Absolute path to data file.
+	migrate : bool
+		If False, legacy project files are read but not rewritten.
 
 	Returns
 	-------
 	data : Data
 
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+
 	"""
-	try:
-		with open(path, 'rb') as project:
-			data = pickle.load(project)
-	except IOError:
-		raise
-	else:
+	with open(path, 'rb') as project:
+		contents = project.read()
+
+	lines = contents.split(b'\n')
+	if _is_versioned(lines[0]):
+		header = json.loads(lines[1].decode('utf-8'))
+		body = json.loads(lines[2].decode('utf-8'))
+		width = header['scope_shape'][1]
+		rows = np.frombuffer(body['scope'].encode('ascii'), np.uint8) - ord('0')
+		rows = rows.reshape(len(body['stages']), width)
+		return _from_parts(path, header, body['stages'], rows)
+
+	data = _load_legacy(path, contents)
+	if not migrate:
 		return data
+	try:
+		shutil.copy2(path, path + '.legacy')
+		data.save(force=True)
+	except IOError as error:
+		# Read-only share; keep working from the legacy file.
+		logging.warning(error)
+	return data
 
 
 if __name__ == '__main__':
-	pass
-
-
-
+	# Compare the sample projects as legacy pickles and in the versioned format.
+	def timed(func, path):
+		start = default_timer()
+		for i in range(1000):
+			func(path)
+		# Milliseconds per call
+		return default_timer() - start
+
+	def load_pickle(path):
+		with open(path, 'rb') as f:
+			return pickle.load(f)
+
+	test_dir = os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'
+	)
+	temp_dir = tempfile.mkdtemp()
+	for filename in sorted(os.listdir(test_dir)):
+		if not filename.endswith('.rw'):
+			continue
+		with open(os.path.join(test_dir, filename), 'rb') as f:
+			data = _load_legacy(os.path.join(temp_dir, filename), f.read())
+		legacy = os.path.join(temp_dir, filename + '.pickle')
+		with open(legacy, 'wb') as f:
+			pickle.dump(data, f)
+		data.save(force=True)
+		print('%s: %s -> %s bytes, load %.3f -> %.3f ms, header %.3f ms' % (
+			filename, 
+			os.path.getsize(legacy), 
+			os.path.getsize(data.filepath), 
+			timed(load_pickle, legacy), 
+			timed(get_data_source, data.filepath), 
+			timed(read_header, data.filepath)
+		))
@@ -2,8 +2,9 @@ import os
 import sys
 import string
 import itertools
+import logging
 from PyQt4 import QtGui, QtCore
-from pyqtauto.widgets import Dialog, ImageButton
+from pyqtauto.widgets import Dialog, ImageButton, ExceptionMessageBox
 from view import InputListView, InspectionCommandView
 from inspection import Diameter
 from template import Template
@@ -22,12 +23,13 @@ class DiameterSessionView(Dialog):
 
 	"""
 	def __init__(self, return_callback, import_callback, start_callback, 
-			finish_callback, delete_callback):
+			finish_callback, delete_callback, cancel_callback):
 		self._return_callback = return_callback
 		self._import_callback = import_callback
 		self._start_callback = start_callback
 		self._finish_callback = finish_callback
 		self._delete_callback = delete_callback
+		self._cancel_callback = cancel_callback
 		super(DiameterSessionView, self).__init__('Diameter Session')
 		self._build_gui()
 
@@ -45,6 +47,7 @@ class DiameterSessionView(Dialog):
 		self._input.enter_btn.clicked.connect(self._import_callback)
 		self._cmd.start_btn.clicked.connect(self._start_callback)
 		self._cmd.finish_btn.clicked.connect(self._finish_callback)
+		self._cmd.cancel_btn.clicked.connect(self._cancel_callback)
 		self.connect(
 			QtGui.QShortcut(
 				QtGui.QKeySequence(QtCore.Qt.Key_Delete), 
@@ -65,6 +68,17 @@ class DiameterSessionView(Dialog):
 		"""list: Selected ``QListWidget`` items."""
 		return self._input.selected_items
 
+	def set_macro_progress(self, job, status):
+		"""Display the status of a PolyWorks macro.
+
+		Parameters
+		----------
+		job : MacroJob
+		status : str
+
+		"""
+		self._cmd.set_job(job, status)
+
 	def update_labels(self, labels):
 		"""Refresh ``QListWidget`` items.
 
@@ -98,7 +112,6 @@ class DiameterSessionController(object):
 	def __init__(self, data):
 		self._data = data
 		self._diameter = Diameter(self._data.path)
-		self._diameter.polyworks.connect_to_inspector()
 		self._alphabet = list(string.ascii_uppercase)
 		self._alphabet.extend(
 			[i+b for i in self._alphabet for b in self._alphabet]
@@ -108,8 +121,11 @@ class DiameterSessionController(object):
 			self._on_click_import,
 			self._on_click_start,
 			self._on_click_finish,
-			self._on_click_delete
+			self._on_click_delete,
+			self._on_click_cancel
 		)
+		self._finish_job = None
+		self._diameter.progress.changed.connect(self._on_macro_progress)
 
 	def _update_view(self):
 		"""Refresh widgets."""
@@ -233,16 +249,41 @@ class DiameterSessionController(object):
 
 	def _on_click_finish(self):
 		"""Produce inspection output and close the view window."""
-		self._diameter.macro_exec(
-			self._diameter.MACRO_OUT,
-			self._diameter.OUTPUT_FILE,
-			Path.MACROS
-		)
-		self.view.accept()
+		if self._finish_job is not None and not self._finish_job.finished:
+			return
+		self._finish_job = self._diameter.export()
+
+	def _on_click_cancel(self):
+		"""Cancel running and queued macros."""
+		self._diameter.macro_cancel()
+
+	def _on_macro_progress(self, job, status):
+		"""Display macro status; close the view once the output is exported.
+
+		Parameters
+		----------
+		job : MacroJob
+		status : str
+			The status emitted by the worker thread.
+
+		"""
+		self.view.set_macro_progress(job, status)
+		if status == job.FAILED:
+			logging.warning(job.error)
+			ExceptionMessageBox(job.error).exec_()
+		elif status == job.DONE and job is self._finish_job:
+			try:
+				self._diameter.merge_export()
+			except (IOError, KeyError) as error:
+				logging.warning(error)
+				ExceptionMessageBox(error).exec_()
+			else:
+				self.view.accept()
 
 	def _on_click_import(self):
 		"""Send an existing workscope template to PolyWorks for inspection."""
-		if Template.copied(self._data.path, 'Diameter'):
+		suggestions, fleet = Template.similar_projects(self._data)
+		if Template.copied(self._data.path, 'Diameter', suggestions, fleet):
 			self._diameter.macro_exec(
 				self._diameter.MACRO_IN,
 				self._diameter.SCOPE_FILE,
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+
+
+class DocScript(object):
+	"""
+	An AutoCAD script that documents an inspection session in one shot.
+
+	The script is plain text (AutoLISP expressions, one per line) so it can be
+	generated and compared without AutoCAD. Table styling beyond alignment and
+	text heights is left to the drawing's table style.
+
+	Parameters
+	----------
+	layout_name : str
+
+	See Also
+	--------
+	turbodoc.TurboDoc.document
+
+	"""
+	def __init__(self, layout_name):
+		self._lines = [
+			'(vl-load-com)',
+			'(setq rw:doc (vla-get-ActiveDocument (vlax-get-acad-object)))',
+			'(vla-put-ActiveLayout rw:doc (vla-Item (vla-get-Layouts rw:doc) '
+			'%s))' % self.quote(layout_name),
+		]
+
+	@staticmethod
+	def quote(value):
+		"""Returns `value` as an AutoLISP string literal.
+
+		Parameters
+		----------
+		value : object
+
+		"""
+		text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+		return '"%s"' % text
+
+	def add_table(self, grid):
+		"""Create and fill a ``DocTable`` equivalent.
+
+		Parameters
+		----------
+		grid : TableGrid
+
+		"""
+		x, y = grid.origin
+		self._lines.extend([
+			'(setq rw:table (vla-AddTable (vla-get-Block (vla-get-ActiveLayout '
+			'rw:doc)) (vlax-3d-point %.4f %.4f 0.0) %s %s %.4f %.4f))' % (
+				x, y, grid.row_count, grid.col_count, grid.DATA_ROW_HEIGHT,
+				grid.TABLE_WIDTH / grid.col_count
+			),
+			'(vla-put-RegenerateTableSuppressed rw:table :vlax-true)',
+			'(vla-SetText rw:table 0 0 %s)' % self.quote(grid.TITLE),
+			'(vla-SetCellTextHeight rw:table 0 0 %s)' % grid.TITLE_TEXT_HEIGHT,
+			'(vla-SetRowHeight rw:table 0 %s)' % grid.TITLE_ROW_HEIGHT,
+			'(vla-SetAlignment rw:table acDataRow acMiddleCenter)',
+			'(vla-SetTextHeight rw:table acDataRow %s)' % grid.DATA_TEXT_HEIGHT,
+		])
+		self._lines.extend([
+			'(vla-SetCellTextHeight rw:table %s %s %s)' % (
+				grid.ROW_OFFSET, col, grid.DATA_TEXT_HEIGHT
+			)
+			for col in range(grid.col_count)
+		])
+		self._lines.extend([
+			'(vla-SetText rw:table %s %s %s)' % (row, col, self.quote(value))
+			for row, col, value in grid.cells()
+		])
+		self._lines.append(
+			'(vla-put-RegenerateTableSuppressed rw:table :vlax-false)'
+		)
+
+	def replace_text(self, data):
+		"""Replace placeholder text values with measurements.
+
+		When a Name is repeated, the first measurement is used.
+
+		Parameters
+		----------
+		data : DataFrame
+			Placeholder text values are found in the 'Name' column and the
+			corresponding measurements are found in the 'Meas' column.
+
+		See Also
+		--------
+		turbodoc.TurboDoc.replace_text_with_data
+
+		"""
+		names = []
+		index = {}
+		for name, meas in zip(data['Name'], data['Meas']):
+			if name not in index:
+				names.append(name)
+				index[name] = meas
+		self._lines.append('(setq rw:index nil)')
+		self._lines.extend([
+			'(setq rw:index (cons (cons %s %s) rw:index))' % (
+				self.quote(name), self.quote(index[name]))
+			for name in names
+		])
+		self._lines.append(
+			'(if (setq rw:ss (ssget "_X" \'((0 . "TEXT,MTEXT")))) '
+			'(repeat (setq rw:i (sslength rw:ss)) '
+			'(setq rw:obj (vlax-ename->vla-object '
+			'(ssname rw:ss (setq rw:i (1- rw:i))))) '
+			'(if (setq rw:hit (assoc (vla-get-TextString rw:obj) rw:index)) '
+			'(vla-put-TextString rw:obj (cdr rw:hit)))))'
+		)
+
+	def regen(self):
+		"""Regenerate all viewports."""
+		self._lines.append('(vla-Regen rw:doc acAllViewports)')
+
+	def signal_done(self, filepath):
+		"""Create an empty file once the preceding lines have run.
+
+		AutoCAD runs scripts asynchronously; the caller waits for this file.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to the sentinel file.
+
+		"""
+		self._lines.append(
+			'(close (open %s "w"))' % self.quote(filepath.replace('\\', '/'))
+		)
+
+	def dumps(self):
+		"""Returns the script as a ``str``."""
+		return '\n'.join(self._lines) + '\n'
+
+	def dump(self, filepath):
+		"""Save the script to file.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a SCR file.
+
+		Returns
+		-------
+		filepath : str
+
+		"""
+		with open(filepath, 'w') as script:
+			script.write(self.dumps())
+		return filepath
+
+
+def _sample_scripts(test_dir):
+	"""Yield the golden filename and ``DocScript`` of each sample project.
+
+	The legacy sample projects in `test_dir` are documented against the
+	sample axial export (Axials.csv).
+
+	"""
+	import measurements
+	from machine import Rotor
+	from grid import TableGrid, has_bal_drum, table_text_split
+
+	data = measurements.load(os.path.join(test_dir, 'Axials.csv'))
+	data = data.dropna(subset=['Meas'])
+	table_data, text_data = table_text_split(data)
+	for filename in sorted(os.listdir(test_dir)):
+		if not filename.endswith('.rw'):
+			continue
+		with open(os.path.join(test_dir, filename)) as project:
+			header, scope = json.load(project)
+		machine = Rotor.get_machine_type_as_object(header['Machine Type'])
+		script = DocScript('Axial')
+		try:
+			row_headers = machine.feature_rows(scope)
+		except AttributeError:
+			# Machine has no axial feature table
+			pass
+		else:
+			grid = TableGrid(
+				row_headers,
+				Rotor.stage_names(len(scope), header['Curtis Stage']),
+				has_bal_drum(table_data)
+			)
+			grid.populate(table_data)
+			script.add_table(grid)
+		script.replace_text(text_data)
+		script.regen()
+		yield filename.replace('.rw', '.scr'), script
+
+
+if __name__ == '__main__':
+	# Rewrite the golden files after an intended change:
+	#   python docscript.py --update
+	# tests/test_rotoworks.py checks the generated scripts against them.
+	test_dir = os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		'tests'
+	)
+	if '--update' in sys.argv:
+		for filename, script in _sample_scripts(test_dir):
+			script.dump(os.path.join(test_dir, 'golden', filename))
@@ -0,0 +1,37 @@
+"""
+rotoworks.files replaces files in a single step, so a reader or a crash never
+finds a file missing or partially written.
+
+"""
+import os
+
+
+def replace_file(src, dst):
+	"""Move `src` over `dst` in a single step.
+
+	On Windows, ``os.rename`` cannot replace an existing file, and removing
+	`dst` first leaves a moment where it does not exist. ``MoveFileExW``
+	replaces it atomically on the same volume.
+
+	Parameters
+	----------
+	src : str
+	dst : str
+		Must be on the same volume as `src`.
+
+	Raises
+	------
+	OSError
+		If `src` cannot be moved.
+
+	"""
+	if os.name == 'nt':
+		import ctypes
+		MOVEFILE_REPLACE_EXISTING = 0x1
+		MOVEFILE_WRITE_THROUGH = 0x8
+		if not ctypes.windll.kernel32.MoveFileExW(
+				unicode(src), unicode(dst), 
+				MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+			raise ctypes.WinError()
+	else:
+		os.rename(src, dst)
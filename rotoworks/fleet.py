@@ -0,0 +1,215 @@
+"""
+rotoworks.fleet compares a project with every archived job of its machine type.
+
+"""
+import logging
+import warnings
+from timeit import default_timer
+import numpy as np
+import pandas as pd
+from archive import MeasurementArchive
+
+
+class FleetEnvelope(object):
+	"""
+	Per-feature statistics of the archived jobs of a machine type.
+
+	Envelopes are cached in memory until the machine type's archive partitions
+	are rewritten by an ingest.
+
+	Parameters
+	----------
+	archive : MeasurementArchive or None
+
+	Attributes
+	----------
+	PERCENTILES : tuple
+	Z_LIMIT : float
+		Measurements further than this many standard deviations from the fleet
+		mean are out of family.
+	MIN_JOBS : int
+		Features measured by fewer jobs are never flagged.
+
+	"""
+	PERCENTILES = (5, 25, 50, 75, 95)
+	Z_LIMIT = 3.0
+	MIN_JOBS = 5
+	# Only measurement rows are compared
+	# See template.Template.formatted
+	CONTROLS = ('Custom', '3D Distance', 'Diameter', 'Meas')
+
+	_cache = {}
+
+	def __init__(self, archive=None):
+		self._archive = MeasurementArchive() if archive is None else archive
+
+	@staticmethod
+	def matrix(rows):
+		"""Pivot archived rows into a jobs x features matrix.
+
+		When a project repeats a feature name, its first measurement is used.
+
+		Parameters
+		----------
+		rows : dict
+			As returned by ``MeasurementArchive.query``.
+
+		Returns
+		-------
+		projects, names, values : ndarray, ndarray, ndarray
+			`values` has one row per project and one column per name, and is
+			NaN where a project did not measure a feature.
+
+		"""
+		projects, project_codes = np.unique(rows['project'], return_inverse=True)
+		names, name_codes = np.unique(rows['name'], return_inverse=True)
+		values = np.full((len(projects), len(names)), np.nan)
+		# Reversed so that the first measurement is written last
+		values[project_codes[::-1], name_codes[::-1]] = rows['meas'][::-1]
+		return projects, names, values
+
+	def envelope(self, machine_type, stage_count, inspection, exclude=None):
+		"""Returns the fleet envelope of each feature as a ``DataFrame``.
+
+		Parameters
+		----------
+		machine_type : str
+		stage_count : int
+		inspection : str
+			One of ``archive.INSPECTIONS``.
+		exclude : str or None
+			Absolute path to a project file left out of the fleet, normally
+			the project being compared.
+
+		Returns
+		-------
+		DataFrame
+			Indexed by feature name, with the number of 'Jobs' that measured
+			each feature, its 'Mean', 'Std', 'Min', 'Max' and a 'P<n>' column
+			for each of `PERCENTILES`.
+
+		"""
+		key = (machine_type, stage_count, inspection, exclude)
+		generation = self._archive.generation(machine_type)
+		cached = self._cache.get(key)
+		if cached is not None and cached[0] == generation:
+			return cached[1]
+		return self._build(key, generation)
+
+	def size(self, machine_type, stage_count, inspection, exclude=None):
+		"""Returns the number of archived jobs in a fleet envelope.
+
+		Takes the parameters of `envelope`.
+
+		"""
+		self.envelope(machine_type, stage_count, inspection, exclude)
+		return self._cache[(machine_type, stage_count, inspection, exclude)][2]
+
+	def _build(self, key, generation):
+		machine_type, stage_count, inspection, exclude = key
+		start = default_timer()
+		rows = self._archive.query(
+			machine_type,
+			inspection=inspection,
+			controls=list(self.CONTROLS),
+			stage_count=stage_count
+		)
+		if exclude is not None:
+			mask = rows['project'] != exclude
+			rows = dict((i, rows[i][mask]) for i in rows)
+		projects, names, values = self.matrix(rows)
+		if len(projects) == 0:
+			# No comparable jobs
+			values = np.full((1, 0), np.nan)
+			percentiles = np.full((len(self.PERCENTILES), 0), np.nan)
+		with warnings.catch_warnings():
+			# Features measured by no job or a single job
+			warnings.simplefilter('ignore', RuntimeWarning)
+			stats = [
+				('Jobs', (~np.isnan(values)).sum(axis=0)),
+				('Mean', np.nanmean(values, axis=0)),
+				('Std', np.nanstd(values, axis=0, ddof=1)),
+				('Min', np.nanmin(values, axis=0)),
+				('Max', np.nanmax(values, axis=0)),
+			]
+			if len(projects):
+				percentiles = np.nanpercentile(
+					values, self.PERCENTILES, axis=0
+				)
+		stats.extend(
+			('P%s' % p, percentiles[i]) for i, p in enumerate(self.PERCENTILES)
+		)
+		envelope = pd.DataFrame(
+			dict(stats), index=pd.Index(names, name='Name'),
+			columns=[i[0] for i in stats]
+		)
+		self._cache[key] = (generation, envelope, len(projects))
+		logging.info('Fleet envelope of %s %s-stage %s jobs in %.3fs' % (
+			len(projects), stage_count, machine_type, default_timer() - start))
+		return envelope
+
+	def compare(self, data, machine_type, stage_count, inspection,
+			exclude=None):
+		"""Compare project measurements with the fleet envelope.
+
+		Parameters
+		----------
+		data : DataFrame
+			Contains 'Name' and 'Meas' columns.
+		machine_type : str
+		stage_count : int
+		inspection : str
+		exclude : str or None
+			See `envelope`.
+
+		Returns
+		-------
+		DataFrame
+			The 'Name' and 'Meas' of each feature of `data`, its envelope, its
+			'Z' score and whether it is 'Out Of Family'.
+
+		"""
+		envelope = self.envelope(machine_type, stage_count, inspection, exclude)
+		data = data.drop_duplicates('Name')
+		comparison = pd.DataFrame({
+			'Name': data['Name'].astype(str).values,
+			'Meas': pd.to_numeric(data['Meas'], errors='coerce').values,
+		}, columns=['Name', 'Meas'])
+		fleet = envelope.reindex(comparison['Name'].values)
+		for column in fleet.columns:
+			comparison[column] = fleet[column].values
+		comparison['Jobs'] = comparison['Jobs'].fillna(0).astype(int)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			z = (comparison['Meas'].values - comparison['Mean'].values) / \
+				comparison['Std'].values
+		comparison['Z'] = z
+		comparison['Out Of Family'] = (
+			(comparison['Jobs'].values >= self.MIN_JOBS) &
+			(np.abs(np.nan_to_num(z)) > self.Z_LIMIT)
+		)
+		return comparison
+
+
+if __name__ == '__main__':
+	# Time envelope calculation on a synthetic fleet of 5000 jobs.
+	rng = np.random.RandomState(0)
+	job_count, feature_count = 5000, 60
+	rows = {
+		'project': np.repeat(
+			np.array(['job%s.rw' % i for i in range(job_count)]), feature_count
+		),
+		'name': np.tile(
+			np.array(['Feature %s' % i for i in range(feature_count)]),
+			job_count
+		),
+		'meas': rng.normal(10, 0.01, job_count * feature_count),
+	}
+	start = default_timer()
+	projects, names, values = FleetEnvelope.matrix(rows)
+	print('Pivoted %s rows in %.3fs' % (
+		len(rows['meas']), default_timer() - start))
+	start = default_timer()
+	np.nanpercentile(values, FleetEnvelope.PERCENTILES, axis=0)
+	np.nanmean(values, axis=0), np.nanstd(values, axis=0)
+	print('Envelope of %s jobs in %.3fs' % (
+		job_count, default_timer() - start))
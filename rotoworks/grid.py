@@ -0,0 +1,303 @@
+import re
+import logging
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+
+# Debugging logger
+logger = logging.getLogger('debugger')
+
+
+class TableGrid(object):
+	"""
+	The cell texts of an axial ``DocTable``, computed before AutoCAD is touched.
+
+	Row 0 is reserved for the table title. Row 1 contains the column headers
+	and every following row contains a feature header and its measurements.
+
+	Parameters
+	----------
+	row_headers : list
+	col_headers : list
+	bal_drum : int
+
+	Attributes
+	----------
+	row_headers : list
+	col_headers : list
+	values : dict
+		Measurement values keyed by (row, col).
+
+	"""
+	ROW_OFFSET = 1
+	COL_OFFSET = 1
+	TITLE = 'Axial Measurements From Active Face'
+	TABLE_POS = .061
+	TITLE_ROW_HEIGHT = .2533
+	TITLE_TEXT_HEIGHT = .1
+	DATA_ROW_HEIGHT = .2133
+	DATA_TEXT_HEIGHT = .07
+	TABLE_WIDTH = 10.375
+
+	def __init__(self, row_headers, col_headers, bal_drum):
+		self.row_headers = list(row_headers)
+		self.col_headers = list(col_headers)
+		self.values = {}
+
+		# Adjust headers if balance drum was measured
+		if bal_drum:
+			self.row_headers.append('B.D. Face')
+			self.col_headers.append('B.D.')
+
+	@property
+	def row_count(self):
+		"""int: The number of table rows, title row included."""
+		return len(self.row_headers) + self.ROW_OFFSET
+
+	@property
+	def col_count(self):
+		"""int: The number of table columns, header column included."""
+		return len(self.col_headers) + self.COL_OFFSET
+
+	@property
+	def origin(self):
+		"""tuple: The X and Y coordinates of the top-left table corner.
+
+		The overall height is calculated, adjusted for margin, then returned 
+		as the Y coordinate.
+
+		"""
+		data_row_height = len(self.row_headers) * self.DATA_ROW_HEIGHT
+		table_height = data_row_height + self.TITLE_ROW_HEIGHT
+		return self.TABLE_POS, table_height + self.TABLE_POS
+
+	def position(self, meas_item):
+		"""Get the row and column index for a ``DocTable`` data item.
+
+		Parameters
+		----------
+		meas_item : str
+			Stage and feature names separated by "-", as found in the axial
+			inspection output file (Axials.csv). `meas_item` should be validated
+			prior to calling this function.
+
+		Returns
+		-------
+		row, col : int, int
+			The row and column index of the `meas_item`.
+
+		Raises
+		------
+		ValueError
+			If `meas_item` splits are not found in the "col_headers".
+		IndexError
+			If `meas_item` does not contain "-".
+
+		"""
+		item_split = meas_item.split('-')
+		stage = item_split[0]
+		col = self.col_headers.index(stage) + self.COL_OFFSET
+		feature = item_split[1]
+		row = self.row_headers.index(feature) + self.ROW_OFFSET
+		return row, col
+
+	def populate(self, data):
+		"""Place axial measurement data in the grid.
+
+		Parameters
+		----------
+		data : DataFrame
+			Contains axial measurement data.
+
+			The ['Name'] column should contain labels in "Stage-Feature" format.
+				Ex.) str: Stage 1-Eye Face
+
+			The ['Meas'] column should contain the corresponding measurements.
+				Ex.) float: 12.6255
+
+		"""
+		for name, meas in zip(data['Name'], data['Meas']):
+			try:
+				self.values[self.position(name)] = meas
+			except (ValueError, IndexError) as error:
+				logger.debug(error)
+
+	def headers(self):
+		"""Returns a ``list`` of (row, col, text) header cells."""
+		cells = [
+			(self.ROW_OFFSET, col + self.COL_OFFSET, text)
+			for col, text in enumerate(self.col_headers)
+		]
+		cells.extend([
+			(row + self.ROW_OFFSET, 0, text)
+			for row, text in enumerate(self.row_headers)
+		])
+		return cells
+
+	def cells(self):
+		"""Returns a ``list`` of (row, col, value) for every non-empty cell.
+
+		Headers come first, followed by measurements in row-major order.
+
+		"""
+		cells = self.headers()
+		cells.extend([
+			(row, col, self.values[(row, col)])
+			for row, col in sorted(self.values)
+		])
+		return cells
+
+
+def has_bal_drum(data):
+	"""Verify the existence of a balance drum measurement.
+
+	Parameters
+	----------
+	data : DataFrame
+
+	Returns
+	-------
+	int
+		1 if this session contains a balance drum measurement, else 0.
+
+	"""
+	try:
+		data[data['Name'] == 'B.D.-B.D. Face'].index[0]
+	except IndexError:
+		return 0
+	else:
+		return 1
+
+
+# Axial feature names, tried in order:
+#   'Stage 1 Eye Face Ref 2'  reference geometry ('Ref' anywhere)
+#   'To Distance A', 'Width B' distance and width dimensions
+#   'Stage 1-Eye Face'        table cell, "Stage-Feature"
+#   anything else             other
+# Dash-free dimension and other names carry a text label: their last word.
+_NAME = re.compile(r"""
+	(?P<ref_of>.*?)\ ?Ref\ ?(?P<ref>.*)
+	| (?P<dimension>.*?(?:To\ Distance|Width\ ).*)
+	| (?P<stage>[^-]*)-(?P<feature>[^-]*).*
+	| (?P<other>.*)
+""", re.VERBOSE | re.DOTALL)
+
+
+class AxialName(namedtuple('AxialName', 'kind stage feature ref label')):
+	"""
+	The typed fields of an axial feature name.
+
+	Attributes
+	----------
+	kind : {'ref', 'dimension', 'cell', 'other'}
+	stage : str or None
+		Table column header of a 'cell'.
+	feature : str or None
+		Table row header of a 'cell', or the referenced feature of a 'ref'.
+	ref : str or None
+		Reference index (e.g. '1' or 'Dist') of a 'ref'.
+	label : str or None
+		Text placeholder of a dash-free 'dimension' or 'other' name.
+
+	"""
+	__slots__ = ()
+
+	@classmethod
+	def parse(cls, name):
+		"""Returns the ``AxialName`` of `name`.
+
+		Parameters
+		----------
+		name : str
+
+		"""
+		match = _NAME.match(name)
+		if match.group('ref_of') is not None:
+			return cls(
+				'ref', None, match.group('ref_of'), match.group('ref'), None
+			)
+		if match.group('stage') is not None:
+			return cls(
+				'cell', match.group('stage'), match.group('feature'), None, None
+			)
+		kind = 'dimension' if match.group('dimension') is not None else 'other'
+		label = None if '-' in name else name.split(' ')[-1]
+		return cls(kind, None, None, None, label)
+
+
+def parse_names(names):
+	"""Parse each distinct name of a ``Series`` once.
+
+	Parameters
+	----------
+	names : Series
+
+	Returns
+	-------
+	codes : ndarray
+		Index of each name's ``AxialName`` in `parsed`.
+	parsed : list
+
+	"""
+	codes, uniques = pd.factorize(names.astype(str))
+	return codes, [AxialName.parse(name) for name in uniques]
+
+
+def table_text_split(data):
+	"""Split a DataFrame into two subsets.
+
+	The first subset is used to populate a ``DocTable`` and the	second is 
+	used to replace AutoCAD text objects with measurement data. Only '3D 
+	Distance' rows are used and reference geometry is left out.
+
+	Parameters
+	----------
+	data : DataFrame
+		As retrieved from an axial measurement session CSV file.
+
+	Returns
+	-------
+	table_data, text_data : DataFrame, DataFrame
+		The "Stage-Feature" rows, and the dimension rows with 'Name' replaced
+		by their text labels. Both are new frames; `data` is not modified.
+
+	See Also
+	--------
+	TurboDoc.replace_text_with_data
+
+	"""
+	logger.debug(data)
+	data = data[data['Control'].values == '3D Distance']
+	codes, parsed = parse_names(data['Name'])
+	is_cell = np.array([i.kind == 'cell' for i in parsed], dtype=bool)
+	labels = np.array([i.label for i in parsed], dtype=object)
+	table_data = data[is_cell[codes]]
+	logger.debug(table_data)
+	labels = labels[codes]
+	has_label = np.array([i is not None for i in labels], dtype=bool)
+	text_data = data[has_label].assign(Name=labels[has_label])
+	logger.debug(text_data)
+	return table_data, text_data
+
+
+if __name__ == '__main__':
+	# Time the split of the sample axial exports scaled up 100x.
+	import os
+	import glob
+	from timeit import default_timer
+	import measurements
+	test_dir = os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		'tests'
+	)
+	frames = [
+		measurements.load(filepath)
+		for filepath in glob.glob(os.path.join(test_dir, '*xials*.csv'))
+	]
+	data = pd.concat(frames * 100, ignore_index=True)
+	start = default_timer()
+	table_data, text_data = table_text_split(data)
+	print('Split %s rows into %s table and %s text rows in %.1f ms' % (
+		len(data), len(table_data), len(text_data),
+		(default_timer() - start) * 1000))
@@ -1,10 +1,12 @@
 import os
 import sys
-from PyQt4 import QtGui
+import logging
+from PyQt4 import QtGui, QtCore
 from pyqtauto.widgets import Dialog, DialogButtonBox
-from sulzer.extract import Extract, ProjectsFolderRootError
+from sulzer.extract import ProjectsFolderRootError
 from view import InputListView
-from core import Image, Path
+from core import Image, Path, projects_folder_root
+from project_index import ProjectIndex
 
 
 class HistoryView(Dialog):
@@ -14,6 +16,8 @@ class HistoryView(Dialog):
 	Parameters
 	----------
 	search_callback : callable
+	multiple : bool
+		Allow several projects to be selected.
 	
 	Attributes
 	----------
@@ -22,7 +26,7 @@ class HistoryView(Dialog):
 	btns : DialogButtonBox
 
 	"""
-	def __init__(self, search_callback):
+	def __init__(self, search_callback, multiple=False):
 		self._search_callback = search_callback
 		super(HistoryView, self).__init__('Open Project')
 		self.input_view = InputListView(
@@ -31,6 +35,7 @@ class HistoryView(Dialog):
 			Image.SEARCH
 		)
 		self.input_view.listbox.setSelectionMode(
+			QtGui.QAbstractItemView.ExtendedSelection if multiple else
 			QtGui.QAbstractItemView.SingleSelection
 		)
 		self.input_view.input_le.returnPressed.connect(self._search_callback)
@@ -46,71 +51,230 @@ class HistoryView(Dialog):
 		return str(self.input_view.input_le.text())
 
 
+class ProjectSearch(QtCore.QThread):
+	"""
+	Walks a job folder on the network share and streams the project files it 
+	finds.
+
+	Parameters
+	----------
+	job_num : str
+
+	Attributes
+	----------
+	found : pyqtSignal(str, str, str)
+		Emitted with the job number, filename and directory of each project.
+	failed : pyqtSignal(str, str)
+		Emitted with the job number and an explanation.
+	done : pyqtSignal(str)
+		Emitted with the job number once the walk is complete.
+
+	"""
+	found = QtCore.pyqtSignal(str, str, str)
+	failed = QtCore.pyqtSignal(str, str)
+	done = QtCore.pyqtSignal(str)
+
+	def __init__(self, job_num):
+		self.job_num = job_num
+		self._cancelled = False
+		super(ProjectSearch, self).__init__()
+
+	def cancel(self):
+		"""Stop streaming results; the walk ends at the next directory."""
+		self._cancelled = True
+
+	def run(self):
+		try:
+			job_root = os.path.basename(
+				projects_folder_root(self.job_num)
+			)
+		except ProjectsFolderRootError:
+			self.failed.emit(self.job_num, 'No PROJECTS FOLDER found')
+			return
+
+		top_level = os.path.join(Path.JOBS, job_root, self.job_num)
+		if not os.path.isdir(top_level):
+			# Missing, or the share is unreachable
+			self.failed.emit(self.job_num, 'No job folder found')
+			return
+		mtimes = {}
+		errors = []
+		for root, dirs, files in os.walk(top_level, onerror=errors.append):
+			if self._cancelled:
+				return
+			for filename in files:
+				if filename.endswith('.rw'):
+					try:
+						mtimes[os.path.join(root, filename)] = os.path.getmtime(
+							os.path.join(root, filename)
+						)
+					except OSError:
+						continue
+					self.found.emit(self.job_num, filename, root)
+		if self._cancelled:
+			return
+		if errors:
+			# The index is only synchronized with a complete walk; projects in
+			# unreadable folders would be purged
+			logging.warning('Incomplete search of %s: %s' % (
+				top_level, errors[0]))
+		else:
+			ProjectIndex().update(top_level, mtimes)
+		self.done.emit(self.job_num)
+
+
 class HistoryController(object):
 	"""
 	Provides a functional GUI for querying historical project data.
 
+	Indexed projects are listed immediately, then the job folder is searched in
+	the background and new projects are appended as they are found.
+
+	Parameters
+	----------
+	multiple : bool
+		Allow several projects to be selected.
+
 	Attributes
 	----------
+	SEARCH_TIMEOUT : int
+		Milliseconds before a search of an unreachable share is abandoned.
 	project : str or None
+	selected_projects : list
 	projects : dict or None
 	view : HistoryView
 
 	"""
-	def __init__(self):
+	SEARCH_TIMEOUT = 15000
+	_NOT_FOUND = 'No projects found'
+
+	def __init__(self, multiple=False):
 		self._projects = {}
-		self.view = HistoryView(self._on_click_search)
+		self._index = ProjectIndex()
+		self._search = None
+		self._searches = []
+		self.view = HistoryView(self._on_click_search, multiple)
+		self.view.input_view.input_le.textEdited.connect(self._cancel_search)
+		self.view.finished.connect(self._cancel_search)
 
 	@property
 	def project(self):
 		"""str or None: The absolute path of the selected filename."""
 		try:
-			selection = self.view.input_view.selected_items[0]
-			return os.path.join(self.projects[selection], selection)
-		except (IndexError, KeyError, TypeError):
+			return self.selected_projects[0]
+		except IndexError:
 			return
 
+	@property
+	def selected_projects(self):
+		"""list: The absolute paths of the selected filenames."""
+		filepaths = []
+		for selection in self.view.input_view.selected_items:
+			try:
+				filepath = os.path.join(self.projects[selection], selection)
+			except (KeyError, TypeError):
+				continue
+			if not os.path.exists(filepath):
+				# Stale index entry
+				self._index.remove(filepath)
+				continue
+			filepaths.append(filepath)
+		return filepaths
+
 	@property
 	def projects(self):
 		"""dict: The relevant filenames and their corresponding paths."""
 		return self._projects
 
-	@projects.setter
-	def projects(self, top_level):
-		"""
+	def suggest(self, filepaths, fleet=None):
+		"""List projects before any search.
+
 		Parameters
 		----------
-		top_level : str
-			Absolute path to a top-level job directory.
+		filepaths : list
+			Absolute paths to project files, listed in order.
+		fleet : int or None
+			The number of archived projects `filepaths` were chosen from,
+			shown in the title so a small or empty archive is noticed.
 
 		"""
-		project_dict = {}
+		self._cancel_search()
+		if fleet is not None:
+			self.view.setWindowTitle(
+				'%s - %s suggested from %s archived projects' % (
+					str(self.view.windowTitle()), len(filepaths), fleet)
+			)
+		self._projects = dict(
+			(os.path.basename(i), os.path.dirname(i)) for i in filepaths
+		)
+		self.view.input_view.set_listbox(
+			[os.path.basename(i) for i in filepaths]
+		)
 
-		try:
-			for root, dirs, files in os.walk(top_level):
-				for filename in files:
-					if filename.endswith('.rw'):
-						project_dict[filename] = root
-			if len(project_dict.keys()) == 0:
-				project_dict['No projects found'] = None
-		finally:
-			self._projects = project_dict
+	def _is_current(self, job_num):
+		"""Returns True if `job_num` belongs to the active search."""
+		return self._search is not None and self._search.job_num == job_num
+
+	def _cancel_search(self, *args):
+		"""Abandon the active search, if any."""
+		if self._search is not None:
+			self._search.cancel()
+			self._search = None
+
+	def _on_found(self, job_num, filename, root):
+		"""Append a streamed project to the view."""
+		if not self._is_current(str(job_num)):
+			return
+		filename = str(filename)
+		if filename not in self._projects:
+			self._projects.pop(self._NOT_FOUND, None)
+			self._projects[filename] = str(root)
+			self.view.input_view.set_listbox(sorted(self._projects.keys()))
+
+	def _on_failed(self, job_num, message):
+		"""Display a search failure."""
+		if self._is_current(str(job_num)):
+			self._search = None
+			if len(self._projects) == 0:
+				self.view.input_view.set_listbox([str(message)])
+
+	def _on_done(self, job_num):
+		"""Finalize the view once a search completes."""
+		if self._is_current(str(job_num)):
+			self._search = None
+			if len(self._projects) == 0:
+				self._projects[self._NOT_FOUND] = None
+				self.view.input_view.set_listbox(self._projects.keys())
+
+	def _on_timeout(self, search):
+		"""Abandon `search` if it is still walking an unreachable share."""
+		if search is self._search and search.isRunning():
+			self._cancel_search()
+			if len(self._projects) == 0:
+				self.view.input_view.set_listbox(['Search timed out'])
 
 	def _on_click_search(self):
 		"""Process user input and update view."""
-
+		self._cancel_search()
 		job_num = self.view.job_num
-		try:
-			job_root = os.path.basename(
-				Extract.projects_folder_root(job_num)
-			)
-			self.projects = os.path.join(Path.JOBS, job_root, job_num)
-		except ProjectsFolderRootError:
-			self.view.input_view.set_listbox(['No PROJECTS FOLDER found'])
-		else:
-			self.view.input_view.set_listbox(self.projects.keys())
+
+		# Indexed projects are listed without touching the network share.
+		self._projects = self._index.projects(job_num)
+		self.view.input_view.set_listbox(sorted(self._projects.keys()))
+
+		search = ProjectSearch(job_num)
+		search.found.connect(self._on_found)
+		search.failed.connect(self._on_failed)
+		search.done.connect(self._on_done)
+		# Keep a reference until the thread ends, even if abandoned.
+		self._searches.append(search)
+		search.finished.connect(lambda: self._searches.remove(search))
+		self._search = search
+		search.start()
+		QtCore.QTimer.singleShot(
+			self.SEARCH_TIMEOUT, lambda: self._on_timeout(search)
+		)
 
 
 if __name__ == '__main__':
 	pass
-
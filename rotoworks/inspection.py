@@ -1,17 +1,36 @@
 import re
-import sys
 import csv
+import json
 import os.path
-import pandas as pd
-from PyQt4 import QtGui
-from pywinscript.polyworks import Polyworks
+import logging
+from PyQt4 import QtGui, QtCore
+from connection import get_connection, macro_command
 from core import Path
+from registry import Registry
+from pwmacro import AxialMacro, ExportMacro, read_rows
+
+
+class MacroProgress(QtCore.QObject):
+	"""
+	Forwards ``MacroJob`` status changes from the PolyWorks worker thread to
+	the GUI thread.
+
+	Attributes
+	----------
+	changed : pyqtSignal(object, str)
+		Emitted with the ``MacroJob`` and the status it changed to.
+
+	"""
+	changed = QtCore.pyqtSignal(object, str)
 
 
 class Inspection(object):
 	"""
 	Inspection base class.
 
+	Subclasses are registered by the ``Registry`` metaclass when they are
+	defined.
+
 	Class Methods
 	-------------
 	get_inspection_types
@@ -19,6 +38,8 @@ class Inspection(object):
 	Class Attributes
 	----------------
 	PHASES : list
+	DISPLAY_NAME : str
+		Set on each subclass, e.g. 'Thermal Gap'.
 	 
 	Attributes
 	----------
@@ -31,23 +52,32 @@ class Inspection(object):
 	LAYOUT_NAME : str
 		The corresponding AutoCAD layout name.
 
-	polyworks : Polyworks
+	polyworks : InspectorConnection
+		Shared by every inspection.
+
+	progress : MacroProgress
+		Reports the status of the macros of this inspection.
 
 	"""
+	__metaclass__ = Registry
 	PHASES = ["Phase 1", "Phase 2", "Final"]
 
 	@classmethod
 	def get_inspection_types(cls):
-		"""Returns the ``list`` of subclasses.
+		"""Returns the ``list`` of subclass display names.
 		
 		Notes
 		-----
-		This method depends on subclass names conforming to CapWords convention 
-		(PEP 8).
+		Display names depend on subclass names conforming to CapWords 
+		convention (PEP 8).
 
 		"""
-		return [Inspection.split_capwords(child.__name__) 
-			for child in cls.__subclasses__()]
+		return list(Inspection.registered)
+
+	@classmethod
+	def display_name(cls, name):
+		"""See ``Registry.display_name``."""
+		return cls.split_capwords(name)
 
 	@staticmethod
 	def split_capwords(value):
@@ -58,10 +88,11 @@ class Inspection(object):
 		self.SCOPE_FILENAME = "%sScope.csv" % self.__class__.__name__
 		self.OUTPUT_FILENAME = "%s.csv" % self.__class__.__name__
 		self.LAYOUT_NAME = self.__class__.__name__
-		self.polyworks = Polyworks()
+		self.polyworks = get_connection()
+		self.progress = MacroProgress()
 
 	def macro_exec(self, *args):
-		"""Send a command to PolyWorks Inspector.
+		"""Queue a PolyWorks Inspector macro and return immediately.
 		
 		Parameters
 		----------
@@ -69,16 +100,118 @@ class Inspection(object):
 			The first argument must be the path to a PWMACRO file. The following
 			arguments are passed to the PWMACRO script.
 
+		Returns
+		-------
+		MacroJob
+			Status changes are emitted by `progress`.
+
 		"""
-		if len(args) == 2:
-			self.polyworks.inspector.CommandExecute(
-				"""MACRO EXEC ( "%s", "%s" )""" % args
-			)
-		elif len(args) == 3:
-			self.polyworks.inspector.CommandExecute(
-				"""MACRO EXEC ( "%s", "%s", "%s" )""" % args
-			)		
-		
+		return self.polyworks.submit(
+			macro_command(*args),
+			os.path.basename(args[0]),
+			self.progress.changed.emit
+		)
+
+	def macro_cancel(self):
+		"""Cancel queued and running macros."""
+		self.polyworks.cancel()
+
+	def _project_file(self, suffix):
+		return os.path.join(
+			os.path.dirname(self.OUTPUT_FILE), self.__class__.__name__ + suffix
+		)
+
+	def _read_pending(self):
+		try:
+			with open(self._project_file('Pending.json')) as f:
+				return json.load(f)
+		except (IOError, ValueError):
+			return None
+
+	@property
+	def pending(self):
+		"""dict: 'features' and 'customs' created since the last export, or 
+		None if the next export must include everything.
+
+		"""
+		pending = self._read_pending()
+		if pending is None or pending.get('full'):
+			return None
+		return pending
+
+	def add_pending(self, features, customs, full=False):
+		"""Record features and custom measurements for the next export.
+
+		Parameters
+		----------
+		features : list
+		customs : list
+		full : bool
+			If True, the next export includes everything, e.g. because
+			exported features are deleted. An incremental export cannot
+			remove them from OUTPUT_FILE.
+
+		"""
+		pending = self._read_pending() or {'features': [], 'customs': []}
+		pending['full'] = pending.get('full', False) or full
+		for key, names in (('features', features), ('customs', customs)):
+			pending[key].extend(i for i in names if i not in pending[key])
+		with open(self._project_file('Pending.json'), 'w') as f:
+			json.dump(pending, f, indent=1)
+
+	def export(self):
+		"""Queue the export of inspection output (OUTPUT_FILE).
+
+		Only pending features are exported if OUTPUT_FILE already exists; see
+		`merge_export`. Otherwise the whole project is exported with 
+		MACRO_OUT.
+
+		Returns
+		-------
+		MacroJob
+
+		"""
+		# A delta left by an earlier failed export must not be merged into
+		# this one
+		try:
+			os.remove(self._project_file('Delta.csv'))
+		except OSError:
+			pass
+		pending = self.pending
+		if pending is None or not os.path.exists(self.OUTPUT_FILE):
+			return self.macro_exec(self.MACRO_OUT, self.OUTPUT_FILE, Path.MACROS)
+		macro = ExportMacro(pending['features'], pending['customs'])
+		return self.macro_exec(
+			macro.dump(self._project_file('Export.pwmacro')),
+			self._project_file('Delta.csv'),
+			Path.MACROS
+		)
+
+	def merge_export(self):
+		"""Merge an incremental export into OUTPUT_FILE.
+
+		Call once an `export` job is done. Pending features are cleared.
+
+		Raises
+		------
+		IOError
+			If OUTPUT_FILE cannot be written.
+		KeyError
+			If an export is not a PolyWorks export.
+
+		"""
+		delta = self._project_file('Delta.csv')
+		if os.path.exists(delta):
+			import measurements
+			count = measurements.merge(self.OUTPUT_FILE, delta)
+			os.remove(delta)
+			logging.info('Merged %s features into %s' % (
+				count, os.path.basename(self.OUTPUT_FILE)))
+		try:
+			os.remove(self._project_file('Pending.json'))
+		except OSError:
+			pass
+
 	def export_as_single_column(self, data, filepath):
 		"""Save inspection data to a CSV file as a single column.
 
@@ -198,7 +331,8 @@ class Axial(Inspection):
 		Absolute path to CSV file that feeds Autodesk AutoCAD.
 
 	MACRO_IN : str
-		Absolute path to the PolyWorks macro that drives an inspection.
+		Absolute path to the PolyWorks macro that drives an inspection. It is
+		compiled from SCOPE_FILE for each session; see `compile`.
 
 	MACRO_OUT : str
 		Absolute path to the PolyWorks macro that exports inspection 
@@ -208,9 +342,12 @@ class Axial(Inspection):
 	def __init__(self, path):
 		super(Axial, self).__init__()
 		self._current_session = None
+		self._machine = None
 		self.SCOPE_FILE = os.path.join(path, self.SCOPE_FILENAME)
 		self.OUTPUT_FILE = os.path.join(path, self.OUTPUT_FILENAME)
-		self.MACRO_IN = os.path.join(Path.MACROS, "axialsIn.pwmacro")
+		self.MACRO_IN = os.path.join(
+			path, "%sSession.pwmacro" % self.__class__.__name__
+		)
 		self.MACRO_OUT = os.path.join(Path.MACROS, "measurementsOut.pwmacro")
 
 	@property
@@ -241,6 +378,7 @@ class Axial(Inspection):
 		"""
 		session_targets = session_info[0]
 		machine = session_info[1]
+		self._machine = machine
 		scope = session_info[2]
 
 		# Reformat session_targets and save to targets_adjusted. The new format
@@ -279,8 +417,44 @@ class Axial(Inspection):
 		self._current_session = []
 
 	def publish(self):
-		"""Write the axial inspection workscope to a CSV file."""
+		"""Write the axial inspection workscope to a CSV file and compile it."""
 		self.export_as_multi_column(self._current_session, self.SCOPE_FILE)
+		self.compile(self._machine)
+
+	def compile(self, machine):
+		"""Compile the workscope CSV file into the session macro (MACRO_IN).
+
+		The features the session may create are added to the next
+		incremental export. If the session deletes features of the last
+		export, the next export is a full one.
+
+		Parameters
+		----------
+		machine : Rotor
+			Defines the distance features of each stage.
+
+		Raises
+		------
+		IOError
+			If the system cannot find the workscope CSV file.
+
+		"""
+		import measurements
+		macro = AxialMacro.from_rows(read_rows(self.SCOPE_FILE), machine)
+		macro.dump(self.MACRO_IN)
+		full = False
+		try:
+			exported = measurements.load(self.OUTPUT_FILE, typed=False)['Name']
+		except IOError:
+			# The next export is a full one anyway
+			exported = []
+		except (KeyError, ValueError) as error:
+			# Malformed or partially written; replace it with a full export
+			logging.warning('%s: %s' % (self.OUTPUT_FILE, error))
+			exported, full = [], True
+		self.add_pending(
+			macro.features, macro.customs, full or macro.deletes_any(exported)
+		)
 
 
 class ThermalGap(Inspection):
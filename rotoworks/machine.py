@@ -1,34 +1,63 @@
-import re
+import numpy as np
 from os.path import join as osjoin
 from collections import OrderedDict
-from core import Path
+from registry import Registry
+
+
+def scope_matrix(scope):
+	"""Returns a project scope as a stages x features ``ndarray``.
+
+	Parameters
+	----------
+	scope : ScopeModel or OrderedDict
+
+	See Also
+	--------
+	data.ScopeModel.matrix
+
+	"""
+	try:
+		return scope.matrix
+	except AttributeError:
+		rows = list(scope.values())
+		width = len(rows[0]) if rows else 0
+		return np.array(rows, np.uint8).reshape(len(rows), width)
 
 
 class Rotor(object):
 	"""
 	Rotor base class.
 
+	Subclasses (machine types) are registered by the ``Registry`` metaclass 
+	when they are defined; a plug-in machine type only has to subclass 
+	``Rotor``.
+
 	Attributes
 	----------
+	DISPLAY_NAME : str
+		Set on each subclass, e.g. 'Steam Turbine'.
 	FEATURES : list
+	DISTANCES : list or None
+		(from, to, name) axial distance features between probe targets, where
+		a from target of None is the Active Face. If None, every probe target
+		is measured from the Active Face under its own name.
 
 	"""
+	__metaclass__ = Registry
+	DISTANCES = None
 
 	@classmethod
 	def get_machine_types(cls):
-		"""Returns the ``list`` of ``Rotor`` subclasses (machine types).
+		"""Returns the ``list`` of ``Rotor`` subclass display names (machine 
+		types).
 
 		Notes
 		-----
-		This method depends on ``Rotor`` subclass names conforming to CapWords 
-		convention (PEP 8).
+		Display names depend on ``Rotor`` subclass names conforming to 
+		CapWords convention (PEP 8).
 
 		"""
-		children = []
-		for item in [re.sub("([a-z])([A-Z])", r"\1 \2", child.__name__).split() 
-			for child in cls.__subclasses__()]:
-			children.append(" ".join(item))
-		return children
+		return list(Rotor.registered)
 
 	@classmethod
 	def get_machine_sub_types(cls):
@@ -39,12 +68,8 @@ class Rotor(object):
 
 		"""
 		sub_list = [" "]
-		for sub in cls.__subclasses__():
-			try:
-				sub_list.extend(sub.SUB_TYPES)
-			except AttributeError:
-				# No sub-types found.
-				continue
+		for sub in Rotor.registered.values():
+			sub_list.extend(sub.__dict__.get('SUB_TYPES', []))
 		return sub_list
 
 	@classmethod
@@ -54,12 +79,16 @@ class Rotor(object):
 		Parameters
 		----------
 		machine_type : str
-			The name of a ``Rotor`` subclass with a space in between each 
-			capitalized word (Ex. 'Steam Turbine', not 'SteamTurbine').
+			The display name of a ``Rotor`` subclass (Ex. 'Steam Turbine'); 
+			the class name is accepted as well.
+
+		Raises
+		------
+		KeyError
+			If `machine_type` is not registered.
 		
 		"""
-		return next(child() for child in cls.__subclasses__() 
-		if machine_type.replace(" ","") == child.__name__)
+		return Rotor.lookup(machine_type)()
 
 	@classmethod
 	def stage_names(cls, stage_count, is_curtis):
@@ -102,6 +131,38 @@ class Rotor(object):
 		letter = ('C' if stage <= 2 else 'R')
 		return (letter + str(stage) if letter == 'C' else letter + str(stage - 2))   
 
+	def distances(self, stage, targets):
+		"""Returns the PolyWorks distance features of a stage.
+
+		Only distances between probed targets are returned.
+
+		Parameters
+		----------
+		stage : str
+			e.g. 'Stage 1'
+		targets : list
+			The probed targets of the stage, see `probe_targets`.
+
+		Returns
+		-------
+		list
+			(from, to, name) feature names, e.g. ('Active Face', 
+			'Stage 1 Disk Face', 'Stage 1-Disk Face').
+
+		"""
+		if self.DISTANCES is None:
+			definitions = [(None, i, i) for i in targets]
+		else:
+			definitions = [
+				i for i in self.DISTANCES
+				if i[0] in targets + [None] and i[1] in targets
+			]
+		return [(
+			'Active Face' if first is None else '%s %s' % (stage, first),
+			'%s %s' % (stage, second),
+			'%s-%s' % (stage, name)
+		) for first, second, name in definitions]
+
 	def __init__(self):
 		self.FEATURES = ["Stage"]
 
@@ -139,6 +200,16 @@ class CentrifugalCompressor(Rotor):
 		'G.P. Width', 
 		'B.P. Width'
 	]
+	DISTANCES = [
+		(None, 'I.B.P.', 'I.B.P.'),
+		# Closed face only
+		(None, 'Eye Face', 'Eye Face'),
+		('I.B.P.', 'I.C.P.', 'G.P. Width'),
+		# Opened face only
+		(None, 'Leading Edge', 'Leading Edge'),
+		('Leading Edge', 'Trailing Edge', 'G.P. Width'),
+		('I.B.P.', 'O.B.P.', 'B.P. Width'),
+	]
 	_COMBO_FACE_ROWS = [
 		'Leading Edge', 
 		'Eye Face', 
@@ -160,7 +231,7 @@ class CentrifugalCompressor(Rotor):
 			Axial inspection work scope of a particular stage.
 
 		"""
-		if stage_scope[0] == 1:
+		if stage_scope[0]:
 			return self._OPEN_FACE_FEATURES
 		else:
 			return self._CLOSE_FACE_FEATURES
@@ -170,7 +241,7 @@ class CentrifugalCompressor(Rotor):
 		
 		Parameters
 		----------
-		scope : OrderedDict
+		scope : ScopeModel or OrderedDict
 			The project scope that defines the axial measurement features.
 
 		See Also
@@ -180,7 +251,7 @@ class CentrifugalCompressor(Rotor):
 		"""
 		rows = ["Feature"]
 		stage_count = len(scope)
-		open_face_count = sum([scope[item][0] for item in scope.keys()])
+		open_face_count = int(scope_matrix(scope)[:, :1].sum())
 		if open_face_count == 0:
 			# All stages are close-faced
 			rows.extend(self._CLOSE_FACE_ROWS)
@@ -237,17 +308,15 @@ class SteamTurbine(Rotor):
 			Axial inspection work scope of a particular stage.
 
 		"""
-		return [
-			self.OPTIONS[i] for i in range(len(stage_scope)) 
-			if stage_scope[i] == 1
-		]
+		selected = np.flatnonzero(stage_scope[:len(self.OPTIONS)])
+		return [self.OPTIONS[i] for i in selected]
 
 	def feature_rows(self, scope):
 		"""Returns a ``list`` of ``DocTable`` row names.
 		
 		Parameters
 		----------
-		scope : OrderedDict
+		scope : ScopeModel or OrderedDict
 			The project scope that defines the axial measurement features.
 
 		See Also
@@ -257,15 +326,9 @@ class SteamTurbine(Rotor):
 		"""
 		rows = ["Feature"]
 
-		# Get the sum of scope values for each index in a single list.
-		sums = [0] * len(self.OPTIONS)
-		for item in scope.values():
-			for i in range(len(item)):
-				sums[i] = sums[i] + item[i]
-
-		# A positive value at an index indicates a scoped feature.
-		additions = [self.OPTIONS[i] for i in range(len(sums)) if sums[i] > 0]
-		rows.extend(additions)
+		# A positive column sum indicates a scoped feature.
+		sums = scope_matrix(scope)[:, :len(self.OPTIONS)].sum(axis=0)
+		rows.extend([self.OPTIONS[i] for i in np.flatnonzero(sums)])
 		return rows
 
 
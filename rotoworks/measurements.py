@@ -0,0 +1,242 @@
+"""
+rotoworks.measurements loads PolyWorks measurement exports.
+
+Exports are parsed against an explicit schema, and parsed exports are cached
+by path, size and modification time so a session never parses the same file
+twice.
+
+"""
+import io
+import os
+import csv
+import logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from cache import TTLCache
+from files import replace_file
+
+
+# PolyWorks writes exports in the Windows code page (the Tol column contains
+# '\xb1').
+ENCODING = 'cp1252'
+
+# Known export columns and their types. Older exports have no 'Nom' column;
+# unknown columns are ignored.
+SCHEMA = OrderedDict([
+	('Name', str),
+	('Control', str),
+	('Nom', float),
+	('Meas', float),
+	('Tol', str),
+	('Dev', float),
+	('Test', str),
+	('Out Tol', float),
+])
+
+_HEADER = 'Name,'
+
+_cache = TTLCache(maxsize=32)
+
+
+def _header_row(filepath):
+	"""Returns the line number of the column header of an export.
+
+	Newer exports start with a 'Feature Table' preamble.
+
+	Raises
+	------
+	KeyError
+		If the file is not a PolyWorks export.
+
+	"""
+	with io.open(filepath, encoding=ENCODING) as f:
+		for i, line in enumerate(f):
+			if line.startswith(_HEADER):
+				return i
+			if i > 20:
+				break
+	raise KeyError('Name')
+
+
+def _parse(filepath, typed):
+	header = _header_row(filepath)
+	df = pd.read_csv(
+		filepath,
+		encoding=ENCODING,
+		skiprows=header,
+		usecols=lambda column: column in SCHEMA,
+		dtype=object
+	)
+	# Blank separator rows and repeated header rows
+	df = df[df['Name'].notnull() & (df['Name'] != 'Name')]
+	df = df.reset_index(drop=True)
+	if typed:
+		for column in df.columns:
+			if SCHEMA[column] is float:
+				df[column] = pd.to_numeric(
+					df[column], errors='coerce').astype(np.float64)
+	return df
+
+
+def load(filepath, typed=True):
+	"""Returns a PolyWorks export as a ``DataFrame``.
+
+	The returned frame is a copy and may be modified.
+
+	Parameters
+	----------
+	filepath : str
+		Absolute path to a CSV export.
+	typed : bool
+		If True, numeric `SCHEMA` columns are parsed as floats (unparseable
+		values become NaN). Otherwise every value is kept as text.
+
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+	KeyError
+		If the file is not a PolyWorks export.
+
+	"""
+	try:
+		stat = os.stat(filepath)
+	except OSError as error:
+		raise IOError(error)
+	key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime, typed)
+	try:
+		df = _cache.get(key)
+	except KeyError:
+		df = _parse(filepath, typed)
+		_cache.set(key, df)
+	return df.copy()
+
+
+def measured(filepath):
+	"""Returns the number of rows with a numeric measurement in an export.
+
+	Returns 0 if the export does not exist or cannot be parsed.
+
+	Parameters
+	----------
+	filepath : str
+
+	"""
+	try:
+		return int(load(filepath)['Meas'].notnull().sum())
+	except (IOError, KeyError, ValueError) as error:
+		logging.debug(error)
+		return 0
+
+
+def _split(filepath):
+	"""Returns the preamble lines, header line and row lines of an export.
+
+	Lines keep their line endings.
+
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+	KeyError
+		If the file is not a PolyWorks export.
+
+	"""
+	with open(filepath, 'rb') as f:
+		lines = f.read().splitlines(True)
+	for i, line in enumerate(lines[:22]):
+		if line.startswith(_HEADER):
+			return lines[:i], lines[i], lines[i + 1:]
+	raise KeyError('Name')
+
+
+def _fields(line):
+	"""Returns the values of a CSV line."""
+	return next(csv.reader([line]), [])
+
+
+def _join(fields, newline):
+	"""Returns `fields` as a CSV line."""
+	stream = io.BytesIO()
+	csv.writer(stream, lineterminator=newline).writerow(fields)
+	return stream.getvalue()
+
+
+def merge(filepath, update):
+	"""Merge the rows of one export into another, last writer wins.
+
+	Every feature in `update` replaces all rows of the same 'Name' in
+	`filepath`. Other rows are kept in order and new features are appended.
+	Rows are merged as lines of text: the preamble, header and columns of
+	`filepath` are kept, and rows are written exactly as exported. Update
+	rows are only rewritten if the two exports have different columns.
+
+	Parameters
+	----------
+	filepath : str
+		Absolute path to a CSV export; created if it does not exist.
+	update : str
+		Absolute path to a CSV export of the changed features.
+
+	Returns
+	-------
+	int
+		The number of merged feature names.
+
+	Raises
+	------
+	IOError
+		If `update` cannot be found or `filepath` cannot be written.
+	KeyError
+		If either file is not a PolyWorks export.
+
+	"""
+	update_preamble, update_header, update_lines = _split(update)
+	try:
+		preamble, header, current = _split(filepath)
+	except IOError:
+		preamble, header, current = update_preamble, update_header, []
+	newline = header[len(header.rstrip('\r\n')):] or '\r\n'
+	columns, update_columns = _fields(header), _fields(update_header)
+	rows = []
+	for line in update_lines:
+		fields = _fields(line)
+		# Blank separator rows and repeated header rows
+		if not fields or fields[0] in ('', 'Name'):
+			continue
+		if update_columns != columns:
+			values = dict(zip(update_columns, fields))
+			line = _join([values.get(i, '') for i in columns], newline)
+		rows.append((fields[0], line))
+	names = set(name for name, line in rows)
+	kept = [i for i in current if (_fields(i) or [''])[0] not in names]
+	if kept and not kept[-1].endswith(('\r', '\n')):
+		kept[-1] += newline
+	staged = filepath + '.tmp'
+	with open(staged, 'wb') as f:
+		f.writelines(preamble + [header] + kept + [i[1] for i in rows])
+	replace_file(staged, filepath)
+	return len(names)
+
+
+def cache_stats():
+	"""str: Hit, miss and size counters of the export cache."""
+	return _cache.stats
+
+
+if __name__ == '__main__':
+	# Time cold and cached loads of the sample axial export.
+	from timeit import default_timer
+	filepath = os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		'tests', 'Axials.csv'
+	)
+	start = default_timer()
+	load(filepath)
+	print('Parsed in %.2f ms' % ((default_timer() - start) * 1000))
+	start = default_timer()
+	for i in range(100):
+		load(filepath)
+	print('Cached load in %.2f ms' % ((default_timer() - start) * 10))
+	print(cache_stats())
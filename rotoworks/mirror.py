@@ -0,0 +1,301 @@
+"""
+rotoworks.mirror keeps a local copy of the images, macros and docs on the share.
+
+The share holds a manifest of the SHA-1 hash of every asset. Each version of
+the assets is mirrored to its own folder, named after the manifest version,
+and a mirrored version is never modified: a changed asset is synced into a
+new version folder, which is activated once every file has been copied and
+verified. The assets are used from the active version while it matches the
+share, and from the share while a newer version is being synced.
+
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from os.path import join as osjoin
+from collections import OrderedDict
+from timeit import default_timer
+from files import replace_file
+
+
+# Mirrored folders, relative to the share root
+FOLDERS = [osjoin('data', 'images'), 'macros', 'docs']
+
+MANIFEST = 'manifest.json'
+
+
+def file_hash(filepath):
+	"""Returns the SHA-1 hex digest of a file.
+
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+
+	"""
+	sha = hashlib.sha1()
+	with open(filepath, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 16), b''):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+
+def build_manifest(root):
+	"""Returns the manifest of the assets in `root`.
+
+	Parameters
+	----------
+	root : str
+		Absolute path to the share root or a mirrored version.
+
+	Returns
+	-------
+	dict
+		'files' maps each asset path, relative to `root` with '/'
+		separators, to its hash. 'version' is a hash of 'files'.
+
+	Raises
+	------
+	IOError
+		If `root` cannot be read.
+
+	"""
+	if not os.path.isdir(root):
+		raise IOError('Cannot find %s' % root)
+	files = OrderedDict()
+	for folder in FOLDERS:
+		if not os.path.isdir(osjoin(root, folder)):
+			continue
+		# An unreadable folder must not look like an empty one
+		for dirpath, dirnames, filenames in os.walk(
+				osjoin(root, folder), onerror=_raise):
+			dirnames.sort()
+			for filename in sorted(filenames):
+				filepath = osjoin(dirpath, filename)
+				name = os.path.relpath(filepath, root).replace(os.sep, '/')
+				files[name] = file_hash(filepath)
+	version = hashlib.sha1(
+		json.dumps(files, sort_keys=True).encode('utf-8')
+	).hexdigest()[:12]
+	return {'version': version, 'files': files}
+
+
+def publish(root):
+	"""Write the manifest of the share.
+
+	Run after deploying assets. Without a published manifest every client
+	hashes the share itself on each sync.
+
+	Returns
+	-------
+	filepath : str
+
+	"""
+	filepath = osjoin(root, MANIFEST)
+	_dump(build_manifest(root), filepath)
+	return filepath
+
+
+def _raise(error):
+	raise error
+
+
+def _dump(manifest, filepath):
+	"""Replace a manifest file, so a reader never sees a partial one."""
+	staged = filepath + '.tmp'
+	with open(staged, 'w') as f:
+		json.dump(manifest, f, indent=2, sort_keys=True)
+	replace_file(staged, filepath)
+
+
+def _load(filepath):
+	"""Returns a manifest, or None if it is missing or unreadable."""
+	try:
+		with open(filepath) as f:
+			manifest = json.load(f)
+	except (IOError, OSError, ValueError):
+		return
+	if 'version' not in manifest or 'files' not in manifest:
+		return
+	return manifest
+
+
+class Mirror(object):
+	"""
+	A versioned local mirror of the share's assets.
+
+	Parameters
+	----------
+	share : str
+		Absolute path to the share root.
+	local : str
+		Absolute path to the mirror folder on the local machine.
+
+	Attributes
+	----------
+	root : str
+		The asset root in use: the active version folder, or `share` if no
+		current version is mirrored.
+	version : str or None
+		The active mirrored version.
+	error : Exception or None
+		The error of the last failed sync.
+
+	"""
+	def __init__(self, share, local):
+		self.share = share
+		self.local = local
+		self._callback = None
+		self._thread = None
+		self._lock = threading.Lock()
+		self.error = None
+		manifest = _load(osjoin(local, MANIFEST))
+		self.version = None if manifest is None else manifest['version']
+		# The last synced version is used until the share says otherwise
+		if self.version and os.path.isdir(self._folder(self.version)):
+			self.root = self._folder(self.version)
+		else:
+			self.version = None
+			self.root = share
+		# Versions this process has used. Sessions keep the macro paths they
+		# were opened with, so these are only removed by the next start.
+		self._used = set([self.version])
+
+	def _folder(self, version):
+		return osjoin(self.local, version)
+
+	def _set_root(self, root):
+		if root == self.root:
+			return
+		self.root = root
+		logging.info('Using assets in %s' % root)
+		if self._callback is not None:
+			self._callback(root)
+
+	def start(self, callback=None):
+		"""Sync in the background. Calling again has no effect.
+
+		Parameters
+		----------
+		callback : callable or None
+			Called with the new asset root each time it changes. Calls are
+			made from the sync thread.
+
+		"""
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._callback = callback
+			self._thread = threading.Thread(target=self.sync, name='Mirror')
+			self._thread.daemon = True
+			self._thread.start()
+
+	def sync(self):
+		"""Mirror the share's current version of the assets.
+
+		Unchanged assets are copied from the active version, so only changed
+		assets are read from the share. If the share cannot be read, the
+		active version is kept. Versions left by earlier runs are removed.
+
+		Returns
+		-------
+		bool
+			True if the mirror is current.
+
+		"""
+		start = default_timer()
+		try:
+			remote = _load(osjoin(self.share, MANIFEST))
+			if remote is None:
+				remote = build_manifest(self.share)
+			self._clean(remote['version'])
+			if remote['version'] == self.version:
+				self._set_root(self._folder(self.version))
+				return True
+			# Stale; use the share until the new version is mirrored
+			self._set_root(self.share)
+			self._copy(remote)
+		except (IOError, OSError) as error:
+			logging.warning('Asset sync failed: %s' % error)
+			self.error = error
+			return False
+		self.error = None
+		self.version = remote['version']
+		self._used.add(self.version)
+		self._set_root(self._folder(self.version))
+		logging.info('Synced assets %s in %.3fs' % (
+			self.version, default_timer() - start))
+		return True
+
+	def _copy(self, remote):
+		"""Copy and verify every file of `remote` into its version folder,
+		then activate it.
+
+		Raises
+		------
+		IOError
+			If a file changed on the share while it was copied.
+
+		"""
+		active = _load(osjoin(self.local, MANIFEST))
+		active_files = {} if active is None else active['files']
+		folder = self._folder(remote['version'])
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		for name, digest in remote['files'].items():
+			target = osjoin(folder, *name.split('/'))
+			if os.path.exists(target) and file_hash(target) == digest:
+				# Left by an interrupted sync
+				continue
+			if active_files.get(name) == digest:
+				source = osjoin(self._folder(active['version']), *name.split('/'))
+			else:
+				source = osjoin(self.share, *name.split('/'))
+			if not os.path.isdir(os.path.dirname(target)):
+				os.makedirs(os.path.dirname(target))
+			staged = target + '.tmp'
+			shutil.copyfile(source, staged)
+			if file_hash(staged) != digest:
+				os.remove(staged)
+				raise IOError('%s changed during sync' % name)
+			replace_file(staged, target)
+		_dump(remote, osjoin(self.local, MANIFEST))
+
+	def _clean(self, keep):
+		"""Remove the versions this process has not used, except `keep`.
+
+		`keep` is the version being synced, so an interrupted sync resumes
+		where it stopped. Files still open are left for the next sync.
+
+		"""
+		if not os.path.isdir(self.local):
+			return
+		for name in os.listdir(self.local):
+			path = osjoin(self.local, name)
+			if name not in self._used and name != keep and os.path.isdir(path):
+				shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	# Publish the manifest of a share:   python mirror.py --publish <root>
+	# Otherwise, time a cold and a warm sync of this checkout.
+	import sys
+	import tempfile
+	if '--publish' in sys.argv:
+		print(publish(sys.argv[-1]))
+		sys.exit(0)
+	logging.basicConfig(level=logging.INFO)
+	share = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	local = tempfile.mkdtemp()
+	try:
+		for label in ('Cold', 'Warm'):
+			start = default_timer()
+			mirror = Mirror(share, local)
+			mirror.sync()
+			print('%s sync: %.3fs, root %s' % (
+				label, default_timer() - start, mirror.root))
+	finally:
+		shutil.rmtree(local, ignore_errors=True)
@@ -0,0 +1,265 @@
+"""
+rotoworks.profiler instruments COM automation objects.
+
+A ``ComProxy`` forwards every attribute access to the wrapped COM object and,
+while profiling is enabled, records the call count, latency histogram and
+calling stacks of each method or property.
+
+"""
+import os
+import json
+import logging
+import threading
+import traceback
+from time import strftime
+from timeit import default_timer
+from collections import defaultdict, Counter
+
+
+# Attribute values of these types are returned as is, anything else is
+# treated as a COM object and wrapped.
+_PLAIN_TYPES = (
+	type(None), bool, int, float, complex, str, bytes, tuple, list, dict
+)
+_MODULE = os.path.basename(__file__).replace('.pyc', '.py')
+try:
+	_PLAIN_TYPES += (long, unicode)
+except NameError:
+	# Python 3
+	pass
+
+
+def _is_com_object(value):
+	"""Returns True if `value` is a comtypes or pywin32 COM object."""
+	return hasattr(value, '_comobj') or hasattr(value, '_oleobj_')
+
+
+class ComProfiler(object):
+	"""
+	Collects timing data from ``ComProxy`` objects.
+
+	Calls may be recorded from any thread, e.g. the GUI thread and the
+	PolyWorks worker thread.
+
+	Parameters
+	----------
+	enabled : bool
+
+	Attributes
+	----------
+	BUCKETS : list
+		Upper bounds (milliseconds) of the latency histogram buckets.
+	STACK_DEPTH : int
+		The number of calling frames recorded for each call.
+	enabled : bool
+		Profiling switch; may be toggled at runtime.
+
+	"""
+	BUCKETS = [0.1, 1, 10, 100, 1000]
+	STACK_DEPTH = 4
+
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		"""Discard all recorded calls."""
+		with self._lock:
+			self._reset()
+
+	def _reset(self):
+		self._counts = Counter()
+		self._totals = defaultdict(float)
+		self._histograms = defaultdict(lambda: [0] * (len(self.BUCKETS) + 1))
+		self._stacks = defaultdict(Counter)
+
+	def wrap(self, obj, name):
+		"""Returns `obj` wrapped in a ``ComProxy`` if profiling is enabled.
+
+		Parameters
+		----------
+		obj : object
+			A COM object.
+		name : str
+			The label under which calls are recorded.
+
+		"""
+		if not self.enabled or isinstance(obj, (ComProxy,) + _PLAIN_TYPES):
+			return obj
+		return ComProxy(obj, name, self)
+
+	def instrument(self, obj, name):
+		"""Wrap the COM objects held in the attributes of `obj`, if profiling
+		is enabled.
+
+		Use on objects that create their own COM objects, such as
+		``pywinscript.autocad.AutoCAD``, so every call they make is recorded.
+
+		Parameters
+		----------
+		obj : object
+		name : str
+			Calls are recorded under '<name>.<attribute>'.
+
+		"""
+		if not self.enabled:
+			return
+		for attr, value in list(vars(obj).items()):
+			if _is_com_object(value):
+				setattr(obj, attr, self.wrap(value, '%s.%s' % (name, attr)))
+
+	def record(self, name, elapsed):
+		"""Record a single call.
+
+		Parameters
+		----------
+		name : str
+		elapsed : float
+			Call duration in seconds.
+
+		"""
+		ms = elapsed * 1000
+		bucket = len(self.BUCKETS)
+		for i, bound in enumerate(self.BUCKETS):
+			if ms <= bound:
+				bucket = i
+				break
+		stack = [
+			f for f in traceback.extract_stack(limit=self.STACK_DEPTH + 4)
+			if os.path.basename(f[0]) != _MODULE
+		][-self.STACK_DEPTH:]
+		stack = ' <- '.join(
+			'%s:%s %s' % (os.path.basename(f[0]), f[1], f[2])
+			for f in reversed(stack)
+		)
+		with self._lock:
+			self._counts[name] += 1
+			self._totals[name] += ms
+			self._histograms[name][bucket] += 1
+			self._stacks[name][stack] += 1
+
+	@property
+	def profile(self):
+		"""dict: The recorded calls keyed by method name."""
+		with self._lock:
+			return self._profile()
+
+	def _profile(self):
+		labels = ['<=%sms' % i for i in self.BUCKETS]
+		labels.append('>%sms' % self.BUCKETS[-1])
+		return dict(
+			(name, {
+				'calls': count,
+				'total_ms': round(self._totals[name], 3),
+				'mean_ms': round(self._totals[name] / count, 3),
+				'histogram': dict(zip(labels, self._histograms[name])),
+				'stacks': dict(self._stacks[name].most_common(10)),
+			})
+			for name, count in self._counts.items()
+		)
+
+	def dump(self, session, directory=None):
+		"""Save and reset the recorded profile.
+
+		Nothing is written if no calls were recorded.
+
+		Parameters
+		----------
+		session : str
+			Session name, used as the filename prefix.
+		directory : str or None
+			Destination folder. The logging folder is used by default.
+
+		Returns
+		-------
+		str or None
+			Absolute path to the profile.
+
+		"""
+		with self._lock:
+			if not self._counts:
+				return
+			profile = self._profile()
+			self._reset()
+		if directory is None:
+			from core import Path
+			directory = os.path.dirname(Path.LOG)
+		filepath = os.path.join(
+			directory, '%s_%s.profile.json' % (session, strftime('%Y%m%d-%H%M%S'))
+		)
+		try:
+			with open(filepath, 'w') as f:
+				json.dump(profile, f, indent=2, sort_keys=True)
+		except IOError as error:
+			logging.warning(error)
+			return
+		return filepath
+
+
+class ComProxy(object):
+	"""
+	A transparent, profiling wrapper around a COM object.
+
+	Method calls and property reads are timed under '<name>.<attribute>'.
+	Property writes are timed under '<name>.<attribute>='. Returned COM
+	objects are wrapped as well.
+
+	Parameters
+	----------
+	target : object
+	name : str
+	profiler : ComProfiler
+
+	"""
+	def __init__(self, target, name, profiler):
+		object.__setattr__(self, '_target', target)
+		object.__setattr__(self, '_name', name)
+		object.__setattr__(self, '_profiler', profiler)
+
+	def _timed(self, label, func, *args, **kwargs):
+		start = default_timer()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			if self._profiler.enabled:
+				self._profiler.record(label, default_timer() - start)
+
+	def __getattr__(self, attr):
+		label = '%s.%s' % (self._name, attr)
+		start = default_timer()
+		value = getattr(self._target, attr)
+		if callable(value) and not _is_com_object(value):
+			def method(*args, **kwargs):
+				result = self._timed(label, value, *args, **kwargs)
+				return self._profiler.wrap(result, label)
+			return method
+		if self._profiler.enabled:
+			self._profiler.record(label, default_timer() - start)
+		return self._profiler.wrap(value, label)
+
+	def __setattr__(self, attr, value):
+		label = '%s.%s=' % (self._name, attr)
+		self._timed(label, setattr, self._target, attr, value)
+
+	def __iter__(self):
+		label = '%s[]' % self._name
+		for item in self._target:
+			yield self._profiler.wrap(item, label)
+
+	def __len__(self):
+		return len(self._target)
+
+	def __getitem__(self, key):
+		return self._profiler.wrap(self._target[key], '%s[]' % self._name)
+
+	def __repr__(self):
+		return '<ComProxy %s: %r>' % (self._name, self._target)
+
+
+# Process-wide profiler. Set ROTOWORKS_PROFILE=1 to enable at startup.
+profiler = ComProfiler(os.environ.get('ROTOWORKS_PROFILE') == '1')
+
+
+if __name__ == '__main__':
+	pass
@@ -1,7 +1,7 @@
 import os.path
 from pywinscript.win import create_folder
-from sulzer.extract import Extract, ProjectsFolderRootError
-from core import Path
+from sulzer.extract import ProjectsFolderRootError
+from core import Path, projects_folder_root
 from data import Data
 
 
@@ -33,7 +33,7 @@ class Project(object):
 		"""
 		# Search for the PROJECTS FOLDER root
 		try:
-			pfolder_root = Extract.projects_folder_root(job_num)
+			pfolder_root = projects_folder_root(job_num)
 		except ProjectsFolderRootError as error:
 			msg = 'Make sure this job has a valid PROJECTS FOLDER and try again'
 			error.message = "%s\n%s." % (error.message, msg)
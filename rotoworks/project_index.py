@@ -0,0 +1,394 @@
+"""
+rotoworks.project_index keeps a local SQLite index of ROTOWORKS projects.
+
+Searching the index replaces walking the job folders on the network share.
+The index is filled by a background walk of every job folder, refreshed once
+a day, and kept current by history searches and project saves.
+
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from timeit import default_timer
+from core import Path
+from machine import Rotor
+
+
+# Seconds after which `refresh` walks every job folder again
+MAX_AGE = 24 * 3600
+
+_refresh_lock = threading.Lock()
+_start_lock = threading.Lock()
+_refresh_thread = None
+
+
+class ProjectIndex(object):
+	"""
+	A persistent index of every ROTOWORKS project (.rw) file.
+
+	Parameters
+	----------
+	filepath : str
+		Absolute path to the SQLite database. Defaults to `Path.INDEX`.
+
+	"""
+	_SCHEMA = """
+		CREATE TABLE IF NOT EXISTS projects (
+			filepath TEXT PRIMARY KEY,
+			filename TEXT NOT NULL,
+			job_num TEXT NOT NULL,
+			phase TEXT,
+			machine_type TEXT,
+			subtype TEXT,
+			nickname TEXT,
+			mtime REAL NOT NULL
+		);
+		CREATE INDEX IF NOT EXISTS projects_job_num ON projects (job_num);
+	"""
+	_COLUMNS = (
+		'filepath', 'filename', 'job_num', 'phase', 'machine_type', 'subtype',
+		'nickname', 'mtime'
+	)
+
+	def __init__(self, filepath=None):
+		self._filepath = Path.INDEX if filepath is None else filepath
+		folder = os.path.dirname(self._filepath)
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		with closing(self._connect()) as conn:
+			conn.executescript(self._SCHEMA)
+
+	def _connect(self):
+		return sqlite3.connect(self._filepath)
+
+	@property
+	def synced(self):
+		"""float: Time of the last complete walk of `Path.JOBS`, 0 if none."""
+		with closing(self._connect()) as conn:
+			return float(conn.execute('PRAGMA user_version').fetchone()[0])
+
+	def _set_synced(self, stamp):
+		with closing(self._connect()) as conn:
+			conn.execute('PRAGMA user_version = %d' % stamp)
+
+	@staticmethod
+	def _folders(folder):
+		"""Returns the folders of a project folder below `Path.JOBS`, or
+		``None`` if it is not in `Path.JOBS`."""
+		try:
+			relative = os.path.relpath(folder, Path.JOBS)
+		except ValueError:
+			# Another drive or share
+			return
+		if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+			return
+		return relative.split(os.sep)
+
+	@staticmethod
+	def describe(filepath, mtime=None):
+		"""Returns the index row of a project file as a ``tuple``.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a project file. Phase, subtype and nickname are
+			``None`` unless it is located in a `Path.JOBS` project folder.
+		mtime : float or None
+			Modification time; read from disk when ``None``.
+
+		See Also
+		--------
+		project.Project.folder
+		project.Project.filename
+
+		"""
+		if mtime is None:
+			mtime = os.path.getmtime(filepath)
+		folder, filename = os.path.split(filepath)
+		job_num = filename.split('_')[0]
+		# <jobs root>/<job>/<phase>[/<subtype>][/<nickname>]
+		rest = (ProjectIndex._folders(folder) or [])[2:]
+		phase = rest.pop(0) if rest else None
+		subtype = None
+		if rest and rest[0] in Rotor.get_machine_sub_types():
+			subtype = rest.pop(0)
+		nickname = rest[0] if rest else None
+		try:
+			machine_type = re.sub(
+				'([a-z])([A-Z])', r'\1 \2', filename.split('_')[2]
+			).replace('.rw', '')
+		except IndexError:
+			machine_type = None
+		return (
+			filepath, filename, job_num, phase, machine_type, subtype, nickname,
+			mtime
+		)
+
+	def add(self, filepath):
+		"""Insert or refresh a single project file.
+
+		Files outside `Path.JOBS` are not indexed, since `update` never
+		removes them. Errors are logged; the index is only a cache.
+
+		Parameters
+		----------
+		filepath : str
+
+		"""
+		if self._folders(os.path.dirname(filepath)) is None:
+			logging.debug('Not indexed, outside %s: %s' % (Path.JOBS, filepath))
+			return
+		try:
+			row = self.describe(filepath)
+			with closing(self._connect()) as conn:
+				with conn:
+					conn.execute(
+						'INSERT OR REPLACE INTO projects VALUES '
+						'(?,?,?,?,?,?,?,?)',
+						row
+					)
+		except (OSError, sqlite3.Error) as error:
+			logging.warning(error)
+
+	@staticmethod
+	def scan(top_level, onerror=None):
+		"""Returns the modification times of the project files in a directory
+		tree, keyed by absolute path.
+
+		Parameters
+		----------
+		top_level : str
+		onerror : callable or None
+			Called with each ``OSError`` of the walk, see ``os.walk``.
+
+		"""
+		found = {}
+		for root, dirs, files in os.walk(top_level, onerror=onerror):
+			for filename in files:
+				if filename.endswith('.rw'):
+					filepath = os.path.join(root, filename)
+					try:
+						found[filepath] = os.path.getmtime(filepath)
+					except OSError:
+						continue
+		return found
+
+	def update(self, top_level, found=None):
+		"""Synchronize the index with the project files in a directory tree.
+
+		Only files whose modification time changed are rewritten, and entries
+		whose files no longer exist are removed.
+
+		Parameters
+		----------
+		top_level : str
+			Absolute path to a directory in `Path.JOBS`.
+		found : dict or None
+			Modification times of every project file in `top_level`, keyed by
+			absolute path. The tree is walked when ``None``.
+
+		Returns
+		-------
+		int
+			The number of inserted, updated or removed entries.
+
+		"""
+		start = default_timer()
+		if found is None:
+			found = self.scan(top_level)
+
+		prefix = os.path.join(top_level, '')
+		with closing(self._connect()) as conn:
+			with conn:
+				known = dict(conn.execute(
+					'SELECT filepath, mtime FROM projects '
+					'WHERE substr(filepath, 1, ?) = ?',
+					(len(prefix), prefix)
+				))
+				stale = [(i,) for i in known if i not in found]
+				changed = [
+					self.describe(path, mtime) for path, mtime in found.items()
+					if known.get(path) != mtime
+				]
+				conn.executemany(
+					'DELETE FROM projects WHERE filepath = ?', stale
+				)
+				conn.executemany(
+					'INSERT OR REPLACE INTO projects VALUES (?,?,?,?,?,?,?,?)',
+					changed
+				)
+		logging.info('Indexed %s in %.3fs (%s changes)' % (
+			top_level, default_timer() - start, len(stale) + len(changed)))
+		return len(stale) + len(changed)
+
+	def remove(self, filepath):
+		"""Remove a project file from the index.
+
+		Parameters
+		----------
+		filepath : str
+
+		"""
+		with closing(self._connect()) as conn:
+			with conn:
+				conn.execute(
+					'DELETE FROM projects WHERE filepath = ?', (filepath,)
+				)
+
+	def sync(self):
+		"""Synchronize the index with every project file in `Path.JOBS`.
+
+		Returns
+		-------
+		int or None
+			The number of changed entries, or ``None`` if a folder could not
+			be read. The index is then left as it is; projects in unread
+			folders would be removed.
+
+		"""
+		started = time.time()
+		errors = []
+		found = self.scan(Path.JOBS, errors.append)
+		if errors:
+			logging.warning('Incomplete walk of %s: %s' % (Path.JOBS, errors[0]))
+			return
+		changes = self.update(Path.JOBS, found)
+		self._set_synced(started)
+		return changes
+
+	def rebuild(self, top_level=None):
+		"""Discard the index and rebuild it from scratch.
+
+		Parameters
+		----------
+		top_level : str or None
+			Defaults to `Path.JOBS`.
+
+		"""
+		with closing(self._connect()) as conn:
+			with conn:
+				conn.execute('DELETE FROM projects')
+		self._set_synced(0)
+		if top_level is None:
+			return self.sync()
+		return self.update(top_level)
+
+	def row(self, filepath):
+		"""Returns the index row (as ``dict``) of a project file.
+
+		The file is described from disk if it is not indexed.
+
+		Parameters
+		----------
+		filepath : str
+
+		Raises
+		------
+		OSError
+			If the file is not indexed and does not exist.
+
+		"""
+		rows = self.search(filepath=filepath)
+		if rows:
+			return rows[0]
+		return dict(zip(self._COLUMNS, self.describe(filepath)))
+
+	def search(self, job_num=None, **criteria):
+		"""Returns a ``list`` of index rows (as ``dict``).
+
+		Parameters
+		----------
+		job_num : str or None
+		criteria
+			Further column values to match, e.g. ``machine_type='Gear'``.
+			Every project is returned when no criteria are given.
+
+		"""
+		if job_num is not None:
+			criteria['job_num'] = job_num
+		for column in criteria:
+			if column not in self._COLUMNS:
+				raise ValueError('Unknown column: %s' % column)
+		where = ' AND '.join('%s = ?' % column for column in criteria)
+		with closing(self._connect()) as conn:
+			rows = conn.execute(
+				'SELECT %s FROM projects %s ORDER BY filename' % (
+					', '.join(self._COLUMNS), 
+					'WHERE ' + where if where else ''
+				),
+				list(criteria.values())
+			).fetchall()
+		return [dict(zip(self._COLUMNS, row)) for row in rows]
+
+	def projects(self, job_num):
+		"""Returns a ``dict`` of project filenames and their directories.
+
+		Parameters
+		----------
+		job_num : str
+
+		See Also
+		--------
+		history.HistoryController.projects
+
+		"""
+		return dict(
+			(row['filename'], os.path.dirname(row['filepath']))
+			for row in self.search(job_num)
+		)
+
+
+def refresh(max_age=MAX_AGE):
+	"""Walk every job folder if the last complete walk is older than
+	`max_age` seconds.
+
+	Concurrent calls wait for the walk in progress.
+
+	Returns
+	-------
+	bool
+		True if the index is complete.
+
+	"""
+	with _refresh_lock:
+		index = ProjectIndex()
+		if time.time() - index.synced <= max_age:
+			return True
+		return index.sync() is not None
+
+
+def start_refresh():
+	"""`refresh` the index in a background thread.
+
+	Only the first call of a session starts a refresh.
+
+	Returns
+	-------
+	threading.Thread
+
+	"""
+	global _refresh_thread
+	with _start_lock:
+		if _refresh_thread is None:
+			_refresh_thread = threading.Thread(target=_refresh, name='Index')
+			_refresh_thread.daemon = True
+			_refresh_thread.start()
+	return _refresh_thread
+
+
+def _refresh():
+	try:
+		refresh()
+	except Exception as error:
+		logging.exception(error)
+
+
+if __name__ == '__main__':
+	# Full rebuild for recovery: python project_index.py --rebuild
+	if '--rebuild' in sys.argv:
+		print('%s entries indexed' % ProjectIndex().rebuild())
@@ -0,0 +1,462 @@
+import os
+import sys
+import csv
+
+
+class AxialMacro(object):
+	"""
+	A PolyWorks macro that runs one axial inspection session.
+
+	The generic axialsIn.pwmacro reads the scope file line by line and
+	dispatches every row through several levels of handler macros. This macro
+	is compiled for a single session instead: the rows are unrolled, the
+	Active Face is verified once, the distance and width handlers are inlined
+	with their hand measurement branches resolved, and only the distance
+	features of the machine's probed targets are created.
+
+	Handlers that end themselves with MACRO END (Active Face and axial target
+	probing) are still called with MACRO EXEC.
+
+	Parameters
+	----------
+	machine : Rotor
+		Defines the distance features of each stage.
+
+	Attributes
+	----------
+	FLATNESS_TOL : str
+	PARALLELISM_TOL : str
+	HAND : str
+		Separates a dimension label from its hand measurement modifier.
+	REFERENCES : list
+		Suffixes of the reference features created for each axial target.
+	features : list
+		Names of the features the session may create.
+	customs : list
+		Names of the custom (hand) measurements the session may create.
+	cleanups : list
+		(kind, value) of the features the session deletes before measuring,
+		see `deletes_any`.
+
+	See Also
+	--------
+	inspection.Axial.compile
+
+	"""
+	FLATNESS_TOL = '0.0150'
+	PARALLELISM_TOL = '0.0200'
+	HAND = '*'
+	REFERENCES = [' Ref 1', ' Ref 2', ' Ref Dist']
+
+	def __init__(self, machine):
+		self._machine = machine
+		self.features = []
+		self.customs = []
+		self.cleanups = []
+		self._add_target('Active Face')
+		self._lines = [
+			'version "5.0"',
+			'# ======================================================',
+			'# Axial Inspection session compiled by RotoWorks.',
+			'# Do not edit; recompiled whenever the session changes.',
+			'# ------------------------------------------------------',
+			'#',
+			'# Parameters',
+			'# ----------',
+			'# $1 : string : Absolute path to macros',
+			'# ======================================================',
+			'',
+			'DECLARE macroPath $1',
+			'DECLARE flatnessTol %s' % self.FLATNESS_TOL,
+			'DECLARE parallelismTol %s' % self.PARALLELISM_TOL,
+			'DECLARE errorStatus',
+			'',
+			'CONFIG UNITS LENGTH ( "Inches" )',
+			'',
+			'# Verify that datum exists',
+			self.exec_('activeFaceHandler', '$macroPath'),
+		]
+
+	@classmethod
+	def from_rows(cls, rows, machine):
+		"""Returns the ``AxialMacro`` of a session.
+
+		Parameters
+		----------
+		rows : list
+			Rows of an axial scope file, see ``inspection.Axial``.
+		machine : Rotor
+
+		"""
+		macro = cls(machine)
+		for row in rows:
+			row = [i for i in row if i]
+			if not row:
+				continue
+			if row[0] == 'Balance Drum':
+				macro.add_balance_drum()
+			elif row[0] == 'Distance':
+				macro.add_distances(row[1:])
+			elif row[0] == 'Width':
+				macro.add_widths(row[1:])
+			else:
+				macro.add_stage(row[0], row[1:])
+		return macro
+
+	@staticmethod
+	def quote(value):
+		"""Returns `value` as a macro argument.
+
+		Variables ('$name') are returned as is, anything else as a string
+		literal.
+
+		Parameters
+		----------
+		value : object
+
+		"""
+		text = str(value)
+		if text.startswith('$'):
+			return text
+		return '"%s"' % text.replace('"', "'")
+
+	@classmethod
+	def exec_(cls, macro, *args):
+		"""Returns a MACRO EXEC line for a macro in the macro folder.
+
+		Parameters
+		----------
+		macro : str
+			Macro filename without extension.
+		args : tuple
+
+		"""
+		path = '"${macroPath}\\%s.pwmacro"' % macro
+		return 'MACRO EXEC ( %s )' % ', '.join(
+			[path] + [cls.quote(i) for i in args]
+		)
+
+	def _add_target(self, feature_name):
+		self.features.append(feature_name)
+		self.features.extend(feature_name + i for i in self.REFERENCES)
+
+	def _probe(self, feature_name):
+		# getAxialTarget cleans up the target before probing it
+		self.cleanups.append(('target', feature_name))
+		self._add_target(feature_name)
+		return self.exec_(
+			'axialTargetHandler', feature_name, '$flatnessTol',
+			'$parallelismTol', '$macroPath'
+		)
+
+	def _distance(self, first, second, name):
+		self.features.append(name)
+		return 'FEATURE DISTANCE CREATE ( %s, %s, %s )' % (
+			self.quote(first), self.quote(second), self.quote(name))
+
+	def _custom(self, dimension, label):
+		self.customs.append('%s %s' % (dimension, label))
+		return self.exec_('getCustomMeasurement', dimension, label)
+
+	def add_stage(self, stage, features):
+		"""Probe the targets of a stage and create their distances.
+
+		Parameters
+		----------
+		stage : str
+			e.g. 'Stage 1'
+		features : list
+			Target names, see ``Rotor.probe_targets``.
+
+		"""
+		self.cleanups.append(('distance', stage))
+		self._lines.extend([
+			'',
+			'# %s' % stage,
+			self.exec_('cleanupActiveDistance', stage),
+		])
+		self._lines.extend([
+			self._probe('%s %s' % (stage, feature)) for feature in features
+		])
+		self._lines.extend([
+			self._distance(*i)
+			for i in self._machine.distances(stage, list(features))
+		])
+
+	def add_balance_drum(self):
+		"""Probe the balance drum and create its distance."""
+		self.cleanups.append(('distance', 'B.D.'))
+		self._lines.extend([
+			'',
+			'# Balance Drum',
+			self.exec_('cleanupActiveDistance', 'B.D.'),
+			self._probe('Balance Drum'),
+			self._distance('Active Face', 'Balance Drum', 'B.D.-B.D. Face'),
+		])
+
+	def add_distances(self, labels):
+		"""Measure distances from the Active Face.
+
+		Inlines distanceHandler.pwmacro.
+
+		Parameters
+		----------
+		labels : list
+			e.g. ['A', 'B*H']
+
+		"""
+		for label in labels:
+			split = label.split(self.HAND)
+			name = 'Distance %s' % split[0]
+			self.cleanups.extend([('target', name), ('word', split[0])])
+			self._lines.extend([
+				'',
+				'# %s' % name,
+				self.exec_('cleanupAxialTarget', name, '$macroPath'),
+				self.exec_('deleteWidthFeaturesIfFound', split[0], '$macroPath'),
+			])
+			if len(split) == 2:
+				# Custom (hand) measurement
+				self._lines.append(self._custom('Distance', split[0]))
+			else:
+				self._lines.extend([
+					self._probe(name),
+					self._distance('Active Face', name, 'To %s' % name),
+				])
+
+	def add_widths(self, labels):
+		"""Measure widths between two planes.
+
+		Inlines widthHandler.pwmacro; the second plane is only probed if the
+		first was created.
+
+		Parameters
+		----------
+		labels : list
+			e.g. ['C', 'D*H']
+
+		"""
+		for label in labels:
+			split = label.split(self.HAND)
+			name = 'Width %s' % split[0]
+			self.cleanups.extend([('target', name), ('word', split[0])])
+			self._lines.extend([
+				'',
+				'# %s' % name,
+				self.exec_('cleanupAxialTarget', name, '$macroPath'),
+				self.exec_('deleteWidthFeaturesIfFound', split[0], '$macroPath'),
+			])
+			if len(split) == 2:
+				# Custom (hand) measurement
+				self._lines.append(self._custom('Width', split[0]))
+				continue
+			first, second = '%s 1' % name, '%s 2' % name
+			self._lines.extend([
+				self._probe(first),
+				'MACRO GET_ERROR_STATUS ( errorStatus )',
+				'IF $errorStatus != "Error"',
+				'    %s' % self._probe(second),
+				'    MACRO GET_ERROR_STATUS ( errorStatus )',
+				'    IF $errorStatus == "Error"',
+				'        %s' % self.exec_(
+					'cleanupAxialTarget', first, '$macroPath'),
+				'    ELSE',
+				'        %s' % self._distance(first, second, name),
+				'    ENDIF',
+				'ENDIF',
+			])
+
+	def deletes_any(self, names):
+		"""Returns True if the session may delete any of `names`.
+
+		Mirrors the cleanup macros, erring on the side of a match:
+		cleanupActiveDistance deletes the distances whose name contains the
+		stage, cleanupAxialTarget a target and its references, and
+		deleteWidthFeaturesIfFound features with the label as a word.
+
+		Parameters
+		----------
+		names : iterable
+			Feature and custom measurement names, e.g. of the last export.
+
+		"""
+		for name in names:
+			for kind, value in self.cleanups:
+				if kind == 'distance' and value in name:
+					return True
+				if kind == 'target' and (name == value or 
+						name in [value + i for i in self.REFERENCES]):
+					return True
+				if kind == 'word' and value in name.split():
+					return True
+		return False
+
+	def dumps(self):
+		"""Returns the macro as a ``str``."""
+		return '\n'.join(self._lines) + '\n'
+
+	def dump(self, filepath):
+		"""Save the macro to file.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a PWMACRO file.
+
+		Returns
+		-------
+		filepath : str
+
+		"""
+		with open(filepath, 'w') as macro:
+			macro.write(self.dumps())
+		return filepath
+
+
+class ExportMacro(object):
+	"""
+	A PolyWorks macro that exports named features and custom measurements.
+
+	Unlike measurementsOut.pwmacro, which exports the whole project, only the
+	listed objects are selected. Objects that do not exist are skipped.
+
+	Parameters
+	----------
+	features : list
+	customs : list
+
+	Notes
+	-----
+	The macro takes the CSV file path and the macro folder as arguments.
+
+	"""
+	def __init__(self, features, customs):
+		self._items = []
+		self._lines = [
+			'version "5.0"',
+			'# ======================================================',
+			'# Export measurement items compiled by RotoWorks.',
+			'# ------------------------------------------------------',
+			'#',
+			'# Parameters',
+			'# ----------',
+			'# $1 : string : Absolute path to the CSV file',
+			'# $2 : string : Absolute path to macros',
+			'# ======================================================',
+			'',
+			'DECLARE csvPath $1',
+			'DECLARE macroPath $2',
+			'DECLARE exists',
+			'DECLARE index',
+			'DECLARE feat_index',
+			'DECLARE cust_index',
+			'',
+			'# Set item destination',
+			'TREEVIEW OBJECT SELECT NONE',
+			'REPORT_ITEM OPTIONS DESTINATION ( "Tree View" )',
+			'',
+			'# Remove existing report items',
+			'TREEVIEW REPORT_ITEM SELECT ALL',
+			'EDIT OBJECT DELETE (  )',
+		]
+		self._add_section(
+			'Feature', features, 'featureExists', 'FEATURE', 'RotoworksFeatures'
+		)
+		self._add_section(
+			'Custom Measurement', customs, 'customExists', 
+			'CUSTOM_MEASUREMENT', 'RotoworksCustoms'
+		)
+		self._lines.extend(['', '# Export items to CSV'])
+		for item, index in (('Feature', 'feat_index'), 
+				('Custom Measurement', 'cust_index')):
+			if item in self._items:
+				self._lines.append(
+					'TREEVIEW REPORT_ITEM INDEX GET ( "%s", %s )' % (item, index)
+				)
+		for item, index in (('Feature', 'feat_index'), 
+				('Custom Measurement', 'cust_index')):
+			if item in self._items:
+				self._lines.append('TREEVIEW REPORT_ITEM SELECT ( $%s )' % index)
+		self._lines.append('FILE EXPORT_REPORT CSV_FILE ( "${csvPath}" )')
+
+	def _add_section(self, item, names, exists_macro, tree_item, template):
+		"""Select the existing `names` and add a report table for them."""
+		if not names:
+			return
+		self._items.append(item)
+		self._lines.extend(['', '# Send %s items' % item])
+		for name in names:
+			# Output arguments are passed as variable names
+			self._lines.extend([
+				'MACRO EXEC ( "${macroPath}\\%s.pwmacro", %s, exists, index )' % (
+					exists_macro, AxialMacro.quote(name)),
+				'IF $exists == 1',
+				'    TREEVIEW %s SELECT ( $index )' % tree_item,
+				'ENDIF',
+			])
+		self._lines.extend([
+			'REPORT_ITEM TABLE FROM_SELECTED_OBJECTS USING_TEMPLATE '
+			'( "%s", "User" )' % template,
+			'TREEVIEW OBJECT SELECT NONE',
+		])
+
+	def dumps(self):
+		"""Returns the macro as a ``str``."""
+		return '\n'.join(self._lines) + '\n'
+
+	def dump(self, filepath):
+		"""Save the macro to file.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a PWMACRO file.
+
+		Returns
+		-------
+		filepath : str
+
+		"""
+		with open(filepath, 'w') as macro:
+			macro.write(self.dumps())
+		return filepath
+
+
+def read_rows(filepath):
+	"""Returns the rows of an axial scope file.
+
+	Parameters
+	----------
+	filepath : str
+
+	Raises
+	------
+	IOError
+		If the system cannot find the path specified.
+
+	"""
+	with open(filepath, 'rb') as csvfile:
+		return list(csv.reader(csvfile))
+
+
+# Centrifugal compressor session compiled into the golden file
+_SAMPLE_ROWS = [
+	['Stage 1', 'Eye Face', 'I.C.P.', 'I.B.P.'],
+	['Stage 2', 'Leading Edge', 'Trailing Edge', 'I.B.P.', 'O.B.P.'],
+	['Balance Drum'],
+	['Distance', 'A', 'B*H'],
+	['Width', 'C', 'D*H'],
+]
+
+
+if __name__ == '__main__':
+	# Rewrite the golden file after an intended change:
+	#   python pwmacro.py --update
+	# tests/test_rotoworks.py checks the compiled sample session against it.
+	golden = os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		'tests', 'golden', 'AxialSession.pwmacro'
+	)
+	from machine import CentrifugalCompressor
+	if '--update' in sys.argv:
+		AxialMacro.from_rows(_SAMPLE_ROWS, CentrifugalCompressor()).dump(golden)
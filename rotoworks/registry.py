@@ -0,0 +1,113 @@
+"""
+rotoworks.registry registers the subclasses of a base class as they are
+defined.
+
+"""
+import re
+from collections import OrderedDict
+
+
+class Registry(type):
+	"""
+	Metaclass that keeps a base class's subclasses in a registry.
+
+	The first class created with this metaclass is the base class. Its direct
+	subclasses, and any indirect subclass that sets DISPLAY_NAME in its own
+	``class`` body, are registered when their ``class`` statement runs, under
+	their display name and class name. Other indirect subclasses (shared
+	intermediate classes, variants of a registered class) are not listed
+	unless passed to `register`. Plug-in modules only need to be imported for
+	their classes to be found.
+
+	Classes may set DISPLAY_NAME; otherwise the base class's ``display_name``
+	method, or this metaclass's, derives it from the class name.
+
+	Examples
+	--------
+	>>> class Rotor(object):
+	...     __metaclass__ = Registry
+	>>> class SteamTurbine(Rotor):
+	...     pass
+	>>> Rotor.lookup('Steam Turbine') is Rotor.lookup('SteamTurbine')
+	True
+
+	"""
+	def __init__(cls, name, bases, attrs):
+		super(Registry, cls).__init__(name, bases, attrs)
+		if not any(isinstance(base, Registry) for base in bases):
+			# Base class
+			cls._registry = OrderedDict()
+			cls._lookup = {}
+		elif ('DISPLAY_NAME' in attrs
+				or any('_registry' in vars(base) for base in bases)):
+			cls.register(cls, attrs.get('DISPLAY_NAME'))
+
+	def display_name(cls, name):
+		"""Returns a class name split into words ('SteamTurbine' becomes
+		'Steam Turbine').
+
+		"""
+		return re.sub('([a-z])([A-Z])', r'\1 \2', name)
+
+	def register(cls, child, display_name=None):
+		"""Register a class, or add an alias of a registered class.
+
+		Subclasses are registered automatically, so this is mostly used to
+		keep old names (e.g. of renamed machine types) loadable. An alias
+		can be looked up but is not listed in `registered`.
+
+		Parameters
+		----------
+		child : type
+			A subclass of the base class.
+		display_name : str or None
+
+		Returns
+		-------
+		child : type
+
+		Raises
+		------
+		TypeError
+			If `child` is not a subclass of the base class.
+
+		"""
+		if not issubclass(child, cls):
+			raise TypeError('%s is not a %s' % (child.__name__, cls.__name__))
+		if child in cls._registry.values():
+			if display_name is not None:
+				cls._lookup[display_name.replace(' ', '')] = child
+			return child
+		if display_name is None:
+			display_name = cls.display_name(child.__name__)
+		child.DISPLAY_NAME = display_name
+		cls._registry[display_name] = child
+		for key in (display_name, child.__name__):
+			cls._lookup[key.replace(' ', '')] = child
+		return child
+
+	def lookup(cls, name):
+		"""Returns the class registered under a display or class name.
+
+		Spaces are ignored, so 'Steam Turbine' and 'SteamTurbine' are the
+		same name.
+
+		Parameters
+		----------
+		name : str
+
+		Raises
+		------
+		KeyError
+			If no class is registered under `name`.
+
+		"""
+		return cls._lookup[name.replace(' ', '')]
+
+	@property
+	def registered(cls):
+		"""OrderedDict: Registered classes keyed by display name, in the
+		order they were defined.
+
+		"""
+		return cls._registry
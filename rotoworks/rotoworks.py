@@ -1,18 +1,26 @@
 import os
 import sys
-from PyQt4 import QtGui
+from PyQt4 import QtGui, QtCore
 from pyqtauto.widgets import ToolBar, ExceptionMessageBox
 from pyqtauto.setters import set_uniform_margins
-from definition import DefinitionController
-from workspace import WorkspaceController
-from history import HistoryController
-from scope import ScopeController
-from core import Image, Path, setup_logger
-from data import get_data_source
+from core import Image, Path, setup_logger, set_asset_root, sync_assets
 from view import HomeView
 import logging
 
 
+class AssetRoot(QtCore.QObject):
+	"""
+	Forwards asset root changes from the mirror sync thread to the GUI thread.
+
+	Attributes
+	----------
+	changed : pyqtSignal(str)
+		Emitted with the new asset root.
+
+	"""
+	changed = QtCore.pyqtSignal(str)
+
+
 class RotoWorks(object):
 	"""
 	RotoWorks is an application that aims to simplify shop inspections and 
@@ -26,8 +34,20 @@ class RotoWorks(object):
 	via PolyWorks Inspector. Customer documentation is carried out through 
 	Autodesk AutoCAD. Comparison reports are saved as CSV.
 
+	Only the home view is built at startup. The other views, and the modules
+	behind them, are loaded the first time they are shown.
+
+	Attributes
+	----------
+	definition : DefinitionController
+	scope : ScopeController
+	workspace : WorkspaceController
+
 	"""
 	def __init__(self):
+		self._definition = None
+		self._scope = None
+		self._workspace = None
 		self.window = QtGui.QMainWindow()
 		self.window.setWindowTitle('RotoWorks')
 		# Toolbar
@@ -37,21 +57,62 @@ class RotoWorks(object):
 		self.toolbar.add_action(Image.INFO, 'Help', self.on_click_help)
 		# Main views
 		self.home_view = HomeView()
-		self.definition = DefinitionController()
-		self.definition.view.btn.accepted.connect(self.create_project)
-		self.scope = ScopeController()
-		self.scope.view.btn.accepted.connect(self.enter_workspace)
-		self.workspace = WorkspaceController()
-		self.workspace.view.btns.helpRequested.connect(self.retro_scope_mod)
-		self.workspace.view.btns.accepted.connect(self.on_workspace_finish)
 		# Stack views
 		self.interfaces = QtGui.QStackedWidget()
 		self.interfaces.addWidget(self.home_view)
-		self.interfaces.addWidget(self.definition.view)
-		self.interfaces.addWidget(self.scope.view)
-		self.interfaces.addWidget(self.workspace.view)
 		set_uniform_margins(self.interfaces, 10)
 		self.window.setCentralWidget(self.interfaces)
+		# Attach to PolyWorks once the window is up, while the user picks a 
+		# project
+		QtCore.QTimer.singleShot(0, self._connect)
+		# Image and macro paths are only switched to a newly synced mirror on 
+		# the GUI thread
+		self._asset_root = AssetRoot()
+		self._asset_root.changed.connect(self._on_asset_root)
+		QtCore.QTimer.singleShot(0, self._sync_assets)
+		QtCore.QTimer.singleShot(0, self._index_projects)
+
+	def _connect(self):
+		from connection import get_connection
+		get_connection().start()
+
+	def _index_projects(self):
+		from project_index import start_refresh
+		start_refresh()
+
+	def _sync_assets(self):
+		sync_assets(self._asset_root.changed.emit)
+
+	def _on_asset_root(self, root):
+		set_asset_root(str(root))
+
+	@property
+	def definition(self):
+		if self._definition is None:
+			from definition import DefinitionController
+			self._definition = DefinitionController()
+			self._definition.view.btn.accepted.connect(self.create_project)
+			self.interfaces.addWidget(self._definition.view)
+		return self._definition
+
+	@property
+	def scope(self):
+		if self._scope is None:
+			from scope import ScopeController
+			self._scope = ScopeController()
+			self._scope.view.btn.accepted.connect(self.enter_workspace)
+			self.interfaces.addWidget(self._scope.view)
+		return self._scope
+
+	@property
+	def workspace(self):
+		if self._workspace is None:
+			from workspace import WorkspaceController
+			self._workspace = WorkspaceController()
+			self._workspace.view.btns.helpRequested.connect(self.retro_scope_mod)
+			self._workspace.view.btns.accepted.connect(self.on_workspace_finish)
+			self.interfaces.addWidget(self._workspace.view)
+		return self._workspace
 
 	def on_click_new(self):
 		self.definition.view.clear()
@@ -99,6 +160,8 @@ class RotoWorks(object):
 
 	def on_click_open(self):
 		"""Prompt user to open an existing project."""
+		from history import HistoryController
+		from data import get_data_source
 		history = HistoryController()
 		if history.view.exec_():
 			if history.project is not None:
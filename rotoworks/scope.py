@@ -1,14 +1,144 @@
-from PyQt4 import QtGui
-from pyqtauto.widgets import (TableItem, Table, DialogButtonBox, TableCheckBox, 
-	ExceptionMessageBox)
-from data import TableMap
+from PyQt4 import QtGui, QtCore
+import numpy as np
+from pyqtauto.widgets import DialogButtonBox, ExceptionMessageBox
 from core import setup_logger
+from machine import Rotor
 import logging
 
 
 setup_logger()
 
 
+class ScopeTableModel(QtCore.QAbstractTableModel):
+	"""
+	A checkable stages x features grid backed by a ``uint8`` matrix.
+
+	Row 0 selects or clears an entire column. Every following row contains a
+	stage label (column 0) and the stage's feature options. Cells are painted
+	by the view, so no widget is created per cell.
+
+	Parameters
+	----------
+	scope : ScopeModel
+		Initial state; a working copy is edited until the scope is saved.
+	features : list
+		Column header names.
+
+	Attributes
+	----------
+	stages : list
+	matrix : ndarray
+
+	"""
+	_SELECT_ALL_ROW_OFFSET = 1
+	_STAGE_COLUMN_OFFSET = 1
+
+	def __init__(self, scope, features):
+		super(ScopeTableModel, self).__init__()
+		self._features = list(features)
+		self._is_curtis = scope.is_curtis
+		self.stages = scope.stages
+		self.matrix = scope.matrix.copy()
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		if parent.isValid() or not self.stages:
+			return 0
+		return len(self.stages) + self._SELECT_ALL_ROW_OFFSET
+
+	def columnCount(self, parent=QtCore.QModelIndex()):
+		if parent.isValid():
+			return 0
+		return len(self._features)
+
+	def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+		if (orientation == QtCore.Qt.Horizontal and
+				role == QtCore.Qt.DisplayRole):
+			return self._features[section]
+
+	def flags(self, index):
+		if index.column() < self._STAGE_COLUMN_OFFSET:
+			return QtCore.Qt.ItemIsEnabled
+		return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsUserCheckable
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		row = index.row() - self._SELECT_ALL_ROW_OFFSET
+		col = index.column() - self._STAGE_COLUMN_OFFSET
+		if role == QtCore.Qt.TextAlignmentRole:
+			return QtCore.Qt.AlignCenter
+		if col < 0:
+			if role == QtCore.Qt.DisplayRole and row >= 0:
+				return self.stages[row]
+			return
+		if role == QtCore.Qt.CheckStateRole:
+			if row < 0:
+				checked = bool(self.matrix[:, col].all())
+			else:
+				checked = bool(self.matrix[row, col])
+			return QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked
+
+	def setData(self, index, value, role=QtCore.Qt.EditRole):
+		if role != QtCore.Qt.CheckStateRole:
+			return False
+		try:
+			# PyQt4 API v1 passes a QVariant
+			value = value.toInt()[0]
+		except AttributeError:
+			value = int(value)
+		checked = 1 if value == QtCore.Qt.Checked else 0
+		row = index.row() - self._SELECT_ALL_ROW_OFFSET
+		col = index.column() - self._STAGE_COLUMN_OFFSET
+		if row < 0:
+			# Select all
+			self.matrix[:, col] = checked
+			bottom = self.index(len(self.stages), index.column())
+		else:
+			self.matrix[row, col] = checked
+			bottom = index
+		top = self.index(0, index.column())
+		self.dataChanged.emit(top, bottom)
+		return True
+
+	def set_stage_count(self, stage_count):
+		"""Add or remove stage rows, keeping the state of remaining rows.
+
+		Parameters
+		----------
+		stage_count : int
+
+		"""
+		current = len(self.stages)
+		if stage_count > current:
+			first = current + self._SELECT_ALL_ROW_OFFSET if current else 0
+			self.beginInsertRows(
+				QtCore.QModelIndex(), first,
+				stage_count + self._SELECT_ALL_ROW_OFFSET - 1
+			)
+			labels = Rotor.stage_names(stage_count, self._is_curtis)
+			self.stages.extend(
+				i.replace('Stage ', '') for i in labels[current:]
+			)
+			self.matrix = np.vstack([
+				self.matrix,
+				np.zeros((stage_count - current, self.matrix.shape[1]), np.uint8)
+			])
+			self.endInsertRows()
+		elif stage_count < current:
+			first = stage_count + self._SELECT_ALL_ROW_OFFSET if stage_count else 0
+			self.beginRemoveRows(
+				QtCore.QModelIndex(), first,
+				current + self._SELECT_ALL_ROW_OFFSET - 1
+			)
+			del self.stages[stage_count:]
+			self.matrix = self.matrix[:stage_count].copy()
+			self.endRemoveRows()
+		else:
+			return
+		# Select-all states depend on every row
+		self.dataChanged.emit(
+			self.index(0, 0), self.index(0, self.columnCount() - 1)
+		)
+
+
 class ScopeView(QtGui.QWidget):
 	"""
 	Displays project workscope GUI.
@@ -18,14 +148,13 @@ class ScopeView(QtGui.QWidget):
 	stage_le : QLineEdit
 		Accepts the number of stages in a machine.
 
+	table : QTableView
+		Displays a ``ScopeTableModel``.
+
 	btn : DialogButtonBox
 		Clicked to serialize the updated data model.
 
 	"""
-
-	_SELECT_ALL_ROW_OFFSET = 1
-	_STAGE_COLUMN_OFFSET = 1
-
 	def __init__(self):
 		super(ScopeView, self).__init__()
 		self._main_layout = QtGui.QVBoxLayout(self)
@@ -34,12 +163,14 @@ class ScopeView(QtGui.QWidget):
 		# Init widgets
 		self._filename_lb = QtGui.QLabel()
 		self.stage_le = QtGui.QLineEdit()
-		self.table = Table()
+		self.table = QtGui.QTableView()
 		# Configure widgets
 		self.stage_le.setFixedWidth(50)
 		self.stage_le.setValidator(QtGui.QIntValidator())
-		self.stage_le.setMaxLength(2)
+		self.stage_le.setMaxLength(3)
 		self.table.verticalHeader().hide()
+		self.table.horizontalHeader().setResizeMode(QtGui.QHeaderView.Stretch)
+		self.table.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
 		# Add widgets to layout
 		self._form_layout.addRow(QtGui.QLabel('Project:'), self._filename_lb)
 		self._form_layout.addRow(QtGui.QLabel('Stage Count:'), self.stage_le)
@@ -47,89 +178,24 @@ class ScopeView(QtGui.QWidget):
 		self._main_layout.addWidget(self.table)
 		self.btn = DialogButtonBox(self._main_layout)
 
-	def _select_all(self, checkbox, state):
-		"""Change the checked state of an entire column.
-
-		Parameters
-		----------
-		checkbox : TableCheckBox
-			The top row widget that was clicked.
-
-		state : bool
-
-		"""
-		parent_col = self.table.indexAt(checkbox.parent().pos()).column()
-		for check in self.table.findChildren(QtGui.QCheckBox):
-			if self.table.indexAt(check.parent().pos()).column() == parent_col:
-				check.setChecked(state)
-
-	def _on_click_top_row(self):
-		"""Initiate select-all functionality on the ``Table`` object."""
-		checkbox = self.sender()
-		self._select_all(checkbox, checkbox.isChecked())
-
-	def _insert_select_all_row(self, col_count):
+	def set_state(self, filename, model, stage_count):
 		"""
 		Parameters
 		----------
-		col_count : int
-
-		"""
-		for col in range(self._STAGE_COLUMN_OFFSET, col_count):
-			self.table.setCellWidget(0, col, TableCheckBox(
-				response=self._on_click_top_row).widget
-			)
-		
-	def _insert_feature_rows(self, table_map, col_count):
-		"""
-		Parameters
-		----------
-		table_map : TableMap
-
-		col_count : int
-
-		"""
-		row = self._SELECT_ALL_ROW_OFFSET
-		for stage in table_map.data.keys():
-			self.table.setItem(row, 0, TableItem(stage))
-			for col in range(self._STAGE_COLUMN_OFFSET, col_count):
-				self.table.setCellWidget(row, col, 
-					table_map.data[stage][col-1].widget)
-			row += 1
-
-	def set_state(self, filename, col_headers, stage_count):
-		"""		
-		Parameters
-		----------
 		filename : str
 			Name of the data file.
 
-		col_headers : list
-			Table column header names.
+		model : ScopeTableModel
 
 		stage_count : int
 			The number of stages in a machine.
 
 		"""
 		self._filename_lb.setText(filename)
-		self.table.update(col_headers)
+		self.table.setModel(model)
+		self.stage_le.blockSignals(True)
 		self.stage_le.setText(str(stage_count))
-
-	def set_rows(self, table_map, col_count):
-		"""Update ``Table`` rows.
-
-		Parameters
-		----------
-		table_map : TableMap
-
-		col_count : int
-
-		"""
-		row_count = len(table_map.data) + self._SELECT_ALL_ROW_OFFSET
-		if row_count > 1:
-			self.table.setRowCount(row_count)
-			self._insert_select_all_row(col_count)
-			self._insert_feature_rows(table_map, col_count)
+		self.stage_le.blockSignals(False)
 
 
 class ScopeController(object):
@@ -143,11 +209,22 @@ class ScopeController(object):
 	----------
 	view : ScopeView
 		Provides GUI.
+	model : ScopeTableModel
+		Holds the unsaved workscope.
 
 	"""
+	# Stage count edits are applied once typing pauses for this many ms.
+	EDIT_DELAY = 250
+
 	def __init__(self):
 		self._data = None
+		self.model = None
 		self.view = ScopeView()
+		self._edit_timer = QtCore.QTimer()
+		self._edit_timer.setSingleShot(True)
+		self._edit_timer.setInterval(self.EDIT_DELAY)
+		self._edit_timer.timeout.connect(self._on_edit_stage_count)
+		self.view.stage_le.textChanged.connect(self._edit_timer.start)
 
 	def init_state(self, data):
 		"""Set view state at startup.
@@ -158,59 +235,42 @@ class ScopeController(object):
 			Instance data model.
 
 		"""
-		# Initialize instance data
-		stage_count = len(data.scope.data)
+		self._edit_timer.stop()
 		self._data = data
-		self._col_count = len(self._data.features)
-		self.table_map = TableMap(
-			self._data.is_curtis, 
-			len(self._data.features)
-		)
-		self.table_map.init(stage_count)
-
-		# Update TableMap to existing scope
-		if stage_count > 0:
-			self.table_map.update(self._data.scope)
+		self.model = ScopeTableModel(self._data.scope, self._data.features)
 
 		# Set view state
-		self.view.setMinimumWidth(90 * self._col_count)
+		self.view.setMinimumWidth(90 * len(self._data.features))
 		self.view.set_state(
-			self._data.filename, 
-			self._data.features, 
-			stage_count
+			self._data.filename,
+			self.model,
+			len(self._data.scope)
 		)
-		self.view.set_rows(self.table_map, self._col_count)
-		self.view.stage_le.textChanged.connect(self._on_edit_stage_count)
-		
-	def _on_edit_stage_count(self, stage_count):
-		"""Update the view ``Table``.
-
-		Parameters
-		----------
-		stage_count : str
 
-		"""
+	def _on_edit_stage_count(self):
+		"""Resize the view table to the entered stage count."""
 		try:
-			if stage_count == str(0):
-				raise ValueError
-			self.table_map.init(int(stage_count))
-			self.view.set_rows(self.table_map, self._col_count)
+			stage_count = int(self.view.stage_le.text())
 		except ValueError:
-			# Invalid literal for int() with base 10; called when no input or
-			# when input is 0.
-			self.view.table.setRowCount(0)	
+			# Invalid literal for int() with base 10; called when no input.
+			stage_count = 0
+		self.model.set_stage_count(max(stage_count, 0))
 
 	def save(self):
 		"""Save updates to the project file.
-		
+
 		Returns
 		-------
 		Data
 			Instance data model.
 
 		"""
+		if self._edit_timer.isActive():
+			# Apply a pending stage count edit
+			self._edit_timer.stop()
+			self._on_edit_stage_count()
 		try:
-			self._data.scope.update(self.table_map)
+			self._data.scope.update(self.model)
 			self._data.save()
 		except IOError as error:
 			logging.warning(error)
@@ -220,4 +280,4 @@ class ScopeController(object):
 
 
 if __name__ == '__main__':
-	pass
\ No newline at end of file
+	pass
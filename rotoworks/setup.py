@@ -10,7 +10,10 @@ setup(
     windows=[{"script":"L:\\Division2\\DRAFTING\\Applications\\rotoworks\\rotoworks\\rotoworks.py"}],
     options={"py2exe":{"includes":[
         "pyautocad", "sip", "PyQt4.QtXml", 'pandas._libs.tslibs.np_datetime',
-        'pandas._libs.tslibs.nattype','pandas._libs.skiplist']
+        'pandas._libs.tslibs.nattype','pandas._libs.skiplist',
+        # Imported by name on first launch, see workspace.py
+        'axial_session', 'diameter_session', 'thermal_gap_session',
+        'rotor_weights_session']
     }},
     data_files=matplotlib.get_py2exe_datafiles()
 )
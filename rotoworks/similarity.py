@@ -0,0 +1,193 @@
+"""
+rotoworks.similarity finds the archived projects most similar to a project.
+
+"""
+import logging
+import warnings
+from timeit import default_timer
+import numpy as np
+from archive import MeasurementArchive, scope_fractions
+from fleet import FleetEnvelope
+try:
+	from scipy.spatial import cKDTree
+except ImportError:
+	# Brute-force search
+	cKDTree = None
+
+
+class SimilarityIndex(object):
+	"""
+	A k-nearest-neighbour index of the archived projects of a machine type.
+
+	Each project is described by a vector of its stage count, the fraction of
+	its stages scoped for each feature and its most commonly archived Axial and
+	Diameter measurements. Missing measurements take the fleet mean and every
+	column is standardized, so each contributes equally to the distance.
+
+	Queries use a KD-tree when scipy is installed and a brute-force NumPy
+	search otherwise. Indexes are cached until the machine type's archive
+	partitions are rewritten.
+
+	Parameters
+	----------
+	machine_type : str
+	archive : MeasurementArchive or None
+
+	Attributes
+	----------
+	INSPECTIONS : tuple
+		Inspections whose measurements are part of the vectors.
+	MEASUREMENTS : int
+		The number of measurements in each vector.
+
+	"""
+	INSPECTIONS = ('Axial', 'Diameter')
+	MEASUREMENTS = 24
+
+	_cache = {}
+
+	def __init__(self, machine_type, archive=None):
+		self.machine_type = machine_type
+		self._archive = MeasurementArchive() if archive is None else archive
+		generation = self._archive.generation(machine_type)
+		cached = self._cache.get(machine_type)
+		if cached is None or cached[0] != generation:
+			cached = (generation, self._build())
+			self._cache[machine_type] = cached
+		(self.projects, self.job_nums, self.columns, self.vectors, 
+			self._mean, self._std, self._tree) = cached[1]
+
+	def __len__(self):
+		return len(self.projects)
+
+	def _build(self):
+		"""Returns the projects, job numbers, columns, vectors, column means
+		and standard deviations, and KD-tree."""
+		start = default_timer()
+		archived = self._archive.projects(self.machine_type)
+		index = dict(
+			(project, i) for i, project in enumerate(archived['project'])
+		)
+
+		rows = self._archive.query(
+			self.machine_type, controls=list(FleetEnvelope.CONTROLS)
+		)
+		mask = np.isin(rows['inspection'], self.INSPECTIONS)
+		rows = dict((i, rows[i][mask]) for i in rows)
+		rows['name'] = np.char.add(
+			np.char.add(rows['inspection'].astype('U'), ': '),
+			rows['name'].astype('U')
+		)
+		projects, names, values = FleetEnvelope.matrix(rows)
+
+		# Keep the most commonly measured features
+		top = np.argsort(-(~np.isnan(values)).sum(axis=0), kind='mergesort')
+		top = top[:self.MEASUREMENTS]
+		measurements = np.full((len(index), len(top)), np.nan)
+		if len(projects):
+			measurements[[index[i] for i in projects]] = values[:, top]
+
+		columns = (
+			['Stages'] +
+			['Scope %s' % i for i in range(archived['scope'].shape[1])] +
+			list(names[top])
+		)
+		vectors = np.hstack([
+			archived['stages'][:, np.newaxis].astype(np.float64),
+			archived['scope'].astype(np.float64),
+			measurements
+		])
+		vectors[vectors[:, 0] < 0, 0] = np.nan
+		with warnings.catch_warnings():
+			# Columns without values
+			warnings.simplefilter('ignore', RuntimeWarning)
+			mean = np.nanmean(vectors, axis=0)
+			std = np.nanstd(vectors, axis=0)
+		mean = np.nan_to_num(mean)
+		std[~(std > 0)] = 1
+		missing = np.isnan(vectors)
+		vectors[missing] = np.take(mean, np.nonzero(missing)[1])
+		vectors = (vectors - mean) / std
+		tree = None
+		if cKDTree is not None and len(vectors):
+			tree = cKDTree(vectors)
+		logging.info('Indexed %s %s projects in %.3fs' % (
+			len(index), self.machine_type, default_timer() - start))
+		return (archived['project'], archived['job_num'], columns, vectors, 
+			mean, std, tree)
+
+	def vector(self, data):
+		"""Returns the standardized vector of a project.
+
+		Archived projects use their archived vector. Otherwise the vector is
+		described by the project's stage count and scope, and its
+		measurements take the fleet mean.
+
+		Parameters
+		----------
+		data : Data
+
+		"""
+		matches = np.nonzero(self.projects == data.filepath)[0]
+		if len(matches):
+			return self.vectors[matches[0]]
+		width = len([i for i in self.columns if i.startswith('Scope ')])
+		vector = np.array(self._mean)
+		vector[0] = len(data.scope)
+		vector[1:1 + width] = scope_fractions(data.scope, width)
+		return (vector - self._mean) / self._std
+
+	def nearest(self, vector, k=5, exclude=None):
+		"""Returns the archived projects closest to a vector.
+
+		Parameters
+		----------
+		vector : ndarray
+			As returned by `vector`.
+		k : int
+		exclude : str or None
+			Absolute path to a project file to leave out, usually the
+			project described by `vector`.
+
+		Returns
+		-------
+		list
+			Up to `k` (filepath, job_num, distance) tuples, closest first.
+
+		"""
+		candidates = self.projects != exclude
+		count = min(k, int(candidates.sum()))
+		if count == 0:
+			return []
+		if self._tree is not None:
+			# Query one more neighbour to skip the excluded project
+			n = min(len(self.projects), count + len(self.projects) -
+				int(candidates.sum()))
+			distances, indices = self._tree.query(vector, n)
+			distances, indices = np.atleast_1d(distances, indices)
+		else:
+			distances = np.sqrt(((self.vectors - vector) ** 2).sum(axis=1))
+			indices = np.argsort(distances, kind='mergesort')
+			distances = distances[indices]
+		keep = candidates[indices]
+		return [
+			(str(self.projects[j]), str(self.job_nums[j]), float(d))
+			for j, d in zip(indices[keep][:count], distances[keep][:count])
+		]
+
+
+if __name__ == '__main__':
+	# Compare KD-tree and brute-force queries on 20000 synthetic projects.
+	rng = np.random.RandomState(0)
+	vectors = rng.normal(size=(20000, 40))
+	start = default_timer()
+	for i in range(100):
+		np.argsort(((vectors - vectors[i]) ** 2).sum(axis=1))[:6]
+	print('Brute force: %.3f ms per query' % (
+		(default_timer() - start) * 10))
+	if cKDTree is not None:
+		tree = cKDTree(vectors)
+		start = default_timer()
+		for i in range(100):
+			tree.query(vectors[i], 6)
+		print('KD-tree: %.3f ms per query' % ((default_timer() - start) * 10))
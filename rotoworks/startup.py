@@ -0,0 +1,92 @@
+"""
+rotoworks.startup profiles the cold start of the application.
+
+Run this module to time every module imported until the home view appears::
+
+    python startup.py           # lazy startup
+    python startup.py --eager   # also import the deferred views
+
+The --eager run imports the modules that used to load at startup and gives
+the budget before views were built on demand.
+
+"""
+import sys
+from timeit import default_timer
+try:
+	import __builtin__ as builtins
+except ImportError:
+	# Python 3
+	import builtins
+
+
+# Seconds until the home view is shown on a shop PC
+BUDGET = 1.0
+
+# Modules loaded when their views are first shown
+DEFERRED = ['definition', 'scope', 'workspace', 'history', 'data', 'template']
+
+
+class ImportTimer(object):
+	"""
+	Records the first import of each module while active.
+
+	Times are inclusive: a module's time includes the modules it imports.
+
+	Attributes
+	----------
+	times : dict
+		Import duration (seconds) keyed by module name.
+
+	"""
+	def __init__(self):
+		self.times = {}
+		self._import = None
+
+	def __enter__(self):
+		self._import = builtins.__import__
+		builtins.__import__ = self._timed_import
+		return self
+
+	def __exit__(self, *args):
+		builtins.__import__ = self._import
+
+	def _timed_import(self, name, *args, **kwargs):
+		if name in sys.modules or name in self.times:
+			return self._import(name, *args, **kwargs)
+		self.times[name] = 0.0
+		start = default_timer()
+		try:
+			return self._import(name, *args, **kwargs)
+		finally:
+			self.times[name] = default_timer() - start
+
+	def report(self, count=15):
+		"""Returns the slowest imports as a ``str``.
+
+		Parameters
+		----------
+		count : int
+
+		"""
+		slowest = sorted(self.times.items(), key=lambda i: -i[1])[:count]
+		return '\n'.join('%8.1f ms  %s' % (t * 1000, name) for name, t in slowest)
+
+
+if __name__ == '__main__':
+	start = default_timer()
+	with ImportTimer() as timer:
+		from PyQt4 import QtGui
+		import rotoworks
+		if '--eager' in sys.argv:
+			for module in DEFERRED:
+				__import__(module)
+	imported = default_timer() - start
+	app = QtGui.QApplication(sys.argv)
+	window = rotoworks.RotoWorks().window
+	window.show()
+	app.processEvents()
+	shown = default_timer() - start
+	print(timer.report())
+	print('Imports: %.3fs, window shown: %.3fs (budget %.1fs)' % (
+		imported, shown, BUDGET))
+	sys.exit(0 if shown < BUDGET else 1)
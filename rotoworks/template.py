@@ -1,11 +1,17 @@
 import os.path
 import sys
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from shutil import copy
 from PyQt4 import QtGui
 from pyqtauto.widgets import ExceptionMessageBox
-from data import Data, get_data_source
+from data import Data
 from history import HistoryController
+from archive import MeasurementArchive, start_ingest
+from fleet import FleetEnvelope
+from similarity import SimilarityIndex
+import measurements
 from core import setup_logger
 import logging
 
@@ -16,23 +22,36 @@ class ComparisonController(object):
 
 	def __init__(self, data, inspection):
 		self._data = data
-		self._csv = '%s.csv' % inspection.replace(' ', '')
-		self._data_csv = os.path.join(self._data.path, self._csv)
+		self._inspection = inspection.replace(' ', '')
+		self._data_csv = os.path.join(
+			self._data.path, '%s.csv' % self._inspection
+		)
 
 
 	def start(self):
+		rw_filepaths = Template.get_reference_paths(
+			*Template.similar_projects(self._data)
+		)
+		if len(rw_filepaths) == 0:
+			# User cancellation
+			return
 		try:
-			# Get measurement DataFrames
-			rw_filepath = Template.get_reference_path()
-			ref_path = os.path.dirname(rw_filepath)
-			ref_job_num = os.path.basename(rw_filepath)[:6]
-			ref_data = Template.data_formatted(os.path.join(ref_path, 
-				self._csv))
+			# Get measurement DataFrames; references are read from the archive
 			data = Template.data_formatted(self._data_csv)
+			archive = MeasurementArchive()
+			references = [
+				(
+					os.path.basename(rw_filepath).split('_')[0],
+					Template.formatted(
+						archive.project_frame(rw_filepath, self._inspection)
+					)
+				)
+				for rw_filepath in rw_filepaths
+			]
 
 			# Get merged comparison DataFrame
 			comparison_data = Template.get_comparison(
-				self._data.job_num, ref_job_num, data, ref_data
+				self._data.job_num, data, references
 			)
 
 			# Prompt user to save comparison as CSV
@@ -40,25 +59,149 @@ class ComparisonController(object):
 			if len(os.path.basename(save_path)) != 0:
 				comparison_data.to_csv('%s.csv' % save_path, index=False)
 
-		except TypeError as error:
-			# object of type 'NoneType' has no len(), user cancellelation
-			pass 
+		except (IOError, KeyError) as error:
+			# KeyError: CSV was not a PolyWorks export
+			ExceptionMessageBox(error).exec_()
+
+	def start_fleet(self):
+		"""Compare with every archived job of the same machine type and stage
+		count.
+
+		The envelope is computed from the archive as it is; new and modified
+		exports are ingested in the background, once per session.
+
+		"""
+		ingest = start_ingest()
+		try:
+			data = Template.data_formatted(self._data_csv)
+			fleet = FleetEnvelope(MeasurementArchive())
+			fleet_args = (
+				self._data.machine_type,
+				len(self._data.scope),
+				self._inspection,
+				self._data.filepath
+			)
+			comparison_data = fleet.compare(data, *fleet_args)
+
+			# An empty or small fleet must not pass for an in-family job
+			jobs = fleet.size(*fleet_args)
+			message = 'Compared with %s archived %s-stage %s jobs.' % (
+				jobs, len(self._data.scope), self._data.machine_type)
+			if jobs < FleetEnvelope.MIN_JOBS:
+				message += (
+					'\n\nFeatures are only flagged out of family when at '
+					'least %s jobs measured them.' % FleetEnvelope.MIN_JOBS
+				)
+			if ingest.is_alive():
+				message += (
+					'\n\nThe archive is still being updated. Compare again '
+					'later to include every job.'
+				)
+			QtGui.QMessageBox.information(None, 'Fleet Comparison', message)
+
+			# Prompt user to save comparison as CSV
+			save_path = str(QtGui.QFileDialog.getSaveFileName(caption='Save'))
+			if len(os.path.basename(save_path)) != 0:
+				comparison_data.to_csv('%s.csv' % save_path, index=False)
 
-		except IOError as error:
+		except (IOError, KeyError) as error:
 			ExceptionMessageBox(error).exec_()
 
 
 class Template:
 
 	@staticmethod
-	def get_reference_path():
-		"""Returns the absolute path to the selected file."""
+	def similar_projects(data, k=5):
+		"""Returns the archived projects most similar to a project.
+
+		Projects without exports are described by their stage count and
+		scope. The index is built from the archive as it is; new and modified
+		exports are ingested in the background, once per session.
+
+		Parameters
+		----------
+		data : Data
+		k : int
+
+		Returns
+		-------
+		suggestions : list
+			Absolute paths to project files, closest first.
+		fleet : int
+			The number of archived projects they were chosen from.
+
+		See Also
+		--------
+		similarity.SimilarityIndex
+
+		"""
+		start_ingest()
+		try:
+			index = SimilarityIndex(data.machine_type, MeasurementArchive())
+			vector = index.vector(data)
+			suggestions = [
+				i[0] for i in index.nearest(vector, k, data.filepath)
+			]
+		except (IOError, OSError) as error:
+			logging.warning(error)
+			return [], 0
+		return suggestions, len(index) - int(data.filepath in index.projects)
+
+	@staticmethod
+	def get_reference_path(suggestions=None, fleet=None):
+		"""Returns the absolute path to the selected file.
+
+		Parameters
+		----------
+		suggestions : list or None
+			Absolute paths to project files listed before any search.
+		fleet : int or None
+			The number of archived projects `suggestions` were chosen from.
+
+		"""
 		ref = HistoryController()
+		if suggestions is not None:
+			ref.suggest(suggestions, fleet)
 		if ref.view.exec_():
 			return ref.project
 
 	@staticmethod
-	def copied(project_dir, inspection):
+	def get_reference_paths(suggestions=None, fleet=None):
+		"""Returns a ``list`` of absolute paths to the selected files.
+
+		Several projects may be selected per job; the search dialog reopens 
+		until the user declines to add references from another job.
+
+		Parameters
+		----------
+		suggestions : list or None
+			Absolute paths to project files listed in the first dialog.
+		fleet : int or None
+			See `get_reference_path`.
+
+		"""
+		filepaths = []
+		while True:
+			ref = HistoryController(multiple=True)
+			if suggestions is not None and not filepaths:
+				ref.suggest(suggestions, fleet)
+			if not ref.view.exec_():
+				break
+			filepaths.extend(
+				i for i in ref.selected_projects if i not in filepaths
+			)
+			answer = QtGui.QMessageBox.question(
+				ref.view,
+				'Compare',
+				'Add references from another job?',
+				QtGui.QMessageBox.Yes | QtGui.QMessageBox.No
+			)
+			if answer != QtGui.QMessageBox.Yes:
+				break
+		return filepaths
+
+	@staticmethod
+	def copied(project_dir, inspection, suggestions=None, fleet=None):
 		"""Transfer workscope files from a previous job to the current job.
 		
 		Parameters
@@ -66,6 +209,10 @@ class Template:
 		project_dir : str
 		inspection : str
 			{'Axial', 'Diameter'}
+		suggestions : list or None
+			See `get_reference_path`.
+		fleet : int or None
+			See `get_reference_path`.
 
 		Returns
 		-------
@@ -77,13 +224,12 @@ class Template:
 			If the system cannot find the files specified.
 
 		"""
-		ref = Template.get_reference_path()
+		ref = Template.get_reference_path(suggestions, fleet)
 		if ref is not None:
-			data = get_data_source(ref)
 			try:
 				filename = '%sScope.csv' % inspection
 				src = os.path.join(
-					data.path, 
+					os.path.dirname(ref), 
 					filename
 				)
 				dst = os.path.join(project_dir, filename)
@@ -112,45 +258,104 @@ class Template:
 			If file does not exist.
 
 		"""
-		df = pd.read_csv(file_path)
+		return Template.formatted(measurements.load(file_path))
+
+	@staticmethod
+	def formatted(df):
+		"""Returns the 'Name' and 'Meas' of the measurement rows in `df`.
+
+		Parameters
+		----------
+		df : DataFrame
+			A PolyWorks export, as read from CSV or from the archive.
+
+		"""
 		try:
-			df.loc[df['Control'] == 'Custom', 'Control'] = 'Meas'
-			df.loc[df['Control'] == '3D Distance', 'Control'] = 'Meas'
-			df.loc[df['Control'] == 'Diameter', 'Control'] = 'Meas'
-			df = df[df['Control'] == 'Meas']
+			df = df[df['Control'].isin(['Custom', '3D Distance', 'Diameter', 
+				'Meas'])]
 			df = df[~df['Name'].str.contains('Ref')]
-			df.drop(['Control', 'Tol', 'Dev', 'Test', 'Out Tol', 'No. Pts'], 
-				axis=1, inplace=True)
+			df = df[['Name', 'Meas']]
 		except KeyError:
 			# CSV was not a PolyWorks export
 			pass
 		return df
-		
 
 	@staticmethod
-	def get_comparison(job_num1, job_num2, job1_df, job2_df):
-		"""Build a comparison ``DataFrame`` from two separate jobs.
+	def get_comparison(job_num, data, references):
+		"""Build a comparison ``DataFrame`` of one job and its reference jobs.
+
+		Measurements are joined on feature name, so jobs may list features in 
+		any order. When a name is repeated within a job, the first measurement 
+		is used.
 
 		Parameters
 		----------
-		job_num1 : str
-		job_num2 : str
-		job1_data : DataFrame
-		job2_data : DataFrame
+		job_num : str
+		data : DataFrame
+			Contains 'Name' and 'Meas' columns.
+		references : list
+			(job_num, DataFrame) pairs, one for each reference project.
 
 		Returns
 		-------
-		job1_df : DataFrame
-			Contains comparison data from `job2_df`.
+		comparison : DataFrame
+			One row per feature: the features of `data` in order, followed by 
+			features measured by a reference only. Contains the 'Name', each 
+			job's '<job_num> Meas', the 'Ref Min', 'Ref Max' and 'Ref Mean', 
+			the absolute 'Deviation' from the reference mean, the largest 
+			absolute deviation from a single reference ('Max Deviation') and 
+			the jobs that did not measure the feature ('Missing').
 
 		"""
-		job1_head = '%s Meas' % job_num1
-		job2_head = '%s Meas' % job_num2
-		job1_df.columns = ['Name', job1_head]
-		job1_df[job2_head] = pd.to_numeric(job2_df['Meas'])
-		job1_df[job1_head] = pd.to_numeric(job1_df[job1_head])
-		job1_df['Deviation'] = abs(job1_df[job1_head] - job1_df[job2_head])
-		return job1_df
+		labels = []
+		for label in [job_num] + [ref_job_num for ref_job_num, df in references]:
+			unique, i = str(label), 1
+			while unique in labels:
+				i += 1
+				unique = '%s (%s)' % (label, i)
+			labels.append(unique)
+
+		series = [Template._measurements(data)]
+		series.extend(
+			Template._measurements(df) for ref_job_num, df in references
+		)
+		names = series[0].index
+		for meas in series[1:]:
+			names = names.append(meas.index[~meas.index.isin(names)])
+
+		# Features x jobs; NaN where a job did not measure a feature
+		values = np.column_stack([meas.reindex(names).values for meas in series])
+		current = values[:, :1]
+		refs = pd.DataFrame(values[:, 1:])
+		missing = np.isnan(values)
+
+		comparison = pd.DataFrame(OrderedDict(
+			[('Name', names)] + 
+			[('%s Meas' % label, values[:, i]) for i, label in enumerate(labels)]
+		))
+		comparison['Ref Min'] = refs.min(axis=1).values
+		comparison['Ref Max'] = refs.max(axis=1).values
+		comparison['Ref Mean'] = refs.mean(axis=1).values
+		comparison['Deviation'] = np.abs(
+			current[:, 0] - comparison['Ref Mean'].values
+		)
+		comparison['Max Deviation'] = pd.DataFrame(
+			np.abs(values[:, 1:] - current)
+		).max(axis=1).values
+		labels = np.array(labels)
+		comparison['Missing'] = [
+			', '.join(labels[row]) if row.any() else '' for row in missing
+		]
+		return comparison
+
+	@staticmethod
+	def _measurements(df):
+		"""Returns the numeric measurements of `df` as a ``Series`` by name."""
+		meas = pd.Series(
+			pd.to_numeric(df['Meas'], errors='coerce').values,
+			index=pd.Index(df['Name'].astype(str).values, name='Name')
+		)
+		return meas[~meas.index.duplicated()]
 
 
 if __name__ == '__main__':
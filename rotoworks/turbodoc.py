@@ -1,14 +1,21 @@
+import os
 import sys
+import time
 import logging
-import numpy as np
-import pandas as pd
+import tempfile
+from timeit import default_timer
 from warnings import simplefilter
+from PyQt4 import QtGui, QtCore
 from comtypes import COMError
 from os.path import join as osjoin
 from pywinscript.autocad import (AutoCAD, CADOpenError, CADLayerError, 
 	CADDocError, CADTable, ACAD)
 from inspection import Diameter, Axial, ThermalGap, RotorWeight
+from grid import TableGrid, has_bal_drum, table_text_split
+from docscript import DocScript
+from profiler import profiler
 from machine import Rotor
+import measurements
 
 
 # Debugging logger
@@ -17,8 +24,6 @@ logger.setLevel(logging.DEBUG)
 handler = logging.StreamHandler(stream=sys.stdout)
 logger.addHandler(handler)
 
-# Turn of SettingWithCopy warning
-pd.set_option('mode.chained_assignment', None)
 simplefilter(action='ignore', category=FutureWarning)
 
 
@@ -27,9 +32,21 @@ class TurboDoc(AutoCAD):
 	AutoCAD documentation base class.
 
 	"""
+	_TEXT_OBJECTS = ('AcDbText', 'AcDbMText')
+
+	# If True, sessions are compiled into a single AutoCAD script instead of
+	# being driven call by call. Set ROTOWORKS_BATCH=1 to enable at startup.
+	BATCH = os.environ.get('ROTOWORKS_BATCH') == '1'
+	# Seconds to wait for a batch script to finish, and between checks
+	SCRIPT_TIMEOUT = 120
+	POLL_INTERVAL = 0.1
+
 	def __init__(self):
 		self.DOC_TRAIL = '%s.%s' % (self.__class__.__name__, 'txt')
 		super(TurboDoc, self).__init__()
+		# Calls made inside pywinscript go through the application and
+		# document created above
+		profiler.instrument(self, 'AutoCAD')
 
 	def init_doc(self, layout_name):
 		"""Prepare AutoCAD document for automated input.
@@ -76,187 +93,309 @@ class TurboDoc(AutoCAD):
 		------
 		IOError
 			If the system cannot find the path specified.
+		KeyError
+			If the CSV file is not a PolyWorks export.
 
 		"""
-		try:
-			session = pd.read_csv(filepath)
-			session.dropna(subset=['Meas'], inplace=True)
-			if float_req:
-				session = session[session.Name != 'Name']
-				session['Meas'] = session['Meas'].astype(np.float64)
-		except IndexError:
-			raise
-		else:
-			return session
+		session = measurements.load(filepath, typed=float_req)
+		return session.dropna(subset=['Meas'])
 
 	def replace_text_with_data(self, data):
 		"""Replace placeholder text values with ``DataFrame`` measurements.
 
+		A Name to Meas index is built once, then only text and mtext entities
+		are compared against it. When a Name is repeated, the first 
+		measurement is used.
+
 		Parameters
 		----------
 		data : DataFrame
 			Placeholder text values are found in the 'Name' column and the 
 			corresponding measurements are found in the 'Meas' column.
 
+		Returns
+		-------
+		report : ReplacementReport
+
 		Raises
 		------
 		CADDocError
 			If the Document object could not be found.
 
 		"""
+		start = default_timer()
+		index = {}
+		for name, meas in zip(data['Name'], data['Meas']):
+			index.setdefault(name, str(meas))
+		report = ReplacementReport(index.keys())
+		report.index_time = default_timer() - start
+
 		try:
-			for txt in self.iter_objects():
+			for obj in self.iter_objects():
+				obj = profiler.wrap(obj, 'AcadEntity')
+				if obj.ObjectName not in self._TEXT_OBJECTS:
+					continue
+				report.scanned += 1
+				placeholder = obj.TextString
 				try:
-					index = int(data[data['Name'] == txt.TextString].index[0])
-					txt.TextString = str(data.get_value(index, 'Meas'))
-				except (AttributeError, KeyError, IndexError, ):
+					obj.TextString = index[placeholder]
+				except KeyError:
 					continue
+				report.matched.append(placeholder)
 		except COMError:
 			raise CADDocError()
 
+		report.total_time = default_timer() - start
+		logger.debug(report)
+		return report
+
+	def document(self, layout_name, text_data, grid=None):
+		"""Document a session through the active backend.
+
+		Parameters
+		----------
+		layout_name : str
+		text_data : DataFrame
+			Placeholder names and measurements, see `replace_text_with_data`.
+		grid : TableGrid or None
+			If not ``None``, a ``DocTable`` is created from this grid.
+
+		Raises
+		------
+		CADOpenError
+			If AutoCAD is unavailable (license issue or startup pending).
+		CADDocError
+			If the AutoCAD document could not be found, or a batch script did
+			not finish within `SCRIPT_TIMEOUT`.
+		AttributeError
+			If `layout_name` could not be found.
+
+		"""
+		if self.BATCH:
+			# Also checks the layout and sets the document the script runs in
+			self.init_doc(layout_name)
+			filepath = osjoin(tempfile.gettempdir(), self.__class__.__name__)
+			script = DocScript(layout_name)
+			if grid is not None:
+				script.add_table(grid)
+			script.replace_text(text_data)
+			script.regen()
+			script.signal_done(filepath + '.done')
+			if os.path.exists(filepath + '.done'):
+				os.remove(filepath + '.done')
+			self.run_script(script.dump(filepath + '.scr'))
+			self.wait_for_script(filepath + '.done')
+		else:
+			self.init_doc(layout_name)
+			if grid is not None:
+				self._table = DocTable(self, grid)
+			self.replace_text_with_data(text_data)
+			self.regen()
+
+	def run_script(self, filepath):
+		"""Execute an AutoCAD script file in the active document.
+
+		Parameters
+		----------
+		filepath : str
+			Absolute path to a SCR file.
+
+		Raises
+		------
+		CADOpenError
+			If AutoCAD is unavailable (license issue or startup pending).
+		CADDocError
+			If the active document could not be found.
+
+		"""
+		try:
+			profiler.wrap(self.doc, 'AcadDocument').SendCommand(
+				'(command "_.SCRIPT" "%s") ' % filepath.replace('\\', '/')
+			)
+		except WindowsError:
+			raise CADOpenError()
+		except COMError:
+			raise CADDocError()
+
+	def wait_for_script(self, sentinel, timeout=None):
+		"""Block until a script started by `run_script` creates `sentinel`.
+
+		Qt events other than user input are processed while waiting, so the
+		window keeps painting without a second session being started.
+
+		Parameters
+		----------
+		sentinel : str
+			Absolute path to the file created by ``DocScript.signal_done``.
+		timeout : float or None
+			Seconds; defaults to `SCRIPT_TIMEOUT`.
+
+		Raises
+		------
+		CADDocError
+			If the script did not finish within `timeout`.
+
+		"""
+		if timeout is None:
+			timeout = self.SCRIPT_TIMEOUT
+		deadline = default_timer() + timeout
+		app = QtGui.QApplication.instance()
+		while not os.path.exists(sentinel):
+			if default_timer() > deadline:
+				logger.debug('%s not created after %ss' % (sentinel, timeout))
+				raise CADDocError()
+			if app is not None:
+				app.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
+			time.sleep(self.POLL_INTERVAL)
+		os.remove(sentinel)
+
 	def leave_doc_trail(self, path):
 		with open(osjoin(path, self.DOC_TRAIL), 'wb') as f:
 			pass
 
 
+class ReplacementReport(object):
+	"""
+	Summary of a ``TurboDoc.replace_text_with_data`` run.
+
+	Parameters
+	----------
+	placeholders : list
+		Every placeholder name available for replacement.
+
+	Attributes
+	----------
+	matched : list
+		Placeholders that were replaced in the drawing.
+	scanned : int
+		The number of text and mtext entities inspected.
+	index_time : float
+		Seconds spent building the placeholder index.
+	total_time : float
+		Seconds spent on the entire replacement.
+
+	"""
+	def __init__(self, placeholders):
+		self._placeholders = list(placeholders)
+		self.matched = []
+		self.scanned = 0
+		self.index_time = 0.0
+		self.total_time = 0.0
+
+	@property
+	def unmatched(self):
+		"""list: Placeholders that were not found in the drawing."""
+		matched = set(self.matched)
+		return [i for i in self._placeholders if i not in matched]
+
+	def __str__(self):
+		return (
+			'%s matched, %s unmatched, %s text objects scanned in %.3fs '
+			'(index %.3fs). Unmatched: %s' % (
+				len(self.matched), 
+				len(self.unmatched), 
+				self.scanned, 
+				self.total_time, 
+				self.index_time, 
+				', '.join(sorted(self.unmatched))
+			)
+		)
+
+
 class DocTable(CADTable):
 	"""A custom AutoCAD table for axial inspection documentation packages.
 
 	Parameters
 	----------
 	cad : AutoCAD
-	row_headers : list
-	col_headers : list
-	bal_drum : int
+	grid : TableGrid
+		The precomputed headers and measurements.
+	bulk : bool
+		If True, push the grid with table regeneration suppressed and text
+		formatting applied per row type. Otherwise, format and fill the table
+		cell by cell.
 
 	"""
-	_ROW_OFFSET = 1
-	_COL_OFFSET = 1
-	_DEFAULT_TABLE_POS = .061
-	_TITLE_ROW_HEIGHT = .2533
-	_DATA_ROW_HEIGHT = .2133
-	_DATA_TEXT_HEIGHT = .07
-	_TABLE_WIDTH = 10.375
-
-	def __init__(self, cad, row_headers, col_headers, bal_drum):
-		self._row_headers = row_headers
-		self._col_headers = col_headers
-
-		# Adjust headers if balance drum was measured
-		if bal_drum:
-			self._row_headers.append('B.D. Face')
-			self._col_headers.append('B.D.')
+	def __init__(self, cad, grid, bulk=True):
+		self._grid = grid
+		start = default_timer()
 
 		# Create table
+		x, y = self._grid.origin
 		super(DocTable, self).__init__(
-			cad, self._DEFAULT_TABLE_POS, self._calc_table_y(), 
-			len(self._row_headers) + self._ROW_OFFSET,
-			len(self._col_headers) + self._COL_OFFSET,
-			self._DATA_ROW_HEIGHT,
-			self._TABLE_WIDTH
+			cad, x, y, 
+			self._grid.row_count,
+			self._grid.col_count,
+			self._grid.DATA_ROW_HEIGHT,
+			self._grid.TABLE_WIDTH
 		)
+		self.table = profiler.wrap(self.table, 'AcadTable')
 		self.set_title_row(
-			'Axial Measurements From Active Face', 
-			.1, self._TITLE_ROW_HEIGHT
+			self._grid.TITLE, 
+			self._grid.TITLE_TEXT_HEIGHT, 
+			self._grid.TITLE_ROW_HEIGHT
 		)
-		self._set_column_headers()
-		self._setup_feature_cells()
+		if bulk:
+			self._push_grid()
+		else:
+			self._set_column_headers()
+			self._setup_feature_cells()
+			self._set_values()
 		self.add_contrast()
+		logger.debug('DocTable (bulk=%s) built in %.3fs' % (
+			bulk, default_timer() - start))
 
-	def _calc_table_y(self):
-		"""Return the Y coordinate ``float`` that positions the ``DocTable``.
+	def _push_grid(self):
+		"""Format data rows and set every cell text in a single pass.
+
+		Row heights are not set here because the table is created with
+		data rows of `TableGrid.DATA_ROW_HEIGHT`. The column header row is a
+		header row in AutoCAD, so its cells are sized one by one to match the
+		data rows.
 
-		The ``DocTable`` origin is the top-left corner. The overall height is
-		calculated, adjusted for margin, then returned.
-		
 		"""
-		data_row_height = len(self._row_headers) * self._DATA_ROW_HEIGHT
-		table_height = data_row_height + self._TITLE_ROW_HEIGHT
-		return table_height + self._DEFAULT_TABLE_POS
+		self.table.RegenerateTableSuppressed = True
+		try:
+			self.table.SetAlignment(ACAD.acDataRow, ACAD.acMiddleCenter)
+			self.table.SetTextHeight(ACAD.acDataRow, self._grid.DATA_TEXT_HEIGHT)
+			for col in range(self._grid.col_count):
+				self.table.SetCellTextHeight(
+					self._grid.ROW_OFFSET, col, self._grid.DATA_TEXT_HEIGHT
+				)
+			for row, col, value in self._grid.cells():
+				self.table.SetText(row, col, value)
+		finally:
+			self.table.RegenerateTableSuppressed = False
 
 	def _setup_feature_cells(self):
 		"""Format rows and set header texts."""
 		self.table.SetAlignment(ACAD.acDataRow, ACAD.acMiddleCenter)
-		target_row = self._ROW_OFFSET
-		for header in self._row_headers:
+		target_row = self._grid.ROW_OFFSET
+		for header in self._grid.row_headers:
 			self.table.SetText(target_row, 0, header)
 			for col in range(self.table.columns):
 				self.table.SetCellTextHeight(
 					target_row, col, 
-					self._DATA_TEXT_HEIGHT
+					self._grid.DATA_TEXT_HEIGHT
 				)
-			self.table.SetRowHeight(target_row, self._DATA_ROW_HEIGHT)
+			self.table.SetRowHeight(target_row, self._grid.DATA_ROW_HEIGHT)
 			target_row += 1
 
 	def _set_column_headers(self):
 		"""Format column header cells and set header texts."""
 		for col in range(self.table.columns):
-			self.table.SetCellTextHeight(1, col, self._DATA_ROW_HEIGHT)
+			self.table.SetCellTextHeight(1, col, self._grid.DATA_ROW_HEIGHT)
 			try:
 				self.table.SetText(
-					1, col + self._COL_OFFSET, self._col_headers[col]
+					1, col + self._grid.COL_OFFSET, self._grid.col_headers[col]
 				)
 			except IndexError:
 				pass
 
-	def _table_pos(self, meas_item):
-		"""Get the row and column index for a ``DocTable`` data item.
-
-		Parameters
-		----------
-		meas_item : str
-			Stage and feature names separated by "-", as found in the axial 
-			inspection output file (Axials.csv). `meas_item` should be validated
-			prior to calling this function.
-		
-		Returns
-		-------
-		row, col : int, int
-			The row and column index of the `meas_item`.
-
-		Raises
-		------
-		ValueError
-			If `meas_item` splits are not found in the "col_headers".
-		IndexError
-			If `meas_item` does not contain "-".
-
-		"""
-		item_split = meas_item.split('-')
-		try:
-			stage = item_split[0]
-			col = self._col_headers.index(stage) + self._COL_OFFSET
-			feature = item_split[1]
-			row = self._row_headers.index(feature) + self._ROW_OFFSET
-		except ValueError:
-			raise 
-		except IndexError:
-			raise
-		else:
-			return row, col
-
-	def populate_table(self, data):
-		"""Add axial measurement data to the ``DocTable``.
-
-		Parameters
-		----------
-		data : DataFrame
-			Contains axial measurement data.
-			
-			The ['Name'] column should contain labels in "Stage-Feature" format.
-				Ex.) str: Stage 1-Eye Face
-
-			The ['Meas'] column should contain the corresponding measurements.
-				Ex.) float: 12.6255
-
-		"""
-		for index, row in data.iterrows():
-			try:
-				_row, _col = self._table_pos(row['Name'])
-			except (ValueError, IndexError) as error:
-				logger.debug(error)
-			else:
-				self.table.SetText(_row, _col, row['Meas'])
+	def _set_values(self):
+		"""Add axial measurement data to the ``DocTable``."""
+		for (row, col), value in self._grid.values.items():
+			self.table.SetText(row, col, value)
 
 
 class AxialDoc(TurboDoc):
@@ -301,80 +440,19 @@ class AxialDoc(TurboDoc):
 			If the system cannot find the path specified.
 
 		"""
-		self.init_doc(self._axials.LAYOUT_NAME)
 		data = self.load_measurements(self._axials.OUTPUT_FILE)
-		table_data, text_data = self._table_text_split(data)
+		table_data, text_data = table_text_split(data)
+		grid = None
 		if self._row_headers is not None:
-			self._table = DocTable(
-				self, 
+			grid = TableGrid(
 				self._row_headers, 
 				self._col_headers,
-				self._has_bal_drum(table_data)
+				has_bal_drum(table_data)
 			)
-			self._table.populate_table(table_data)
-		self.replace_text_with_data(text_data)
-		self.regen()
+			grid.populate(table_data)
+		self.document(self._axials.LAYOUT_NAME, text_data, grid)
 		self.leave_doc_trail(self._data.path)
 
-	def _has_bal_drum(self, data):
-		"""Verify the existence of a balance drum measurement.
-
-		Returns
-		-------
-		int
-			1 if this session contains a balance drum measurement, else 0.
-
-		"""
-		try:
-			data[data['Name'] == 'B.D.-B.D. Face'].index[0]
-		except IndexError:
-			return 0
-		else:
-			return 1
-
-	def _table_text_split(self, data):
-		"""Split a DataFrame into two subsets.
-
-		The first subset is used to populate a ``DocTable`` and the	second is 
-		used to replace AutoCAD text objects with measurement data.
-
-		Parameters
-		----------
-		data : DataFrame
-			As retrieved from an axial measurement session CSV file.
-
-		Returns
-		-------
-		table_data, text_data : DataFrame, DataFrame
-
-		Notes
-		-----
-		This method raises SettingWithCopyWarning, which, in this context, can 
-		be safely ignored.
-
-		See Also
-		--------
-		TurboDoc.replace_text_with_data
-
-		"""
-		logger.debug(data)
-		data = data[
-			(data['Control'] == '3D Distance') &
-			(~data['Name'].str.contains('Ref'))
-		]
-		table_data = data[
-			(~data['Name'].str.contains('To Distance')) & 
-			# Here is a very subtle distinction between a generic 'Width' and 
-			# the 'G.P. Width'. This should weed out the generic widths and
-			# ignore the gas path data.
-			(~data['Name'].str.contains('Width '))
-		]
-		logger.debug(table_data)
-		text_data = data[~data['Name'].str.contains('-')]
-		text_data['Name'] = text_data['Name'].apply(lambda x: x.split(' ')[-1])
-		logger.debug(text_data)
-		return table_data, text_data
-
 
 class DiameterDoc(TurboDoc):
 	"""
@@ -409,10 +487,8 @@ class DiameterDoc(TurboDoc):
 			If the system cannot find the path specified.
 
 		"""
-		self.init_doc(self._diameters.LAYOUT_NAME)
 		data = self.load_measurements(self._diameters.OUTPUT_FILE)
-		self.replace_text_with_data(data)
-		self.regen()
+		self.document(self._diameters.LAYOUT_NAME, data)
 		self.leave_doc_trail(self._path)
 
 
@@ -449,10 +525,8 @@ class ThermalGapDoc(TurboDoc):
 			If the system cannot find the path specified.
 
 		"""
-		self.init_doc(self._tg.LAYOUT_NAME)
 		data = self.load_measurements(self._tg.OUTPUT_FILE)
-		self.replace_text_with_data(data)
-		self.regen()
+		self.document(self._tg.LAYOUT_NAME, data)
 		self.leave_doc_trail(self._path)
 
 
@@ -489,10 +563,8 @@ class RotorWeightDoc(TurboDoc):
 			If the system cannot find the path specified.
 
 		"""
-		self.init_doc(self._weights.LAYOUT_NAME)
 		data = self.load_measurements(self._weights.OUTPUT_FILE, False)
-		self.replace_text_with_data(data)
-		self.regen()
+		self.document(self._weights.LAYOUT_NAME, data)
 		self.leave_doc_trail(self._path)
 
 
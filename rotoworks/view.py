@@ -60,7 +60,8 @@ class InputListView(QtGui.QHBoxLayout):
 
 class InspectionCommandView(QtGui.QHBoxLayout):
 	"""
-	A view with start and finish ``GenericButton`` objects aligned to the right.
+	A view with start, finish and cancel ``GenericButton`` objects aligned to 
+	the right, preceded by the status of the running macro.
 
 	Parameters
 	----------
@@ -74,16 +75,49 @@ class InspectionCommandView(QtGui.QHBoxLayout):
 	finish_btn : GenericButton
 		Clicked to finish a process.
 
+	cancel_btn : GenericButton
+		Clicked to cancel running and queued processes.
+
 	"""
 	def __init__(self, parent):
 		self._parent = parent
 		super(InspectionCommandView, self).__init__()
-		self.addStretch(1)
 		self.setSpacing(10)
+		self._status_lb = QtGui.QLabel()
+		self._busy_bar = QtGui.QProgressBar()
+		# Indeterminate; Inspector does not report macro progress
+		self._busy_bar.setRange(0, 0)
+		self._busy_bar.setFixedWidth(60)
+		self._busy_bar.hide()
+		self.addWidget(self._status_lb)
+		self.addWidget(self._busy_bar)
+		self.addStretch(1)
 		self.start_btn = GenericButton('Start', self)
 		self.finish_btn = GenericButton('Finish', self)
+		self.cancel_btn = GenericButton('Cancel', self)
+		self.cancel_btn.setEnabled(False)
 		self._parent.addLayout(self)
 
+	def set_job(self, job, status):
+		"""Display the status of a macro.
+
+		Parameters
+		----------
+		job : MacroJob
+		status : str
+			The status `job` changed to; `job.status` may be newer.
+
+		"""
+		running = status in (job.QUEUED, job.RUNNING)
+		if running:
+			self._status_lb.setText('%s: %s' % (job.name, status))
+		else:
+			self._status_lb.setText(str(job))
+		self._busy_bar.setVisible(running)
+		self.start_btn.setEnabled(not running)
+		self.finish_btn.setEnabled(not running)
+		self.cancel_btn.setEnabled(running)
+
 
 class ListBoxHeaderView(QtGui.QVBoxLayout):
 	"""
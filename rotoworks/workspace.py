@@ -3,15 +3,9 @@ import os.path
 from PyQt4 import QtGui, QtCore
 from pyqtauto.widgets import (Spacer, DialogButtonBox, ExceptionMessageBox, 
 	ListBox)
-from turbodoc import (AxialDoc, DiameterDoc, ThermalGapDoc, RotorWeightDoc, 
-	CADOpenError, CADLayerError, CADDocError)
-from diameter_session import DiameterSessionController
-from axial_session import AxialSessionController
-from thermal_gap_session import ThermalGapController
-from rotor_weights_session import RotorWeightsController
-from template import ComparisonController
 from core import Path, Image, setup_logger
 from inspection import Inspection
+from profiler import profiler
 from datetime import datetime
 import logging
 
@@ -19,6 +13,17 @@ import logging
 setup_logger()
 
 
+def _load(name):
+	"""Returns the class named 'module.Class', importing its module.
+
+	Sessions pull in pandas, AutoCAD and PolyWorks bindings, so they are only
+	imported when first launched.
+
+	"""
+	module, cls = name.rsplit('.', 1)
+	return getattr(__import__(module), cls)
+
+
 class WorkspaceView(QtGui.QWidget):
 	"""
 	Displays project workspace GUI.
@@ -40,6 +45,9 @@ class WorkspaceView(QtGui.QWidget):
 	compare_btn : QPushButton
 		Clicked to launch comparison session.
 
+	fleet_btn : QPushButton
+		Clicked to compare with every archived job of the machine type.
+
 	selection : str
 		The selected inspection.
 
@@ -60,12 +68,15 @@ class WorkspaceView(QtGui.QWidget):
 		self.meas_btn = QtGui.QPushButton('Measure')
 		self.doc_btn = QtGui.QPushButton('Document')
 		self.compare_btn = QtGui.QPushButton('Compare')
+		self.fleet_btn = QtGui.QPushButton('Fleet')
 		self._meas_stat_lb = QtGui.QLabel()
 		self._doc_stat_lb = QtGui.QLabel()
 		self._compare_stat_lb = QtGui.QLabel()
+		self._fleet_stat_lb = QtGui.QLabel()
 		self._meas_stat_lb.setAlignment(QtCore.Qt.AlignCenter)
 		self._doc_stat_lb.setAlignment(QtCore.Qt.AlignCenter)
 		self._compare_stat_lb.setAlignment(QtCore.Qt.AlignCenter)
+		self._fleet_stat_lb.setAlignment(QtCore.Qt.AlignCenter)
 		# Add widgets to layout
 		self._grid_layout.addWidget(self.meas_btn, 0, 0)
 		self._grid_layout.addWidget(self._meas_stat_lb, 1, 0)
@@ -73,6 +84,8 @@ class WorkspaceView(QtGui.QWidget):
 		self._grid_layout.addWidget(self._doc_stat_lb, 1, 1)
 		self._grid_layout.addWidget(self.compare_btn, 0, 2)
 		self._grid_layout.addWidget(self._compare_stat_lb, 1, 2)
+		self._grid_layout.addWidget(self.fleet_btn, 0, 3)
+		self._grid_layout.addWidget(self._fleet_stat_lb, 1, 3)
 		self._main_layout.addLayout(self._grid_layout)
 		self._main_layout.addItem(Spacer())
 		self.btns = QtGui.QDialogButtonBox()
@@ -83,7 +96,8 @@ class WorkspaceView(QtGui.QWidget):
 		self._status_map = {
 			'Measure': self._meas_stat_lb, 
 			'Document': self._doc_stat_lb, 
-			'Compare': self._compare_stat_lb
+			'Compare': self._compare_stat_lb,
+			'Fleet': self._fleet_stat_lb
 		}
 
 	@property
@@ -96,7 +110,7 @@ class WorkspaceView(QtGui.QWidget):
 
 		Parameters
 		----------
-		process : {'Measure', 'Document', 'Compare'}
+		process : {'Measure', 'Document', 'Compare', 'Fleet'}
 		mod_time : str
 			Date and time that process file was last modified.
 
@@ -125,22 +139,23 @@ class WorkspaceController(object):
 		self._data = None
 		self._filetype_map = {'Measure': '.csv', 'Document': 'Doc.txt'}
 		self._meas_session_map = {
-			'Axial': AxialSessionController, 
-			'Diameter': DiameterSessionController,
-			'Thermal Gap': ThermalGapController,
-			'Rotor Weight': RotorWeightsController
+			'Axial': 'axial_session.AxialSessionController', 
+			'Diameter': 'diameter_session.DiameterSessionController',
+			'Thermal Gap': 'thermal_gap_session.ThermalGapController',
+			'Rotor Weight': 'rotor_weights_session.RotorWeightsController'
 		}
 		self._doc_session_map = {
-			'Axial': AxialDoc,	
-			'Diameter': DiameterDoc,
-			'Thermal Gap': ThermalGapDoc,
-			'Rotor Weight': RotorWeightDoc
+			'Axial': 'turbodoc.AxialDoc',	
+			'Diameter': 'turbodoc.DiameterDoc',
+			'Thermal Gap': 'turbodoc.ThermalGapDoc',
+			'Rotor Weight': 'turbodoc.RotorWeightDoc'
 		}
 		self.view = WorkspaceView()
 		self.view.listbox.itemClicked.connect(self._on_click_listbox)
 		self.view.meas_btn.clicked.connect(self._on_click_meas_btn)
 		self.view.doc_btn.clicked.connect(self._on_click_doc_btn)
 		self.view.compare_btn.clicked.connect(self._on_click_compare_btn)
+		self.view.fleet_btn.clicked.connect(self._on_click_fleet_btn)
 
 	@property
 	def data(self):
@@ -190,43 +205,60 @@ class WorkspaceController(object):
 		doc_status = self._get_mod_date(inspection, 'Document')
 		self.view.set_process_status('Document', doc_status)
 
-		if meas_status is not None:
-			self.view.set_process_status('Compare', 'Ready')
-		else:
-			self.view.set_process_status('Compare', meas_status)
+		# Parses the export once; comparison and documentation reuse it
+		import measurements
+		filename = os.path.join(
+			self._data.path, inspection.replace(' ', '') + '.csv'
+		)
+		ready = meas_status is not None and measurements.measured(filename) > 0
+		for process in ('Compare', 'Fleet'):
+			self.view.set_process_status(process, 'Ready' if ready else None)
 
 	def _on_click_meas_btn(self):
 		"""Launch a measurement session."""
 		inspection = self.view.selection
 		try:
-			meas = self._meas_session_map[inspection](self._data)
+			meas = _load(self._meas_session_map[inspection])(self._data)
 		except KeyError as error:
 			logging.warning(error)
 			pass
 		else:
 			meas.view.exec_()
+			profiler.dump(meas.__class__.__name__)
 		self._on_click_listbox()
 
 	def _on_click_doc_btn(self):
 		"""Launch a documentation session."""
+		from turbodoc import CADOpenError, CADLayerError, CADDocError
 		inspection = self.view.selection
 		try:
-			doc = self._doc_session_map[inspection](self._data)
+			doc = _load(self._doc_session_map[inspection])(self._data)
 			doc.start()
 		except (CADOpenError, CADDocError, CADLayerError, 
 				AttributeError, IOError) as error:
 			logging.warning(error)
 			ExceptionMessageBox(error).exec_()
-			
+		finally:
+			profiler.dump(inspection.replace(' ', '') + 'Doc')
+
 		self._on_click_listbox()
 
 	def _on_click_compare_btn(self):
 		"""Launch a comparison session."""
 		inspection = self.view.selection
 		if self._get_mod_date(inspection, 'Measure') is not None:
+			from template import ComparisonController
 			comparison = ComparisonController(self._data, inspection)
 			comparison.start()
 
+	def _on_click_fleet_btn(self):
+		"""Launch a fleet comparison session."""
+		inspection = self.view.selection
+		if self._get_mod_date(inspection, 'Measure') is not None:
+			from template import ComparisonController
+			comparison = ComparisonController(self._data, inspection)
+			comparison.start_fleet()
+
 
 if __name__ == '__main__':
 	pass
\ No newline at end of file
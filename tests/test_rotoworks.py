@@ -0,0 +1,441 @@
+"""
+Regression tests for the golden macro and script outputs, the export loader,
+the COM profiler and the PolyWorks job queue.
+
+Run from the repository root:   python -m unittest discover tests
+
+Tests that drive AutoCAD objects are skipped when pywinscript is not
+installed.
+
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(TEST_DIR, 'golden')
+sys.path.insert(0, os.path.join(os.path.dirname(TEST_DIR), 'rotoworks'))
+
+import measurements
+import connection
+from profiler import ComProfiler, ComProxy
+from docscript import DocScript, _sample_scripts
+from pwmacro import AxialMacro, _SAMPLE_ROWS
+from machine import CentrifugalCompressor
+from grid import TableGrid
+try:
+	import turbodoc
+except ImportError:
+	# pywinscript, comtypes or PyQt4 is not installed
+	turbodoc = None
+
+
+def _read(filepath):
+	with open(filepath) as f:
+		return f.read()
+
+
+class GoldenTest(unittest.TestCase):
+	"""Compiled outputs must match the files in tests/golden.
+
+	After an intended change, rewrite them with ``python pwmacro.py --update``
+	and ``python docscript.py --update``.
+
+	"""
+	def test_axial_macro(self):
+		macro = AxialMacro.from_rows(_SAMPLE_ROWS, CentrifugalCompressor())
+		self.assertEqual(
+			macro.dumps(), _read(os.path.join(GOLDEN_DIR, 'AxialSession.pwmacro'))
+		)
+
+	def test_doc_scripts(self):
+		scripts = list(_sample_scripts(TEST_DIR))
+		self.assertTrue(scripts)
+		for filename, script in scripts:
+			self.assertEqual(
+				script.dumps(), _read(os.path.join(GOLDEN_DIR, filename)),
+				'%s differs from golden file' % filename
+			)
+
+
+class DocScriptTest(unittest.TestCase):
+
+	def test_signal_done(self):
+		script = DocScript('Axial')
+		script.signal_done('C:\\Jobs\\Axial.scr.done')
+		self.assertEqual(
+			script.dumps().splitlines()[-1],
+			'(close (open "C:/Jobs/Axial.scr.done" "w"))'
+		)
+
+	def test_quote(self):
+		self.assertEqual(DocScript.quote('a "b" \\c'), '"a \\"b\\" \\\\c"')
+
+
+@unittest.skipIf(turbodoc is None, 'pywinscript is not installed')
+class ScriptWaitTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.sentinel = os.path.join(self.directory, 'Axial.scr.done')
+		self.doc = turbodoc.TurboDoc.__new__(turbodoc.TurboDoc)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_wait_for_script(self):
+		timer = threading.Timer(0.2, lambda: open(self.sentinel, 'w').close())
+		timer.start()
+		self.doc.wait_for_script(self.sentinel, timeout=5)
+		timer.join()
+		self.assertFalse(os.path.exists(self.sentinel))
+
+	def test_wait_for_script_timeout(self):
+		self.assertRaises(
+			turbodoc.CADDocError,
+			self.doc.wait_for_script, self.sentinel, 0.2
+		)
+
+
+class FakeConstants(object):
+	# The AutoCAD enumeration values used by DocTable
+	acDataRow = 1
+	acTitleRow = 2
+	acHeaderRow = 4
+	acMiddleCenter = 5
+
+
+class FakeTable(object):
+	# Resolves row type settings into per cell formatting. Row 0 is the title
+	# row, row 1 the header row and every following row a data row.
+	def __init__(self, rows, columns, row_height):
+		self.columns = columns
+		self.RegenerateTableSuppressed = False
+		self.texts = {}
+		self.text_heights = {}
+		self.alignments = {}
+		self.row_heights = dict((row, row_height) for row in range(1, rows))
+		self._rows = rows
+
+	def _cells(self, row_types):
+		for row in range(self._rows):
+			if row == 0:
+				row_type = FakeConstants.acTitleRow
+			elif row == 1:
+				row_type = FakeConstants.acHeaderRow
+			else:
+				row_type = FakeConstants.acDataRow
+			if row_type & row_types:
+				for col in range(self.columns):
+					yield row, col
+
+	def SetText(self, row, col, text):
+		self.texts[(row, col)] = text
+
+	def SetCellTextHeight(self, row, col, height):
+		self.text_heights[(row, col)] = height
+
+	def SetTextHeight(self, row_types, height):
+		for cell in self._cells(row_types):
+			self.text_heights[cell] = height
+
+	def SetAlignment(self, row_types, alignment):
+		for cell in self._cells(row_types):
+			self.alignments[cell] = alignment
+
+	def SetRowHeight(self, row, height):
+		self.row_heights[row] = height
+
+
+@unittest.skipIf(turbodoc is None, 'pywinscript is not installed')
+class DocTableTest(unittest.TestCase):
+
+	def setUp(self):
+		self.acad = turbodoc.ACAD
+		turbodoc.ACAD = FakeConstants
+		self.grid = TableGrid(['', 'Face A', 'Face B'], ['1', '2', '3'], 1)
+		self.grid.values[(1, 2)] = '0.0015'
+		self.grid.values[(3, 4)] = '0.0021'
+
+	def tearDown(self):
+		turbodoc.ACAD = self.acad
+
+	def _table(self):
+		doc_table = turbodoc.DocTable.__new__(turbodoc.DocTable)
+		doc_table._grid = self.grid
+		doc_table.table = FakeTable(
+			self.grid.row_count, self.grid.col_count, self.grid.DATA_ROW_HEIGHT
+		)
+		return doc_table
+
+	def test_bulk_matches_legacy(self):
+		bulk = self._table()
+		bulk._push_grid()
+		legacy = self._table()
+		legacy._set_column_headers()
+		legacy._setup_feature_cells()
+		legacy._set_values()
+		self.assertFalse(bulk.table.RegenerateTableSuppressed)
+		for name in ('texts', 'text_heights', 'alignments', 'row_heights'):
+			self.assertEqual(
+				getattr(bulk.table, name), getattr(legacy.table, name), name
+			)
+
+
+class MeasurementsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _write(self, filename, contents):
+		filepath = os.path.join(self.directory, filename)
+		with open(filepath, 'wb') as f:
+			f.write(contents)
+		return filepath
+
+	def test_load_typed(self):
+		df = measurements.load(os.path.join(TEST_DIR, 'Axials.csv'))
+		self.assertTrue(set(df.columns) <= set(measurements.SCHEMA))
+		self.assertEqual(df['Meas'].dtype.kind, 'f')
+		self.assertEqual(df['Dev'].dtype.kind, 'f')
+		self.assertFalse((df['Name'] == 'Name').any())
+
+	def test_load_untyped(self):
+		df = measurements.load(os.path.join(TEST_DIR, 'Axials.csv'), False)
+		self.assertEqual(df['Meas'].dtype, object)
+
+	def test_load_returns_copy(self):
+		filepath = os.path.join(TEST_DIR, 'Axials.csv')
+		measurements.load(filepath)['Name'] = 'Changed'
+		self.assertFalse((measurements.load(filepath)['Name'] == 'Changed').any())
+
+	def test_load_preamble(self):
+		filepath = self._write('Axial.csv',
+			b'Feature Table\r\nRotor\r\n\r\n'
+			b'Name,Control,Meas,No. Pts\r\nA,Flatness,1.5,10\r\nB,Flatness,x,3\r\n'
+		)
+		df = measurements.load(filepath)
+		self.assertEqual(list(df.columns), ['Name', 'Control', 'Meas'])
+		self.assertEqual(df['Meas'].iloc[0], 1.5)
+		self.assertTrue(df['Meas'].isnull().iloc[1])
+
+	def test_load_not_an_export(self):
+		filepath = self._write('Other.csv', b'a,b\r\n1,2\r\n')
+		self.assertRaises(KeyError, measurements.load, filepath)
+
+	def test_load_missing(self):
+		self.assertRaises(
+			IOError, measurements.load, os.path.join(self.directory, 'x.csv')
+		)
+
+	def test_merge(self):
+		output = self._write('Axial.csv',
+			b'Feature Table\r\n\r\n'
+			b'Name,Control,Meas,No. Pts\r\n'
+			b'A,Flatness,1.0,10\r\nA,Centroid X,2.0,10\r\nB,Flatness,3.0,12\r\n'
+		)
+		delta = self._write('Delta.csv',
+			b'Name,Control,Meas,No. Pts\r\n'
+			b'A,Flatness,1.5,11\r\nC,"Dist, 3D",9,3\r\n'
+		)
+		self.assertEqual(measurements.merge(output, delta), 2)
+		with open(output, 'rb') as f:
+			self.assertEqual(f.read(),
+				b'Feature Table\r\n\r\n'
+				b'Name,Control,Meas,No. Pts\r\n'
+				b'B,Flatness,3.0,12\r\n'
+				b'A,Flatness,1.5,11\r\nC,"Dist, 3D",9,3\r\n'
+			)
+
+	def test_merge_reorders_columns(self):
+		output = self._write('Axial.csv',
+			b'Name,Control,Meas\r\nA,Flatness,1.0\r\n'
+		)
+		delta = self._write('Delta.csv', b'Name,Meas\r\nB,2.0\r\n')
+		measurements.merge(output, delta)
+		with open(output, 'rb') as f:
+			self.assertEqual(
+				f.read(), b'Name,Control,Meas\r\nA,Flatness,1.0\r\nB,,2.0\r\n'
+			)
+
+
+class FakeComObject(object):
+	# Marks the object as a comtypes object
+	_comobj = None
+
+	def __init__(self):
+		self.Name = 'Model'
+
+	def Item(self, index):
+		return FakeComObject()
+
+	def Regen(self):
+		pass
+
+
+class FakeApplication(object):
+	# Creates its own COM objects, like pywinscript.autocad.AutoCAD
+	def __init__(self):
+		self.doc = FakeComObject()
+		self.title = 'Drawing1'
+
+
+class ProfilerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.profiler = ComProfiler()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _calls(self):
+		filepath = self.profiler.dump('FakeSession', self.directory)
+		with open(filepath) as f:
+			return dict((name, i['calls']) for name, i in json.load(f).items())
+
+	def test_disabled(self):
+		self.assertIsNot(
+			self.profiler.wrap(FakeComObject(), 'doc').__class__, ComProxy
+		)
+		app = FakeApplication()
+		self.profiler.instrument(app, 'app')
+		self.assertIsInstance(app.doc, FakeComObject)
+		self.assertIsNone(self.profiler.dump('FakeSession', self.directory))
+
+	def test_calls(self):
+		self.profiler.enabled = True
+		doc = self.profiler.wrap(FakeComObject(), 'doc')
+		for i in range(3):
+			doc.Regen()
+		doc.Item(0).Regen()
+		doc.Name = doc.Name + 'Space'
+		self.profiler.enabled = False
+		# Not recorded
+		doc.Regen()
+		self.assertEqual(self._calls(), {
+			'doc.Regen': 3,
+			'doc.Item': 1,
+			'doc.Item.Regen': 1,
+			'doc.Name': 1,
+			'doc.Name=': 1,
+		})
+		# Reset by the dump
+		self.assertIsNone(self.profiler.dump('FakeSession', self.directory))
+
+	def test_instrument(self):
+		self.profiler.enabled = True
+		app = FakeApplication()
+		self.profiler.instrument(app, 'app')
+		app.doc.Regen()
+		self.assertEqual(app.title, 'Drawing1')
+		self.assertEqual(self._calls(), {'app.doc.Regen': 1})
+
+	def test_threads(self):
+		self.profiler.enabled = True
+		doc = self.profiler.wrap(FakeComObject(), 'doc')
+		threads = [
+			threading.Thread(target=lambda: [doc.Regen() for i in range(500)])
+			for i in range(4)
+		]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(self._calls(), {'doc.Regen': 2000})
+
+
+class FakeInspector(object):
+
+	def __init__(self, fail=()):
+		self.commands = []
+		self._fail = list(fail)
+
+	def CommandExecute(self, command):
+		self.commands.append(command)
+		if self._fail:
+			raise self._fail.pop(0)
+
+
+class FakePolyworks(object):
+	# Each connect attaches a new inspector
+	instances = []
+	fail = ()
+
+	def connect_to_inspector(self):
+		self.inspector = FakeInspector(FakePolyworks.fail)
+		FakePolyworks.fail = ()
+		FakePolyworks.instances.append(self)
+
+
+class JobQueueTest(unittest.TestCase):
+
+	def setUp(self):
+		FakePolyworks.instances = []
+		FakePolyworks.fail = ()
+		self.connection = connection.InspectorConnection(FakePolyworks)
+
+	def test_statuses(self):
+		statuses = []
+		job = self.connection.submit(
+			connection.macro_command('axialsIn.pwmacro', '1'), 'Macro',
+			lambda job, status: statuses.append(status)
+		)
+		job.wait(5)
+		self.assertEqual(statuses, ['Queued', 'Running', 'Done'])
+		self.assertEqual(
+			FakePolyworks.instances[0].inspector.commands,
+			['MACRO EXEC ( "axialsIn.pwmacro", "1" )']
+		)
+		self.assertEqual(list(self.connection.log), [job])
+
+	def test_order_and_cancel(self):
+		gate = threading.Event()
+		first = self.connection.submit('MACRO 0', 'Macro 0',
+			lambda job, status: status == job.RUNNING and gate.wait(5))
+		second = self.connection.submit('MACRO 1', 'Macro 1')
+		second.cancel()
+		gate.set()
+		third = self.connection.submit('MACRO 2', 'Macro 2')
+		third.wait(5)
+		self.assertEqual(
+			[first.status, second.status, third.status],
+			['Done', 'Cancelled', 'Done']
+		)
+		self.assertEqual(
+			FakePolyworks.instances[0].inspector.commands, ['MACRO 0', 'MACRO 2']
+		)
+
+	def test_failed_job(self):
+		FakePolyworks.fail = [ValueError('Bad command')]
+		failed = self.connection.submit('MACRO 0')
+		self.assertRaises(ValueError, failed.wait, 5)
+		self.assertEqual(failed.status, failed.FAILED)
+		# The worker survives
+		self.connection.submit('MACRO 1').wait(5)
+
+	def test_reconnect(self):
+		for error in (connection.COMError, connection.com_error):
+			FakePolyworks.instances = []
+			FakePolyworks.fail = [error('Inspector closed')]
+			self.connection._polyworks = None
+			self.connection.submit('MACRO').wait(5)
+			self.assertEqual(len(FakePolyworks.instances), 2)
+			self.assertEqual(
+				FakePolyworks.instances[1].inspector.commands, ['MACRO']
+			)
+
+	def test_wait_timeout(self):
+		job = connection.MacroJob('MACRO', 'Macro')
+		self.assertRaises(OSError, job.wait, 0.1)
+
+
+if __name__ == '__main__':
+	unittest.main()